@@ -1,7 +1,7 @@
 # cameraapp/admin.py
 
 from django.contrib import admin
-from .models import Camera, CameraSettings
+from .models import Camera, CameraSettings, MediaItem, RecordingSegment
 
 @admin.register(Camera)
 class CameraAdmin(admin.ModelAdmin):
@@ -11,4 +11,16 @@ class CameraAdmin(admin.ModelAdmin):
 @admin.register(CameraSettings)
 class CameraSettingsAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
-        return not CameraSettings.objects.exists()
\ No newline at end of file
+        return not CameraSettings.objects.exists()
+
+@admin.register(RecordingSegment)
+class RecordingSegmentAdmin(admin.ModelAdmin):
+    list_display = ("path", "started_at", "ended_at", "frames", "size_bytes")
+    date_hierarchy = "started_at"
+
+
+@admin.register(MediaItem)
+class MediaItemAdmin(admin.ModelAdmin):
+    list_display = ("path", "category", "media_type", "created_at", "size_bytes")
+    list_filter = ("category", "media_type")
+    date_hierarchy = "created_at"
@@ -7,6 +7,8 @@ class CameraAppConfig(AppConfig):
     name = "cameraapp"
 
     def ready(self):
+        from . import signals  # noqa: F401
+
         if os.environ.get("RUN_MAIN") != "true":
             print("[CAMERA_APP] Skipping startup logic (not RUN_MAIN).")
             return
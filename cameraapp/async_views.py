@@ -0,0 +1,70 @@
+# cameraapp/async_views.py
+#
+# Async variants of the streaming views for running under an ASGI server
+# (e.g. `uvicorn ipcam_project.asgi:application`). Viewers wait for frames as
+# coroutines on the event loop instead of holding a worker thread or greenlet.
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+
+from .camera_core import init_camera
+from .frame_hub import StreamProfile
+from .globals import app_globals
+from .views import current_jpeg
+
+
+async def _is_authenticated(request):
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+async def _ensure_camera():
+    if not app_globals.camera:
+        await sync_to_async(init_camera, thread_sensitive=False)()
+
+
+async def _counted_stream(stream):
+    app_globals.viewer_connected()
+    try:
+        async for part in stream:
+            yield part
+    finally:
+        await stream.aclose()
+        app_globals.viewer_disconnected()
+
+
+async def video_feed_async(request):
+    if not await _is_authenticated(request):
+        return redirect_to_login(request.get_full_path())
+    try:
+        profile = StreamProfile.from_query(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid stream profile")
+
+    await _ensure_camera()
+    return StreamingHttpResponse(
+        _counted_stream(app_globals.frame_hub.mjpeg_stream_async(profile)),
+        content_type='multipart/x-mixed-replace; boundary=frame'
+    )
+
+
+async def single_frame_async(request):
+    if not await _is_authenticated(request):
+        return redirect_to_login(request.get_full_path())
+    try:
+        profile = StreamProfile.from_query(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid stream profile")
+
+    await _ensure_camera()
+    app_globals.viewer_connected()
+    try:
+        encoded = app_globals.frame_hub.peek_jpeg(profile)
+        if encoded is None or (app_globals.camera is not None and app_globals.camera.idle):
+            encoded = await sync_to_async(current_jpeg, thread_sensitive=False)(profile)
+    finally:
+        app_globals.viewer_disconnected()
+    if encoded is None:
+        return HttpResponse(status=204)
+
+    return HttpResponse(encoded.data, content_type="image/jpeg")
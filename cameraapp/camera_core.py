@@ -6,9 +6,14 @@ import glob
 import time
 from dotenv import load_dotenv
 from cameraapp.models import CameraSettings
-from .camera_utils import safe_restart_camera_stream, update_latest_frame, get_camera_settings, apply_cv_settings, try_open_camera, release_and_reset_camera, force_restart_livestream, get_camera_settings_safe, try_open_camera_safe, update_livestream_job
+from .camera_utils import safe_restart_camera_stream, get_camera_settings, apply_cv_settings, try_open_camera, release_and_reset_camera, force_restart_livestream, get_camera_settings_safe, try_open_camera_safe, update_livestream_job
 from .globals import app_globals
 from .camera_manager import CameraManager
+from .frame_sources import V4L2Source, configured_source
+from .pre_roll import configure_pre_roll
+from .motion import configure_motion
+from .dvr import configure_dvr
+from .retention import configure_retention
 
 load_dotenv()
 
@@ -16,7 +21,7 @@ load_dotenv()
 def find_working_camera_device():
     candidates = sorted(glob.glob("/dev/video*"))
     for device in candidates:
-        cap = cv2.VideoCapture(device, cv2.CAP_V4L2)
+        cap = V4L2Source(device)
         if cap.isOpened():
             ret, _ = cap.read()
             cap.release()
@@ -26,21 +31,14 @@ def find_working_camera_device():
 
 
 
-CAMERA_URL_RAW = os.getenv("CAMERA_URL", "0")
-
-if CAMERA_URL_RAW == "0" and not os.path.exists("/dev/video0"):
-    fallback_device = find_working_camera_device()
-    CAMERA_URL = fallback_device if fallback_device else 0
-    print(f"[CAMERA_CORE] CAMERA_URL fallback resolved to: {CAMERA_URL}")
-else:
-    CAMERA_URL = int(CAMERA_URL_RAW) if CAMERA_URL_RAW.isdigit() else CAMERA_URL_RAW
-
-
 def resolve_camera_source():
-    if CAMERA_URL == "0" and not os.path.exists("/dev/video0"):
+    """settings.CAMERA_URL; the default device 0 falls back to the first working /dev/video*."""
+    source = configured_source()
+    if source == 0 and not os.path.exists("/dev/video0"):
         fallback = find_working_camera_device()
-        return fallback if fallback else "/dev/video0"
-    return CAMERA_URL
+        print(f"[CAMERA_CORE] CAMERA_URL fallback resolved to: {fallback or 0}")
+        return fallback if fallback else 0
+    return source
 
 
 def init_camera(skip_stream=False):
@@ -54,7 +52,7 @@ def init_camera(skip_stream=False):
         source = resolve_camera_source()
 
         # Neue CameraManager-Instanz erzeugen
-        new_camera = CameraManager(source=source, force_backend=cv2.CAP_V4L2)
+        new_camera = CameraManager(source=source)
 
         # Warten, bis Gerät verfügbar ist (max 5 Sekunden)
         for attempt in range(5):
@@ -69,14 +67,19 @@ def init_camera(skip_stream=False):
         app_globals.camera = new_camera
         print("[CAMERA_CORE] CameraManager initialized and running.")
 
+        try:
+            settings_obj = get_camera_settings()
+            configure_pre_roll(settings_obj)
+            configure_motion(settings_obj)
+            configure_dvr(settings_obj)
+            configure_retention(settings_obj)
+        except Exception as e:
+            print(f"[CAMERA_CORE] Pre-roll / motion detection / DVR / retention not started: {e}")
+
         if not skip_stream and (not app_globals.livestream_job or not app_globals.livestream_job.running):
             print("[CAMERA_CORE] Starting livestream job...")
             from .livestream_job import LiveStreamJob
-            job = LiveStreamJob(
-                camera_source=source,
-                frame_callback=lambda f: update_latest_frame(f),
-                shared_capture=new_camera.cap
-            )
+            job = LiveStreamJob(camera_source=source)
             job.start()
             app_globals.livestream_job = job
             update_livestream_job(job)
@@ -5,22 +5,87 @@ import threading
 import time
 import os
 import atexit
+from django.conf import settings
 from .globals import app_globals
+from .frame_ring import FrameRing
+from .frame_sources import open_source, is_device_source
+from .metrics import TimedLock, capture as capture_stats
+
+
+def _passthrough_from_env():
+    return os.getenv("CAMERA_PASSTHROUGH", "0").lower() in ("1", "true", "yes")
+
+
+def _idle_config():
+    """(mode, grace seconds, keepalive fps) from CAMERA_IDLE_MODE / _GRACE_SEC / CAMERA_KEEPALIVE_FPS."""
+    mode = getattr(settings, "CAMERA_IDLE_MODE", "keepalive")
+    if mode not in ("off", "keepalive", "release"):
+        print(f"[CameraManager] Unknown CAMERA_IDLE_MODE '{mode}', idle suspension disabled")
+        mode = "off"
+    grace = float(getattr(settings, "CAMERA_IDLE_GRACE_SEC", 60.0))
+    keepalive_fps = max(float(getattr(settings, "CAMERA_KEEPALIVE_FPS", 1.0)), 0.1)
+    return mode, grace, keepalive_fps
+
+
+def _is_jpeg_buffer(frame):
+    return frame is not None and frame.dtype == "uint8" and (frame.ndim == 1 or frame.shape[0] == 1) \
+        and frame.size > 2 and frame.flat[0] == 0xFF and frame.flat[1] == 0xD8
 
 
 class CameraManager:
-    def __init__(self, source=0, retry_delay=2.0, max_retries=5, force_backend=cv2.CAP_V4L2):
+    """
+    Owns the camera source and the single capture thread reading it.
+
+    When nothing needs frames (no stream viewers, no subscription that keeps
+    the camera awake) for `idle_grace` seconds, capture is suspended:
+    "keepalive" reads `keepalive_fps` frames per second with the device kept
+    open, "release" closes the device. wake() / resume() or a new viewer or
+    subscription bring it back to full rate; with "release" within one
+    device open.
+    """
+
+    def __init__(self, source=0, retry_delay=2.0, max_retries=5, force_backend=None, passthrough=None,
+                 idle_mode=None, idle_grace=None, keepalive_fps=None):
+        # Anything open_source() accepts: device, URL, file or synthetic://
         self.source = source
         self.retry_delay = retry_delay
         self.max_retries = max_retries
         self.backend = force_backend
+        # Opt-in: ask the camera for MJPG and keep its JPEG bytes instead of
+        # decoding to BGR (CAMERA_PASSTHROUGH=1). Pixels are decoded lazily.
+        self.passthrough = _passthrough_from_env() if passthrough is None else passthrough
+        # True while the open device actually delivers JPEG buffers
+        self.compressed = False
+        # Controls set on the open capture (name -> value), so settings
+        # changes only touch what differs; cleared whenever it is reopened
+        self.applied_controls = {}
 
         self.cap = None
-        self.lock = threading.Lock()
+        self.lock = TimedLock("camera_manager")
         self.running = True
-        self.frame = None
+        # Preallocated buffers the capture thread decodes into; frames are
+        # handed out as counted read-only references
+        self.ring = FrameRing()
+        self.frame_seq = 0
+        # Signalled by the capture thread whenever a new frame is stored
+        self.frame_ready = threading.Condition(self.lock)
+        # The capture thread is the only reader of the device; everything
+        # else registers here and waits for frames
+        self.subscribers = set()
+        # Subscriptions that need full-rate frames (not e.g. the livestream watcher)
+        self._awake_subscribers = 0
         self.thread = None
 
+        config_mode, config_grace, config_fps = _idle_config()
+        self.idle_mode = idle_mode or config_mode
+        self.idle_grace = config_grace if idle_grace is None else idle_grace
+        self.keepalive_fps = config_fps if keepalive_fps is None else max(keepalive_fps, 0.1)
+        # True while capture is suspended for lack of consumers
+        self.idle = False
+        self._last_demand = time.monotonic()
+        self._last_keepalive = 0.0
+        self._wake = threading.Event()
+
         print("[CameraManager] Initializing...")
 
         if not self._restart_camera():
@@ -35,11 +100,19 @@ class CameraManager:
         globals()["camera"] = self
 
     def _open_camera(self):
-        cap = cv2.VideoCapture(self.source, self.backend)
+        self.applied_controls = {}
+        cap = open_source(self.source, self.backend)
         if cap.isOpened():
-            ret, _ = cap.read()
+            if self.passthrough:
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+                cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            ret, frame = cap.read()
             if ret:
-                print("[CameraManager] Camera opened and first frame read successfully")
+                self.compressed = self.passthrough and _is_jpeg_buffer(frame)
+                if self.passthrough and not self.compressed:
+                    print("[CameraManager] Camera does not deliver MJPG, falling back to decoded capture")
+                    cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+                print(f"[CameraManager] Camera opened and first frame read successfully: {cap.describe()}")
                 return cap
             else:
                 print("[CameraManager] Camera opened but failed to read frame")
@@ -50,10 +123,13 @@ class CameraManager:
 
     def _restart_camera(self):
         print("[CameraManager] Restarting camera")
+        if self.thread is not None:
+            capture_stats.restarts += 1
         if self.cap:
             self.cap.release()
             self.cap = None
-            self._wait_for_device_release()
+            if is_device_source(self.source):
+                self._wait_for_device_release()
 
         for attempt in range(1, self.max_retries + 1):
             cap = self._open_camera()
@@ -70,7 +146,7 @@ class CameraManager:
         start = time.time()
         while time.time() - start < timeout:
             if os.path.exists("/dev/video0"):
-                cap = cv2.VideoCapture(self.source, self.backend)
+                cap = open_source(self.source, self.backend)
                 if cap.isOpened():
                     cap.release()
                     print("[CameraManager] Device available again.")
@@ -87,10 +163,20 @@ class CameraManager:
 
         fail_count = 0
         while self.running:
-            ret, frame = self.cap.read() if self.cap else (False, None)
+            if self._suspend_if_idle():
+                continue
+            slot = self.ring.begin_write()
+            if not self.cap:
+                ret, frame = False, None
+            elif slot.buffer is not None and not self.compressed:
+                ret, frame = self.cap.read(image=slot.buffer)
+            else:
+                ret, frame = self.cap.read()
 
             if not ret or frame is None:
+                self.ring.abort(slot)
                 fail_count += 1
+                capture_stats.read_failures += 1
                 print(f"[CameraManager] Frame read failed ({fail_count}/5)")
 
                 if fail_count > 5:
@@ -103,30 +189,172 @@ class CameraManager:
                 continue
 
             fail_count = 0
-            with self.lock:
-                self.frame = frame
+            timestamp = time.time()
+            with self.frame_ready:
+                self.frame_seq += 1
+                self.ring.commit(slot, frame, self.frame_seq, timestamp, compressed=self.compressed)
+                self.frame_ready.notify_all()
+            capture_stats.frame(timestamp)
+            app_globals.frame_hub.publish(self.ring.latest())
+
+    def _wants_frames(self):
+        return app_globals.active_stream_viewers > 0 or self._awake_subscribers > 0
+
+    def _suspend_if_idle(self):
+        """
+        Called by the capture thread before every read. Returns True if the
+        read is to be skipped because capture is suspended.
+        """
+        if self.idle_mode == "off":
+            return False
+        now = time.monotonic()
+        if self._wants_frames():
+            self._last_demand = now
+        if now - self._last_demand < self.idle_grace:
+            return not self._resume() if self.idle else False
+
+        if not self.idle:
+            self._suspend()
+        if self.idle_mode == "keepalive":
+            due = self._last_keepalive + 1.0 / self.keepalive_fps
+            if now >= due:
+                self._last_keepalive = now
+                return False
+            timeout = min(due - now, 1.0)
+        else:
+            timeout = 1.0
+        # Sleeps until woken or the next keepalive read; demand is re-checked
+        # at least once a second
+        if self._wake.wait(timeout=timeout):
+            self._wake.clear()
+        return True
+
+    def _suspend(self):
+        print(f"[CameraManager] No consumers for {self.idle_grace:g}s, suspending capture ({self.idle_mode})")
+        self.idle = True
+        if self.idle_mode == "release" and self.cap:
+            self.cap.release()
+            self.cap = None
+            # Don't serve a frame from before the pause as the current one
+            app_globals.frame_hub.clear()
+
+    def _resume(self):
+        """Capture thread: back to full rate. Returns False if the device could not be reopened."""
+        if self.cap is None:
+            cap = self._open_camera()
+            if cap is None:
+                print("[CameraManager] Could not reopen camera after idle, retrying")
+                time.sleep(self.retry_delay)
+                return False
+            self.cap = cap
+            self._apply_video_settings()
+        with self.frame_ready:
+            self.idle = False
+            self.frame_ready.notify_all()
+        print("[CameraManager] Capture resumed")
+        return True
+
+    def _apply_video_settings(self):
+        from .camera_utils import apply_cv_settings, get_camera_settings
+        try:
+            apply_cv_settings(self, get_camera_settings(), mode="video")
+        except Exception as e:
+            print(f"[CameraManager] Failed to apply video settings after resume: {e}")
+
+    def wake(self):
+        """Marks that frames are needed now; a suspended capture starts resuming immediately."""
+        self._last_demand = time.monotonic()
+        self._wake.set()
 
-            time.sleep(0.01)
+    def resume(self, timeout=None):
+        """
+        Wakes a suspended capture and waits until it is back at full rate,
+        at most `timeout` seconds (CAMERA_RESUME_TIMEOUT_SEC, default 5).
+        Returns True if capture is running.
+        """
+        if timeout is None:
+            timeout = float(getattr(settings, "CAMERA_RESUME_TIMEOUT_SEC", 5.0))
+        self.wake()
+        with self.frame_ready:
+            self.frame_ready.wait_for(lambda: not self.idle or not self.running, timeout=timeout)
+            return self.running and not self.idle
 
     def is_available(self):
         with self.lock:
-            return self.cap is not None and self.cap.isOpened()
+            # A device released while idle is reopened on demand
+            return (self.idle and self.running) or (self.cap is not None and self.cap.isOpened())
 
     def get_frame(self):
-        with self.lock:
-            return self.frame.copy() if self.frame is not None else None
+        """
+        Returns a private, writable copy of the latest frame. Hot paths should
+        use acquire_frame() or wait_for_frame() instead, which don't copy.
+        """
+        ref = self.ring.latest()
+        if ref is None:
+            return None
+        with ref as frame:
+            return frame.copy()
 
     def get_latest_frame(self):
         return self.get_frame()
 
+    def acquire_frame(self):
+        """
+        Returns a FrameRef to the latest frame without copying, or None.
+        The caller must release() it.
+        """
+        return self.ring.latest()
+
+    def wait_for_frame(self, last_seq=0, timeout=1.0):
+        """
+        Blocks until a frame newer than last_seq is available. Any sequence
+        number other than last_seq counts as newer, so callers holding a seq
+        from a previous CameraManager instance don't stall after a restart.
+        Returns (seq, FrameRef); the ref is None on timeout and must
+        otherwise be released by the caller.
+        """
+        with self.frame_ready:
+            if not self.frame_ready.wait_for(
+                lambda: self.frame_seq != last_seq or not self.running,
+                timeout=timeout
+            ):
+                return last_seq, None
+            if not self.running:
+                return last_seq, None
+            ref = self.ring.latest()
+            return (ref.seq, ref) if ref is not None else (last_seq, None)
+
+    def subscribe(self, subscription):
+        with self.lock:
+            if subscription not in self.subscribers and subscription.keeps_awake:
+                self._awake_subscribers += 1
+            self.subscribers.add(subscription)
+        if subscription.keeps_awake:
+            self.wake()
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscribers and subscription.keeps_awake:
+                self._awake_subscribers -= 1
+            self.subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
     def stop(self):
         print("[CameraManager] Stopping camera")
         self.running = False
+        self._wake.set()
+        with self.frame_ready:
+            self.frame_ready.notify_all()
         if self.cap:
             self.cap.release()
             self.cap = None
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=2)
+        app_globals.frame_hub.clear()
+        self.ring.clear()
         app_globals.camera = None
         globals()["camera"] = None
 
@@ -142,6 +370,73 @@ class CameraManager:
     def is_open(self):
         return self.cap is not None and self.cap.isOpened()
 
+    def source_info(self):
+        """Type, native resolution and fps of the open source, or None."""
+        cap = self.cap
+        return cap.describe() if cap is not None else None
+
+
+class FrameSubscription:
+    """
+    Consumer handle on the capture thread of the current CameraManager.
+
+    next() blocks until a frame newer than the last one this subscription saw
+    is available and returns it as a FrameRef that must be released. If the
+    CameraManager is replaced (restart, reinit), the subscription follows the
+    new instance transparently.
+
+    While it exists, the camera is kept at full frame rate unless
+    keeps_awake=False (observers that should not prevent idle suspension).
+    """
+
+    def __init__(self, name, keeps_awake=True):
+        self.name = name
+        self.keeps_awake = keeps_awake
+        self.last_seq = 0
+        self.camera = None
+
+    def _attach(self, camera):
+        if self.camera is not None:
+            self.camera.unsubscribe(self)
+        self.camera = camera
+        self.last_seq = 0
+        if camera is not None:
+            camera.subscribe(self)
+
+    def skip_to_latest(self):
+        """Makes the next call to next() wait for a frame captured after now."""
+        camera = app_globals.camera
+        if camera is not self.camera:
+            self._attach(camera)
+        if camera is not None:
+            self.last_seq = camera.frame_seq
+
+    def resume_after(self, seq):
+        """Makes the next call to next() skip the frame `seq`, e.g. one taken with acquire_frame()."""
+        camera = app_globals.camera
+        if camera is not self.camera:
+            self._attach(camera)
+        self.last_seq = seq
+
+    def next(self, timeout=1.0):
+        camera = app_globals.camera
+        if camera is not self.camera:
+            self._attach(camera)
+        if camera is None:
+            time.sleep(min(timeout, 0.5))
+            return None
+        self.last_seq, frame_ref = camera.wait_for_frame(self.last_seq, timeout=timeout)
+        return frame_ref
+
+    def close(self):
+        self._attach(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
 
 # Optional: Singleton-Schutz & Cleanup
 
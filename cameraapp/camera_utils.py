@@ -9,44 +9,64 @@ import threading
 from django.apps import apps
 from cameraapp.camera_manager import CameraManager
 from cameraapp.livestream_job import LiveStreamJob
+from cameraapp.frame_sources import open_source, configured_source, serves_source
 from .globals import app_globals
 
 
 logger = logging.getLogger(__name__)
 
 def get_camera_settings():
-    CameraSettings = apps.get_model("cameraapp", "CameraSettings")
-    return CameraSettings.objects.first()
+    """
+    Current settings as a read-only SettingsSnapshot, served from memory.
+    Use get_camera_settings_safe() to get a model instance that can be saved.
+    """
+    from .settings_cache import settings_cache
+    return settings_cache.get()
 
 def is_camera_device_available(device="/dev/video0"):
     return os.path.exists(device) and os.access(device, os.R_OK | os.W_OK)
 
 def get_camera_settings_safe(connection=None):
     """
-    Safe wrapper around get_camera_settings; included for backward compatibility.
+    The CameraSettings model instance, read from the database; for code that
+    modifies and saves the settings.
     """
-    return get_camera_settings()
+    CameraSettings = apps.get_model("cameraapp", "CameraSettings")
+    return CameraSettings.objects.first()
 
 
-def apply_cv_settings(manager, settings, mode="video"):
+# Controls that auto exposure takes over (set with skip_if_auto below)
+AUTO_EXPOSURE_CONTROLS = ("exposure",)
+
+
+def apply_cv_settings(manager, settings, mode="video", verify=False):
+    """
+    Applies the video_* or photo_* controls of `settings` to the open capture.
+
+    Only controls whose value differs from what was last applied to this
+    capture are set, so switching modes or saving one slider costs a single
+    ioctl instead of a full round. Values are read back only with
+    verify=True. Returns {"changed": {...}, "actual": {...}, "latency_ms": ...},
+    or None if nothing could be applied.
+    """
     if not settings:
         logger.warning("No camera settings provided")
-        return
+        return None
 
     cap = manager.cap
     if not cap or not cap.isOpened():
         logger.error("Camera is not opened")
-        return
+        return None
 
+    started = time.perf_counter()
     prefix = "video_" if mode == "video" else "photo_"
     exposure_mode = getattr(settings, f"{prefix}exposure_mode", "manual").lower()
 
-    if exposure_mode == "auto":
-        cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.75)
-    else:
-        cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 0.25)
+    # Desired state in apply order: auto exposure first, it decides
+    # whether the exposure value is accepted at all
+    controls = {"auto_exposure": 0.75 if exposure_mode == "auto" else 0.25}
 
-    def apply_param(name, min_val, max_val, skip_if_auto=False):
+    def add_param(name, min_val, max_val, skip_if_auto=False):
         raw_value = getattr(settings, f"{prefix}{name}", None)
         if raw_value is None:
             return
@@ -61,29 +81,72 @@ def apply_cv_settings(manager, settings, mode="video"):
         if not (min_val <= value <= max_val):
             logger.warning(f"{name} value {value} out of range")
             return
-
+        controls[name] = value
+
+    add_param("brightness", 0.0, 255.0)
+    add_param("contrast", 0.0, 255.0)
+    add_param("saturation", 0.0, 255.0)
+    add_param("gain", 0.0, 10.0)
+    add_param("exposure", -13.0, -1.0, skip_if_auto=True)
+
+    applied = manager.applied_controls
+    changed = {}
+    actual = {}
+    for name, value in controls.items():
+        if applied.get(name) == value:
+            continue
         prop_id = getattr(cv2, f"CAP_PROP_{name.upper()}", None)
         if prop_id is None:
             logger.warning(f"Unknown property: {name}")
-            return
-
-        cap.set(prop_id, value)
-        actual = cap.get(prop_id)
-        logger.info(f"Set {name} = {value}, actual = {actual}")
-
-    apply_param("brightness", 0.0, 255.0)
-    apply_param("contrast", 0.0, 255.0)
-    apply_param("saturation", 0.0, 255.0)
-    apply_param("gain", 0.0, 10.0)
-    apply_param("exposure", -13.0, -1.0, skip_if_auto=True)
+            continue
+        if cap.set(prop_id, value):
+            applied[name] = value
+            if name == "auto_exposure":
+                # The driver has been adjusting these itself (or is about to);
+                # what we last set says nothing about the device any more
+                for dependent in AUTO_EXPOSURE_CONTROLS:
+                    applied.pop(dependent, None)
+        changed[name] = value
+        if verify:
+            actual[name] = cap.get(prop_id)
+
+    latency_ms = (time.perf_counter() - started) * 1000.0
+    if changed:
+        logger.info(f"Applied {mode} controls {changed} in {latency_ms:.1f} ms"
+                    + (f", actual = {actual}" if verify else ""))
+    return {"changed": changed, "actual": actual, "latency_ms": latency_ms}
+
+
+def apply_settings_live(settings, mode="video", source=None, verify=False):
+    """
+    Hot-applies changed controls to the running camera without touching the
+    stream. Returns the apply_cv_settings() report, or None if the change
+    needs a device restart instead: no open camera, or a different source.
+    Resolution is not a capture parameter here (it only sizes recordings),
+    so it never requires one.
+    """
+    manager = app_globals.camera
+    if manager is None:
+        return None
+    if source is not None and not serves_source(manager.source, source):
+        return None
+    # Serialized with photo captures, which switch to the photo controls and back
+    with app_globals.camera_lock:
+        if manager.idle and not manager.is_open():
+            # Device released while idle; the current settings are applied when it reopens
+            return {"changed": {}, "actual": {}, "latency_ms": 0.0, "deferred": True}
+        if not manager.is_open():
+            return None
+        return apply_cv_settings(manager, settings, mode=mode, verify=verify)
 
 
-def try_open_camera(source, backend=cv2.CAP_V4L2):
+def try_open_camera(source, backend=None):
     """
-    Attempt to open a camera device; returns a VideoCapture or None.
+    Attempt to open a camera source (see frame_sources.open_source); returns
+    a FrameSource or None.
     """
     try:
-        cap = cv2.VideoCapture(source, backend)
+        cap = open_source(source, backend)
         if cap.isOpened():
             ret, _ = cap.read()
             if ret:
@@ -106,14 +169,6 @@ def safe_restart_camera_stream(frame_callback=None, camera_source=None):
     """
     global app_globals
 
-    # Fallback für frame_callback → aktualisiert globalen latest_frame
-    if frame_callback is None:
-        def default_callback(frame):
-            with app_globals.latest_frame_lock:
-                app_globals.latest_frame = frame.copy()
-        frame_callback = default_callback
-
-
     # Debug zur Kamera
     if not app_globals.camera:
         logger.error("camera is None after initialization")
@@ -160,9 +215,8 @@ def safe_restart_camera_stream(frame_callback=None, camera_source=None):
         # 4) Neuen LiveStreamJob starten
         try:
             new_job = LiveStreamJob(
-                camera_source=None,  # wird ignoriert, da shared_capture gesetzt
-                frame_callback=frame_callback,
-                shared_capture=(app_globals.camera.cap if app_globals.camera else None)
+                camera_source=camera_source,
+                frame_callback=frame_callback
             )
             new_job.start()
             time.sleep(0.5)
@@ -185,18 +239,16 @@ def force_restart_livestream():
     """
     logger.info("force_restart_livestream called")
     return safe_restart_camera_stream(
-        camera_source=os.getenv("CAMERA_URL", 0),
-        frame_callback=update_latest_frame
+        camera_source=configured_source()
     )
 
 
 def release_and_reset_camera():
     global app_globals
     try:
-        app_globals.camera.release() 
-        if app_globals.livestream_job and app_globals.livestream_job.capture:
-            app_globals.livestream_job.capture.release()
-            app_globals.livestream_job.capture = None
+        # Stop the capture thread too, so the next CameraManager is the only reader
+        if app_globals.camera:
+            app_globals.camera.stop()
         if app_globals.livestream_job:
             app_globals.livestream_job.stop()
             app_globals.livestream_job.join(timeout=2)
@@ -213,11 +265,6 @@ def update_livestream_job(new_job):
     app_globals.livestream_job = new_job
 
 
-def update_latest_frame(frame):
-    global app_globals
-    with app_globals.latest_frame_lock:
-        app_globals.latest_frame = frame.copy()
-
 
 
 def force_device_reset(device_path="/dev/video0"):
@@ -260,7 +307,8 @@ def start_camera_watchdog(interval_sec=10):
         while True:
             try:
                 cam = app_globals.camera
-                if not cam or not cam.cap or not cam.cap.isOpened():
+                # A camera suspended for lack of viewers counts as available
+                if not cam or not cam.is_available():
                     logger.warning("[WATCHDOG] Camera not available. Trying to restart...")
                     from .camera_core import init_camera
                     init_camera()
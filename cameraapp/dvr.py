@@ -0,0 +1,200 @@
+# cameraapp/dvr.py
+
+import os
+import threading
+import time
+import logging
+import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .globals import app_globals
+from .models import RecordingSegment
+from .recording_job import RecordingJob
+from .media_index import record_media_file
+
+logger = logging.getLogger(__name__)
+
+RECORD_DIR = os.path.join(settings.MEDIA_ROOT, "recordings")
+
+
+def _to_datetime(ts: float) -> datetime.datetime:
+    moment = datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc)
+    return moment if settings.USE_TZ else timezone.make_naive(moment)
+
+
+class SegmentedRecordingJob(RecordingJob):
+    """
+    Continuous recording split into back-to-back files of segment_seconds.
+
+    Runs until stop(). Segments are cut by output frame count, so with the
+    paced RecordingJob clock every file covers exactly segment_seconds and no
+    frame falls between two files. The writer for the next segment is opened
+    in the background while the current one is still being written; the
+    finished writer is released (and its index entry completed) in the
+    background as well, so a rotation never stalls the writer thread.
+    """
+
+    def __init__(self, directory: str, segment_seconds: float, fps: float,
+                 resolution: tuple[int, int], codec: str, frame_provider=None, queue_size: int = 8):
+        super().__init__(
+            filepath=directory,
+            duration=None,
+            fps=fps,
+            resolution=resolution,
+            codec=codec,
+            frame_provider=frame_provider,
+            queue_size=queue_size
+        )
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.segment_frames = max(1, round(segment_seconds * fps))
+        self.segments = 0
+        self._current = None
+        self._next = None
+        self._next_ready = threading.Event()
+        self._closers = []
+        # Opening the next entry and completing the previous one happen at the
+        # same moment on different threads; SQLite wants them one at a time
+        self._index_lock = threading.Lock()
+
+    def _segment_path(self, index: int) -> str:
+        # Named after the segment's nominal start (estimated from now until
+        # the clock has started)
+        base = self.started_at if self.started_at else time.time()
+        start = base + index * self.segment_seconds
+        name = time.strftime("dvr_%Y%m%d-%H%M%S", time.localtime(start))
+        return os.path.join(self.directory, f"{name}_{index:05d}.mp4")
+
+    def _open_segment(self, index: int):
+        path = self._segment_path(index)
+        out = self._open_writer(path)
+        return {"index": index, "path": path, "out": out, "frames": 0} if out is not None else None
+
+    def _prepare_next(self, index: int):
+        self._next_ready.clear()
+
+        def prepare():
+            self._next = self._open_segment(index)
+            self._next_ready.set()
+
+        threading.Thread(target=prepare, daemon=True).start()
+
+    def _open_output(self) -> bool:
+        os.makedirs(self.directory, exist_ok=True)
+        self._current = self._open_segment(0)
+        if self._current is None:
+            return False
+        self._prepare_next(1)
+        return True
+
+    def _write(self, pixels):
+        current = self._current
+        if current["frames"] >= self.segment_frames:
+            current = self._rotate()
+        if current["frames"] == 0:
+            self._index_open(current)
+        current["out"].write(pixels)
+        current["frames"] += 1
+
+    def _rotate(self):
+        finished = self._current
+        self._next_ready.wait()
+        upcoming = self._next
+        if upcoming is None:
+            raise IOError("could not open next DVR segment")
+        self._current, self._next = upcoming, None
+        self._prepare_next(upcoming["index"] + 1)
+
+        closer = threading.Thread(target=self._finish_segment, args=(finished,), daemon=True)
+        closer.start()
+        self._closers = [t for t in self._closers if t.is_alive()] + [closer]
+        return upcoming
+
+    def _close_output(self):
+        if self._current is not None:
+            if self._current["frames"]:
+                self._finish_segment(self._current)
+            else:
+                self._discard_segment(self._current)
+            self._current = None
+        self._next_ready.wait(timeout=5.0)
+        if self._next is not None:
+            self._discard_segment(self._next)
+            self._next = None
+        for closer in self._closers:
+            closer.join(timeout=10.0)
+        logger.info(f"[DVR] Stopped after {self.segments} segments")
+
+    def _segment_times(self, segment):
+        start = self.started_at + segment["index"] * self.segment_seconds
+        return start, start + segment["frames"] / self.fps
+
+    def _index_open(self, segment):
+        if self.started_at is None:
+            self.started_at = time.time()
+        start, _ = self._segment_times(segment)
+        try:
+            with self._index_lock:
+                close_old_connections()
+                RecordingSegment.objects.update_or_create(
+                    path=segment["path"],
+                    defaults={"started_at": _to_datetime(start), "ended_at": None, "fps": self.fps}
+                )
+        except Exception as e:
+            logger.warning(f"[DVR] Could not index segment {segment['path']}: {e}")
+
+    def _finish_segment(self, segment):
+        segment["out"].release()
+        self.segments += 1
+        _, end = self._segment_times(segment)
+        size = os.path.getsize(segment["path"]) if os.path.exists(segment["path"]) else 0
+        record_media_file(segment["path"])
+        try:
+            with self._index_lock:
+                close_old_connections()
+                RecordingSegment.objects.filter(path=segment["path"]).update(
+                    ended_at=_to_datetime(end),
+                    frames=segment["frames"],
+                    size_bytes=size
+                )
+        except Exception as e:
+            logger.warning(f"[DVR] Could not complete index entry for {segment['path']}: {e}")
+        logger.info(f"[DVR] Segment closed: {segment['path']} ({segment['frames']} frames)")
+
+    def _discard_segment(self, segment):
+        segment["out"].release()
+        try:
+            os.remove(segment["path"])
+        except OSError:
+            pass
+
+
+def configure_dvr(settings_obj) -> Optional[SegmentedRecordingJob]:
+    """Starts or stops app_globals.dvr_job to match the DVR fields of CameraSettings."""
+    enabled = bool(settings_obj and getattr(settings_obj, "dvr_enabled", False))
+    job = app_globals.dvr_job
+    if job and job.active:
+        if enabled and job.segment_seconds == settings_obj.dvr_segment_sec \
+                and job.fps == settings_obj.record_fps \
+                and job.resolution == (settings_obj.resolution_width, settings_obj.resolution_height):
+            return job
+        job.stop()
+    app_globals.dvr_job = None
+
+    if not enabled:
+        return None
+
+    job = SegmentedRecordingJob(
+        directory=RECORD_DIR,
+        segment_seconds=max(1, settings_obj.dvr_segment_sec),
+        fps=settings_obj.record_fps,
+        resolution=(settings_obj.resolution_width, settings_obj.resolution_height),
+        codec=settings_obj.video_codec
+    )
+    job.start()
+    app_globals.dvr_job = job
+    return job
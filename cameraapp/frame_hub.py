@@ -0,0 +1,373 @@
+# cameraapp/frame_hub.py
+
+import asyncio
+import threading
+import time
+import logging
+from typing import Any, AsyncIterator, Iterator, Optional
+
+import cv2
+
+from .frame_ring import FrameRef
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class EncodedFrame:
+    """
+    Immutable JPEG payload shared by every viewer of one captured frame.
+    """
+    __slots__ = ("seq", "data", "timestamp", "mjpeg_part")
+
+    def __init__(self, seq: int, data: bytes, timestamp: float):
+        self.seq = seq
+        self.data = data
+        self.timestamp = timestamp
+        # Pre-framed multipart chunk so viewers don't each concatenate a copy
+        self.mjpeg_part = (
+            b"--frame\r\n"
+            b"Content-Type: image/jpeg\r\n\r\n" + data + b"\r\n"
+        )
+
+
+class StreamProfile:
+    """
+    Client-selectable output variant of the stream: maximum width, JPEG
+    quality and maximum frame rate. None means "as captured" / OpenCV default.
+    Profiles are hashable values, so equal requests share one encode.
+    """
+    __slots__ = ("max_width", "quality", "max_fps")
+
+    PRESETS = {
+        "thumb": (320, 60, 5.0),
+        "mobile": (640, 70, 10.0),
+        "full": (None, None, None),
+    }
+
+    def __init__(self, max_width: Optional[int] = None, quality: Optional[int] = None,
+                 max_fps: Optional[float] = None):
+        self.max_width = max_width
+        self.quality = quality
+        self.max_fps = max_fps
+
+    @classmethod
+    def from_query(cls, params) -> "StreamProfile":
+        """
+        Builds a profile from request.GET (`profile`, `width`, `quality`, `fps`).
+        Raises ValueError for malformed values; out-of-range values are clamped.
+        """
+        max_width, quality, max_fps = cls.PRESETS.get(params.get("profile", "full"), (None, None, None))
+        if params.get("width"):
+            max_width = min(max(int(params["width"]), 16), 4096)
+        if params.get("quality"):
+            quality = min(max(int(params["quality"]), 1), 100)
+        if params.get("fps"):
+            max_fps = min(max(float(params["fps"]), 0.1), 60.0)
+        return cls(max_width, quality, max_fps)
+
+    def _key(self):
+        return (self.max_width, self.quality, self.max_fps)
+
+    def __eq__(self, other):
+        return isinstance(other, StreamProfile) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"StreamProfile(max_width={self.max_width}, quality={self.quality}, max_fps={self.max_fps})"
+
+    def encode_key(self):
+        # max_fps only affects pacing, not the encoded bytes
+        return (self.max_width, self.quality)
+
+
+DEFAULT_PROFILE = StreamProfile()
+
+
+class _ProfileCache:
+    """Latest encode of one (width, quality) variant and when it was last used."""
+    __slots__ = ("encoded", "lock", "last_used")
+
+    def __init__(self):
+        self.encoded: Optional[EncodedFrame] = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class _LoopWaiters:
+    """Async viewers of one event loop, woken together by a single Event."""
+    __slots__ = ("event", "count", "encodes")
+
+    def __init__(self):
+        self.event = asyncio.Event()
+        self.count = 0
+        # encode key -> (seq, executor future) of the encode in flight
+        self.encodes = {}
+
+
+class FrameBroadcastHub:
+    """
+    Single point where the capture thread hands over frames for delivery.
+
+    The capture thread calls publish() for every frame it reads. The JPEG for a
+    given frame is produced at most once, on the first request for it, and the
+    same bytes object is then handed to every MJPEG viewer and snapshot request
+    until a newer frame is published.
+
+    publish() takes ownership of a FrameRef and releases it once it has been
+    superseded, so the ring buffer can be reused. Plain arrays are accepted too.
+
+    Threaded (WSGI) viewers block on a Condition; asyncio (ASGI) viewers await
+    a per-event-loop Event that publish() sets with one call_soon_threadsafe
+    per loop, so idle async viewers cost a suspended coroutine each.
+
+    Every StreamProfile (width/quality) gets its own encode cache, so each
+    distinct profile is resized and encoded once per frame regardless of how
+    many viewers use it. Profiles unused for profile_ttl seconds are dropped.
+    """
+
+    def __init__(self, profile_ttl: float = 60.0):
+        self._lock = threading.Lock()
+        # Signalled on every publish so viewers block instead of polling
+        self._new_frame = threading.Condition(self._lock)
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        # StreamProfile.encode_key() -> _ProfileCache
+        self._profiles = {}
+        self._profile_ttl = profile_ttl
+        self._last_eviction = time.monotonic()
+        # event loop -> _LoopWaiters
+        self._async_waiters = {}
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def publish(self, frame: Any) -> int:
+        with self._new_frame:
+            previous = self._frame
+            self._seq += 1
+            self._frame = frame
+            self._timestamp = time.time()
+            self._new_frame.notify_all()
+            seq = self._seq
+            loops = list(self._async_waiters)
+        if isinstance(previous, FrameRef):
+            previous.release()
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:
+                # Loop was closed without its waiters unregistering
+                with self._lock:
+                    self._async_waiters.pop(loop, None)
+        return seq
+
+    def clear(self) -> None:
+        with self._lock:
+            previous = self._frame
+            self._frame = None
+            self._profiles.clear()
+        if isinstance(previous, FrameRef):
+            previous.release()
+
+    def active_profiles(self) -> int:
+        with self._lock:
+            return len(self._profiles)
+
+    def wait_for_jpeg(self, after_seq: int, timeout: float = 1.0,
+                      profile: StreamProfile = DEFAULT_PROFILE) -> Optional[EncodedFrame]:
+        """
+        Blocks until a frame newer than after_seq has been published and
+        returns its JPEG, or None on timeout.
+        """
+        with self._new_frame:
+            if not self._new_frame.wait_for(
+                lambda: self._seq > after_seq and self._frame is not None,
+                timeout=timeout
+            ):
+                return None
+        return self.get_jpeg(profile)
+
+    def _wake_loop(self, loop) -> None:
+        # Runs on the event loop thread: swap in a fresh Event, set the old one
+        with self._lock:
+            waiters = self._async_waiters.get(loop)
+            if waiters is None:
+                return
+            event, waiters.event = waiters.event, asyncio.Event()
+        event.set()
+
+    async def wait_for_jpeg_async(self, after_seq: int, timeout: Optional[float] = None,
+                                  profile: StreamProfile = DEFAULT_PROFILE) -> Optional[EncodedFrame]:
+        """
+        Async counterpart of wait_for_jpeg() for ASGI viewers. Never blocks
+        the event loop: if the frame still needs encoding, one executor job
+        per frame is shared by every coroutine on this loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiters = self._async_waiters.get(loop)
+            if waiters is None:
+                waiters = self._async_waiters[loop] = _LoopWaiters()
+            waiters.count += 1
+            event = waiters.event
+            ready = self._seq > after_seq and self._frame is not None
+        try:
+            if not ready:
+                if timeout is None:
+                    await event.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        return None
+
+            encoded = self.peek_jpeg(profile)
+            if encoded is not None:
+                return encoded
+            seq = self._seq
+            key = profile.encode_key()
+            in_flight = waiters.encodes.get(key)
+            if in_flight is None or in_flight[0] != seq:
+                in_flight = (seq, loop.run_in_executor(None, self.get_jpeg, profile))
+                waiters.encodes[key] = in_flight
+            return await asyncio.shield(in_flight[1])
+        finally:
+            with self._lock:
+                waiters.count -= 1
+                if waiters.count == 0 and self._async_waiters.get(loop) is waiters:
+                    del self._async_waiters[loop]
+
+    def peek_jpeg(self, profile: StreamProfile = DEFAULT_PROFILE) -> Optional[EncodedFrame]:
+        """Returns the latest frame's JPEG only if it has already been encoded."""
+        with self._lock:
+            cache = self._profiles.get(profile.encode_key())
+            encoded = cache.encoded if cache is not None else None
+            if encoded is not None and encoded.seq == self._seq and self._frame is not None:
+                cache.last_used = time.monotonic()
+                return encoded
+        return None
+
+    def mjpeg_stream(self, profile: StreamProfile = DEFAULT_PROFILE) -> Iterator[bytes]:
+        """Multipart MJPEG body for threaded/greenlet (WSGI) responses."""
+        last_seq = 0
+        min_interval = 1.0 / profile.max_fps if profile.max_fps else 0.0
+        next_send = 0.0
+        viewer = metrics.viewer_connected("sync", profile)
+        try:
+            while True:
+                if min_interval:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                # Blocks until the capture thread publishes a newer frame
+                encoded = self.wait_for_jpeg(last_seq, timeout=1.0, profile=profile)
+                if encoded is not None:
+                    last_seq = encoded.seq
+                    next_send = time.monotonic() + min_interval
+                    viewer.delivered(len(encoded.mjpeg_part))
+                    yield encoded.mjpeg_part
+        finally:
+            metrics.viewer_disconnected(viewer)
+
+    async def mjpeg_stream_async(self, profile: StreamProfile = DEFAULT_PROFILE) -> AsyncIterator[bytes]:
+        """Multipart MJPEG body for async (ASGI) responses."""
+        last_seq = 0
+        min_interval = 1.0 / profile.max_fps if profile.max_fps else 0.0
+        next_send = 0.0
+        viewer = metrics.viewer_connected("async", profile)
+        try:
+            while True:
+                if min_interval:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                # No timeout needed: a disconnecting client cancels the coroutine
+                encoded = await self.wait_for_jpeg_async(last_seq, profile=profile)
+                if encoded is not None:
+                    last_seq = encoded.seq
+                    next_send = time.monotonic() + min_interval
+                    viewer.delivered(len(encoded.mjpeg_part))
+                    yield encoded.mjpeg_part
+        finally:
+            metrics.viewer_disconnected(viewer)
+
+    def get_jpeg(self, profile: StreamProfile = DEFAULT_PROFILE) -> Optional[EncodedFrame]:
+        """
+        Returns the latest frame encoded for the given profile, encoding it
+        if nobody on that profile has yet.
+        """
+        key = profile.encode_key()
+        now = time.monotonic()
+        with self._lock:
+            frame, seq, timestamp = self._frame, self._seq, self._timestamp
+            if frame is None:
+                return None
+            cache = self._profiles.get(key)
+            if cache is None:
+                cache = self._profiles[key] = _ProfileCache()
+            cache.last_used = now
+            encoded = cache.encoded
+            if encoded is not None and encoded.seq == seq:
+                return encoded
+            if now - self._last_eviction > self._profile_ttl / 4:
+                self._evict_idle_profiles(now)
+            # Keep the buffer alive while encoding even if a newer frame lands
+            if isinstance(frame, FrameRef):
+                frame = frame.clone()
+
+        try:
+            return self._encode(cache, profile, frame, seq, timestamp)
+        finally:
+            if isinstance(frame, FrameRef):
+                frame.release()
+
+    def _evict_idle_profiles(self, now: float) -> None:
+        # Called with self._lock held
+        self._last_eviction = now
+        for key, cache in list(self._profiles.items()):
+            if now - cache.last_used > self._profile_ttl:
+                del self._profiles[key]
+                logger.info(f"[FrameHub] Evicted idle stream profile {key}")
+
+    def _encode(self, cache: _ProfileCache, profile: StreamProfile, frame: Any,
+                seq: int, timestamp: float) -> Optional[EncodedFrame]:
+        with cache.lock:
+            # Another viewer on this profile may have encoded the frame while we waited.
+            encoded = cache.encoded
+            if encoded is not None and encoded.seq == seq:
+                return encoded
+
+            # Passthrough capture: forward the camera's own JPEG untouched
+            if isinstance(frame, FrameRef) and profile.max_width is None and profile.quality is None:
+                data = frame.jpeg
+                if data is not None:
+                    encoded = EncodedFrame(seq, data, timestamp)
+                    if cache.encoded is None or cache.encoded.seq < seq:
+                        cache.encoded = encoded
+                    return encoded
+
+            started = time.perf_counter()
+            pixels = frame.array if isinstance(frame, FrameRef) else frame
+            if pixels is None:
+                logger.warning(f"[FrameHub] Could not decode frame {seq}")
+                return None
+            if profile.max_width and pixels.shape[1] > profile.max_width:
+                height = max(1, round(pixels.shape[0] * profile.max_width / pixels.shape[1]))
+                pixels = cv2.resize(pixels, (profile.max_width, height), interpolation=cv2.INTER_AREA)
+            params = [cv2.IMWRITE_JPEG_QUALITY, profile.quality] if profile.quality else []
+            ret, buffer = cv2.imencode(".jpg", pixels, params)
+            if not ret:
+                logger.warning(f"[FrameHub] JPEG encode failed for frame {seq}")
+                return None
+            # Includes decoding (passthrough) and resizing: all of it is per-profile work
+            metrics.encode_histogram(profile.encode_key()).observe(time.perf_counter() - started)
+
+            encoded = EncodedFrame(seq, buffer.tobytes(), timestamp)
+            if cache.encoded is None or cache.encoded.seq < seq:
+                cache.encoded = encoded
+            return encoded
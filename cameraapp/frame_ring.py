@@ -0,0 +1,196 @@
+# cameraapp/frame_ring.py
+
+import threading
+import logging
+from typing import Optional
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    __slots__ = ("buffer", "view", "refs", "seq", "timestamp", "pooled",
+                 "compressed", "pixels", "decoded_seq", "decode_lock")
+
+    def __init__(self, pooled=True):
+        self.buffer = None
+        self.view = None
+        self.refs = 0
+        self.seq = 0
+        self.timestamp = 0.0
+        self.pooled = pooled
+        # In passthrough mode the buffer holds the camera's JPEG bytes and
+        # pixels are decoded on first access, once per frame
+        self.compressed = False
+        self.pixels = None
+        self.decoded_seq = -1
+        self.decode_lock = threading.Lock()
+
+    def adopt(self, array):
+        """
+        Takes ownership of an array the capture backend decoded into. A
+        read-only view is created once per buffer, not once per frame.
+        """
+        if array is not self.buffer:
+            self.buffer = array
+            self.view = array.view()
+            self.view.flags.writeable = False
+
+    def decoded(self):
+        with self.decode_lock:
+            if self.decoded_seq != self.seq:
+                pixels = cv2.imdecode(self.view, cv2.IMREAD_COLOR)
+                if pixels is not None:
+                    pixels.flags.writeable = False
+                self.pixels = pixels
+                self.decoded_seq = self.seq
+            return self.pixels
+
+
+class FrameRef:
+    """
+    Counted reference to one frame in a FrameRing.
+
+    `array` is a read-only view into the ring buffer. The buffer is not reused
+    for a new frame until every FrameRef pointing at it has been released, so
+    consumers must call release() (or use the ref as a context manager) as
+    soon as they are done with the pixels.
+
+    For compressed (passthrough) frames `jpeg` holds the camera's JPEG bytes
+    and `array` decodes them on first access.
+    """
+    __slots__ = ("_ring", "_slot", "seq", "timestamp")
+
+    def __init__(self, ring: "FrameRing", slot: _Slot):
+        self._ring = ring
+        self._slot = slot
+        self.seq = slot.seq
+        self.timestamp = slot.timestamp
+
+    @property
+    def array(self):
+        slot = self._slot
+        if slot is None:
+            return None
+        return slot.decoded() if slot.compressed else slot.view
+
+    @property
+    def jpeg(self) -> Optional[bytes]:
+        """The frame as delivered by the camera, if it arrived as JPEG."""
+        slot = self._slot
+        if slot is None or not slot.compressed:
+            return None
+        return slot.view.tobytes()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory kept alive by this reference: the ring buffer plus its decoded pixels, if any."""
+        slot = self._slot
+        if slot is None or slot.buffer is None:
+            return 0
+        size = slot.buffer.nbytes
+        if slot.compressed and slot.pixels is not None:
+            size += slot.pixels.nbytes
+        return size
+
+    def clone(self) -> "FrameRef":
+        return self._ring._retain(self._slot)
+
+    def copy(self):
+        """Returns a private, writable copy of the pixels."""
+        return self.array.copy()
+
+    def release(self) -> None:
+        if self._slot is not None:
+            self._ring._release(self._slot)
+            self._slot = None
+
+    def __enter__(self):
+        return self.array
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class FrameRing:
+    """
+    Pool of reusable frame buffers for a single capture thread.
+
+    The writer calls begin_write() to get a free slot, decodes into
+    slot.buffer via cap.read(image=...), then commit()s it. The ring itself
+    holds one reference to the most recent frame; readers take additional
+    references with latest(). Once the capture resolution is stable no new
+    arrays are allocated. If consumers hold on to more frames than the ring
+    has slots it grows up to max_size, after which frames are read into
+    unpooled buffers that are simply left to the garbage collector.
+    """
+
+    def __init__(self, size: int = 4, max_size: int = 16):
+        self._lock = threading.Lock()
+        self._slots = [_Slot() for _ in range(size)]
+        self._max_size = max_size
+        self._latest: Optional[_Slot] = None
+
+    def begin_write(self) -> _Slot:
+        with self._lock:
+            for slot in self._slots:
+                if slot.refs == 0:
+                    # Mark as in use so readers can't see a half-written frame
+                    slot.refs = 1
+                    return slot
+            if len(self._slots) < self._max_size:
+                slot = _Slot()
+                slot.refs = 1
+                self._slots.append(slot)
+                logger.info(f"[FrameRing] All buffers held by consumers, grew ring to {len(self._slots)}")
+                return slot
+        logger.warning("[FrameRing] Ring exhausted, using an unpooled buffer")
+        slot = _Slot(pooled=False)
+        slot.refs = 1
+        return slot
+
+    def commit(self, slot: _Slot, array, seq: int, timestamp: float, compressed: bool = False) -> None:
+        """
+        Publishes a written slot as the latest frame. The write reference
+        taken by begin_write() becomes the ring's own latest-frame reference.
+        """
+        slot.adopt(array)
+        slot.seq = seq
+        slot.timestamp = timestamp
+        slot.compressed = compressed
+        with self._lock:
+            previous, self._latest = self._latest, slot
+            if previous is not None:
+                previous.refs -= 1
+
+    def abort(self, slot: _Slot) -> None:
+        with self._lock:
+            slot.refs -= 1
+
+    def latest(self) -> Optional[FrameRef]:
+        with self._lock:
+            slot = self._latest
+            if slot is None:
+                return None
+            slot.refs += 1
+        return FrameRef(self, slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._latest is not None:
+                self._latest.refs -= 1
+                self._latest = None
+
+    def _retain(self, slot: _Slot) -> FrameRef:
+        with self._lock:
+            slot.refs += 1
+        return FrameRef(self, slot)
+
+    def _release(self, slot: _Slot) -> None:
+        with self._lock:
+            slot.refs -= 1
+
+    def buffers_in_use(self) -> int:
+        with self._lock:
+            return sum(1 for slot in self._slots if slot.refs > 0)
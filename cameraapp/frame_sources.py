@@ -0,0 +1,281 @@
+# cameraapp/frame_sources.py
+
+import os
+import time
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Controls a SyntheticSource accepts (and reports back), like a UVC camera
+SYNTHETIC_CONTROLS = (
+    cv2.CAP_PROP_AUTO_EXPOSURE, cv2.CAP_PROP_BRIGHTNESS, cv2.CAP_PROP_CONTRAST,
+    cv2.CAP_PROP_SATURATION, cv2.CAP_PROP_GAIN, cv2.CAP_PROP_EXPOSURE,
+)
+
+
+def configured_source():
+    """
+    The camera source from settings.CAMERA_URL (default: the CAMERA_URL
+    environment variable). Device indices are returned as int.
+    """
+    value = str(getattr(settings, "CAMERA_URL", None) or os.getenv("CAMERA_URL", "0")).strip()
+    return int(value) if value.isdigit() else value
+
+
+class FrameSource:
+    """
+    Something CameraManager can read frames from. The interface is the part
+    of cv2.VideoCapture the pipeline uses (isOpened, read, set, get,
+    release), so OpenCV captures and generated frames are interchangeable.
+    """
+    kind = "base"
+
+    def isOpened(self) -> bool:
+        return False
+
+    def read(self, image=None):
+        return False, None
+
+    def set(self, prop_id, value) -> bool:
+        return False
+
+    def get(self, prop_id) -> float:
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.native_resolution[0])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.native_resolution[1])
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.native_fps)
+        return 0.0
+
+    def release(self):
+        pass
+
+    @property
+    def native_resolution(self) -> tuple:
+        return (0, 0)
+
+    @property
+    def native_fps(self) -> float:
+        return 0.0
+
+    def describe(self) -> dict:
+        width, height = self.native_resolution
+        return {"type": self.kind, "width": width, "height": height, "fps": round(self.native_fps, 2)}
+
+
+class OpenCVSource(FrameSource):
+    """Any source cv2.VideoCapture understands: RTSP/HTTP URLs, files, pipelines."""
+    kind = "opencv"
+
+    def __init__(self, source, backend=cv2.CAP_ANY):
+        self.source = source
+        self.backend = backend
+        self.cap = cv2.VideoCapture(source, backend)
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        return self.cap.read() if image is None else self.cap.read(image=image)
+
+    def set(self, prop_id, value) -> bool:
+        return self.cap.set(prop_id, value)
+
+    def get(self, prop_id) -> float:
+        return self.cap.get(prop_id)
+
+    def release(self):
+        self.cap.release()
+
+    @property
+    def native_resolution(self) -> tuple:
+        return (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    @property
+    def native_fps(self) -> float:
+        return self.cap.get(cv2.CAP_PROP_FPS)
+
+
+class V4L2Source(OpenCVSource):
+    """Local camera device (/dev/videoN or its index) through Video4Linux2."""
+    kind = "v4l2"
+
+    def __init__(self, device=0, backend=None):
+        super().__init__(device, cv2.CAP_V4L2 if backend is None else backend)
+
+
+class FileReplaySource(OpenCVSource):
+    """
+    Replays a video file as if it were a camera. With realtime=True frames
+    are delivered at the file's frame rate, otherwise as fast as they can be
+    decoded (for throughput measurements). Loops at the end unless loop=False.
+    """
+    kind = "replay"
+
+    def __init__(self, path, realtime=True, loop=True, backend=None):
+        super().__init__(path, cv2.CAP_ANY if backend is None else backend)
+        self.realtime = realtime
+        self.loop = loop
+        self._next_frame_at = None
+
+    def read(self, image=None):
+        if self.realtime:
+            self._next_frame_at = _pace(self._next_frame_at, self.native_fps or 30.0)
+        ret, frame = super().read(image)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = super().read(image)
+        return ret, frame
+
+    def describe(self) -> dict:
+        return dict(super().describe(), realtime=self.realtime)
+
+
+class SyntheticSource(FrameSource):
+    """
+    Generated test pattern: colour bars scrolling one step per frame with the
+    frame number printed on them, so dropped or repeated frames are visible.
+    Needs no hardware; controls are accepted and read back like on a UVC
+    camera but don't change the image.
+    """
+    kind = "synthetic"
+
+    def __init__(self, width=640, height=480, fps=30.0, realtime=True):
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self.realtime = realtime
+        self.frame_count = 0
+        self.controls = {}
+        self._opened = True
+        self._next_frame_at = None
+
+        colors = np.array([[255, 255, 255], [0, 255, 255], [255, 255, 0], [0, 255, 0],
+                           [255, 0, 255], [0, 0, 255], [255, 0, 0], [0, 0, 0]], dtype=np.uint8)
+        row = np.repeat(colors, max(self.width // len(colors), 1), axis=0)
+        self._period = len(row)
+        # One period wider than the frame, so every scroll position is a slice of it
+        row = np.tile(row, (self.width // self._period + 2, 1))[:self.width + self._period]
+        self._pattern = np.ascontiguousarray(np.broadcast_to(row, (self.height,) + row.shape))
+        self._step = max(self.width // 100, 1)
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def read(self, image=None):
+        if not self._opened:
+            return False, None
+        if self.realtime:
+            self._next_frame_at = _pace(self._next_frame_at, self.fps)
+        if image is None or image.shape != (self.height, self.width, 3):
+            image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+        offset = (self.frame_count * self._step) % self._period
+        image[:] = self._pattern[:, offset:offset + self.width]
+        self.frame_count += 1
+        cv2.putText(image, str(self.frame_count), (10, max(self.height // 8, 20)),
+                    cv2.FONT_HERSHEY_SIMPLEX, max(self.height / 480.0, 0.5), (128, 128, 128), 2)
+        return True, image
+
+    def set(self, prop_id, value) -> bool:
+        if prop_id in SYNTHETIC_CONTROLS:
+            self.controls[prop_id] = float(value)
+            return True
+        return False
+
+    def get(self, prop_id) -> float:
+        if prop_id in self.controls:
+            return self.controls[prop_id]
+        return super().get(prop_id)
+
+    def release(self):
+        self._opened = False
+
+    @property
+    def native_resolution(self) -> tuple:
+        return (self.width, self.height)
+
+    @property
+    def native_fps(self) -> float:
+        return self.fps
+
+    def describe(self) -> dict:
+        return dict(super().describe(), realtime=self.realtime)
+
+
+def _pace(next_frame_at, fps):
+    """Sleeps until next_frame_at and returns when the frame after it is due."""
+    now = time.monotonic()
+    if next_frame_at is None or next_frame_at < now - 1.0:
+        # First frame, or far behind (e.g. nobody read for a while): don't catch up in a burst
+        next_frame_at = now
+    elif next_frame_at > now:
+        time.sleep(next_frame_at - now)
+    return next_frame_at + 1.0 / fps
+
+
+def _flag(query, name, default):
+    values = query.get(name)
+    if not values:
+        return default
+    return values[-1].lower() not in ("0", "false", "no", "fast")
+
+
+def open_source(spec, backend=None) -> FrameSource:
+    """
+    Opens the frame source described by `spec` (CAMERA_URL):
+
+    - 0, "0", "/dev/video0"                  V4L2 device
+    - "synthetic://1280x720@30"              generated pattern (?realtime=0: unthrottled)
+    - "file:///path/clip.mp4", a file path   replay of a video file (?realtime=0, ?loop=0)
+    - anything else (rtsp://, http://, ...)  passed to cv2.VideoCapture
+
+    `backend` overrides the OpenCV capture API for OpenCV-based sources.
+    Check isOpened() on the result.
+    """
+    if isinstance(spec, FrameSource):
+        return spec
+    text = str(spec).strip()
+    if text.isdigit() or text.startswith("/dev/video"):
+        return V4L2Source(int(text) if text.isdigit() else text, backend)
+
+    parts = urlsplit(text)
+    query = parse_qs(parts.query)
+    if parts.scheme == "synthetic":
+        width, height, fps = 640, 480, 30.0
+        size, _, rate = parts.netloc.partition("@")
+        if size:
+            try:
+                width, height = (int(value) for value in size.lower().split("x"))
+                fps = float(rate) if rate else fps
+            except ValueError:
+                raise ValueError(f"Invalid synthetic source '{text}', expected synthetic://WIDTHxHEIGHT@FPS")
+        return SyntheticSource(width, height, fps, realtime=_flag(query, "realtime", True))
+    if parts.scheme == "file":
+        return FileReplaySource(parts.path, realtime=_flag(query, "realtime", True),
+                                loop=_flag(query, "loop", True), backend=backend)
+    if not parts.scheme and os.path.isfile(text):
+        return FileReplaySource(text, backend=backend)
+    return OpenCVSource(text, cv2.CAP_ANY if backend is None else backend)
+
+
+def is_device_source(spec) -> bool:
+    text = str(spec).strip()
+    return text.isdigit() or text.startswith("/dev/video")
+
+
+def serves_source(opened, configured) -> bool:
+    """
+    True if a camera opened on `opened` is the one `configured` asks for.
+    The default device 0 may have been resolved to another /dev/video*
+    (camera_core.resolve_camera_source), which still counts as the same.
+    """
+    if str(opened).strip() == str(configured).strip():
+        return True
+    return str(configured).strip() == "0" and is_device_source(opened)
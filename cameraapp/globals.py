@@ -1,22 +1,43 @@
 # cameraapp/globals.py
 
 import threading
+import time
+
+from .frame_hub import FrameBroadcastHub
+from .metrics import TimedLock
 
 
 class AppGlobals:
     def __init__(self):
-        self.camera_lock = threading.Lock()
-        self.latest_frame = None
-        self.latest_frame_lock = threading.Lock()
+        self.camera_lock = TimedLock("camera_lock")
         self.livestream_resume_lock = threading.Lock()
         self.livestream_lock = threading.Lock()
         self.livestream_job = None
         self.taking_foto = False
         self.recording_job = None
+        self.pre_roll = None
+        self.motion_monitor = None
+        self.dvr_job = None
+        self.retention = None
+        self.viewer_lock = threading.Lock()
         self.active_stream_viewers = 0
         self.last_disconnect_time = None
         self.recording_timeout = 30
         self.camera = None
+        self.frame_hub = FrameBroadcastHub()
+
+    def viewer_connected(self):
+        """Counts a stream or snapshot viewer; the camera stays at full rate while any is connected."""
+        with self.viewer_lock:
+            self.active_stream_viewers += 1
+        camera = self.camera
+        if camera is not None:
+            camera.wake()
+
+    def viewer_disconnected(self):
+        with self.viewer_lock:
+            self.active_stream_viewers = max(0, self.active_stream_viewers - 1)
+            self.last_disconnect_time = time.time()
 
 
 # Singleton Instanz für globale App-Zustände
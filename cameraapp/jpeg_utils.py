@@ -0,0 +1,40 @@
+# cameraapp/jpeg_utils.py
+
+import cv2
+import numpy as np
+
+# Kept free of Django imports: used by spawned worker processes as well.
+
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def jpeg_size(data):
+    """Reads (width, height) from the SOF marker without decoding the image."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[pos + 5:pos + 7], "big")
+            width = int.from_bytes(data[pos + 7:pos + 9], "big")
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def decode_reduced(data, min_width: int):
+    """
+    Decodes an image, letting the JPEG decoder scale down by the largest
+    factor (8, 4 or 2) that still leaves at least min_width pixels.
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    size = jpeg_size(data)
+    if size:
+        for factor, flag in _REDUCED_FLAGS:
+            if size[0] // factor >= min_width:
+                return cv2.imdecode(buffer, flag)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
@@ -6,6 +6,7 @@ import logging
 from typing import Callable, Optional, Union, Any
 
 from .globals import app_globals
+from .camera_manager import FrameSubscription
 
 logger = logging.getLogger(__name__)
 
@@ -17,39 +18,31 @@ def lazy_imports():
 
 class LiveStreamJob:
     """
-    Background thread for capturing frames from CameraManager.
+    Background consumer of the CameraManager capture thread.
+
+    The job never reads the device itself; it subscribes to the single capture
+    thread owned by CameraManager.
 
     Features:
-    - Auto reconnect with exponential backoff
+    - Applies the video camera settings on (re)connect
+    - Auto reconnect with exponential backoff when frames stop arriving
     - Optional frame callback
-    - Thread-safe access to the latest frame
     """
     def __init__(
         self,
         camera_source: Union[int, str],
         frame_callback: Optional[Callable[[Any], None]] = None,
-        shared_capture=None,
         max_retries: int = 5,
-        base_delay: float = 2.0
+        base_delay: float = 2.0,
+        stall_timeout: float = 5.0
     ):
-        global app_globals
-
         self.camera_source = camera_source
         self.frame_callback = frame_callback
-        self.shared_capture = shared_capture
         self.running = False
         self.thread: Optional[threading.Thread] = None
         self.max_retries = max_retries
         self.base_delay = base_delay
-
-        if shared_capture is not None:
-            self.capture = shared_capture
-        elif app_globals.camera and getattr(app_globals.camera, "cap", None) and app_globals.camera.cap.isOpened():
-            self.capture = app_globals.camera.cap
-        else:
-            logger.error("LiveStreamJob initialized without valid capture source.")
-            self.capture = None
-
+        self.stall_timeout = stall_timeout
 
     def start(self) -> None:
         if self.running:
@@ -63,14 +56,6 @@ class LiveStreamJob:
         global app_globals
         with app_globals.livestream_lock:
             self.running = False
-            if self.capture and not self.shared_capture:
-                try:
-                    self.capture.release()
-                    logger.info("Camera capture released")
-                except Exception as e:
-                    logger.warning(f"Error releasing capture: {e}")
-                finally:
-                    self.capture = None
 
     def restart(self) -> None:
         logger.info("Restarting LiveStreamJob")
@@ -84,41 +69,51 @@ class LiveStreamJob:
             logger.info("LiveStreamJob thread joined")
 
     def _run(self) -> None:
-        print("[LiveStreamJob] Frame captured and callback invoked.")
         lazy_imports()
-        self.capture = self._connect_with_retries()
-        if not self.capture:
+        if not self._connect_with_retries():
             self.running = False
             logger.error("LiveStreamJob could not connect to camera. Exiting thread.")
             return
 
-        logger.info("LiveStreamJob capture loop started")
-        while self.running:
-            try:
-                ret, frame = self.capture.read()
-                if not ret or frame is None:
-                    logger.warning("Frame read failed, attempting reconnect")
-                    self.capture = self._connect_with_retries()
-                    if not self.capture:
-                        break
+        logger.info("LiveStreamJob frame loop started")
+        # Only watches the capture thread, so it must not keep the camera awake
+        subscription = FrameSubscription("livestream", keeps_awake=False)
+        last_frame_time = time.time()
+        try:
+            while self.running:
+                frame_ref = subscription.next(timeout=1.0)
+                camera = app_globals.camera
+                if camera is not None and camera.idle:
+                    # Suspended for lack of viewers: no frames is expected
+                    last_frame_time = time.time()
+                if frame_ref is None:
+                    if time.time() - last_frame_time > self.stall_timeout:
+                        logger.warning("No frames from capture thread, attempting reconnect")
+                        if not self._connect_with_retries():
+                            break
+                        last_frame_time = time.time()
                     continue
 
-                if self.frame_callback:
+                last_frame_time = time.time()
+                if not self.frame_callback:
+                    # Entering the ref would decode passthrough frames for nothing
+                    frame_ref.release()
+                    continue
+                with frame_ref as frame:
                     try:
                         self.frame_callback(frame)
                     except Exception as cb_err:
                         logger.warning(f"Frame callback error: {cb_err}")
 
-                time.sleep(0.03)
-
-            except Exception as err:
-                logger.error(f"Exception in LiveStreamJob loop: {err}")
-                break
+        except Exception as err:
+            logger.error(f"Exception in LiveStreamJob loop: {err}")
+        finally:
+            subscription.close()
+            self.running = False
 
-        self._cleanup()
-        logger.info("LiveStreamJob capture loop exited")
+        logger.info("LiveStreamJob frame loop exited")
 
-    def _connect_with_retries(self):
+    def _connect_with_retries(self) -> bool:
         lazy_imports()
         delay = self.base_delay
         for attempt in range(1, self.max_retries + 1):
@@ -131,7 +126,7 @@ class LiveStreamJob:
                         logger.info("Camera settings applied successfully")
                     except Exception as e:
                         logger.warning(f"Failed to apply camera settings: {e}")
-                return app_globals.camera.cap
+                return True
 
             logger.warning(f"Camera not ready, retrying in {delay} seconds")
             time.sleep(delay)
@@ -146,27 +141,18 @@ class LiveStreamJob:
         except Exception as e:
             logger.error(f"force_device_reset failed: {e}")
 
-        if self.is_camera_ready():
-            return app_globals.camera.cap
-        return None
-
-
-    def _cleanup(self) -> None:
-        if self.capture and not self.shared_capture:
-            try:
-                self.capture.release()
-            except Exception as e:
-                logger.warning(f"Error releasing capture on cleanup: {e}")
-            finally:
-                self.capture = None
+        return self.is_camera_ready()
 
     def get_frame(self) -> Optional[Any]:
+        """
+        Returns a FrameRef to the latest captured frame, or None. The caller
+        must release() it.
+        """
         global app_globals
-        with app_globals.latest_frame_lock:
-            return app_globals.latest_frame.copy() if app_globals.latest_frame is not None else None
+        camera = app_globals.camera
+        return camera.acquire_frame() if camera else None
 
-        
     def is_camera_ready(self) -> bool:
         global app_globals
-        return hasattr(app_globals.camera, "cap") and app_globals.camera.cap and app_globals.camera.cap.isOpened()
-
+        camera = app_globals.camera
+        return camera is not None and camera.is_available()
@@ -0,0 +1,47 @@
+# cameraapp/management/commands/backfill_thumbnails.py
+
+import os
+
+from django.core.management.base import BaseCommand
+
+from cameraapp.models import MediaItem
+from cameraapp.thumbnails import THUMB_DIR, generate_thumbnail, get_executor
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate thumbnails for indexed media that doesn't have one yet "
+        "(run reconcile_media first for files added outside the app)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate all thumbnails")
+        parser.add_argument("--workers", type=int, default=2, help="Number of worker threads")
+        parser.add_argument("--prune", action="store_true",
+                            help="Delete cached thumbnails no media item refers to")
+
+    def handle(self, *args, **options):
+        items = MediaItem.objects.exclude(media_type="raw")
+        if not options["force"]:
+            items = items.filter(thumb_key="")
+
+        executor = get_executor(max_workers=options["workers"])
+        futures = [
+            executor.submit(generate_thumbnail, item, options["force"])
+            for item in items.iterator(chunk_size=500)
+        ]
+        created = sum(1 for future in futures if future.result())
+        self.stdout.write(f"Thumbnails: {created} of {len(futures)} generated")
+
+        if options["prune"]:
+            self.stdout.write(f"Thumbnails: {self._prune()} orphaned files removed")
+
+    def _prune(self):
+        keys = set(MediaItem.objects.exclude(thumb_key="").values_list("thumb_key", flat=True))
+        removed = 0
+        for root, _, files in os.walk(THUMB_DIR):
+            for name in files:
+                if name.endswith(".jpg") and name[:-4] not in keys:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        return removed
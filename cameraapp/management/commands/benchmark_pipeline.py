@@ -0,0 +1,263 @@
+# cameraapp/management/commands/benchmark_pipeline.py
+
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+
+from cameraapp.camera_core import auto_adjust_from_frame
+from cameraapp.camera_manager import CameraManager
+from cameraapp.camera_utils import apply_cv_settings
+from cameraapp.frame_sources import SyntheticSource
+from cameraapp.management.commands.benchmark_viewers import make_test_frames
+from cameraapp.models import CameraSettings, MediaItem
+
+BENCHMARKS = ("handoff", "imencode", "resize", "apply_cv_settings", "auto_adjust", "media_browser")
+JPEG_QUALITIES = (50, 70, 85, 95)
+# Recording resolutions RecordingJob resizes to
+RECORD_RESOLUTIONS = ((640, 480), (1280, 720))
+
+
+def summarize(samples) -> dict:
+    """Median, 95th percentile and mean of durations in seconds, as milliseconds."""
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "median_ms": round(ordered[count // 2] * 1000.0, 4),
+        "p95_ms": round(ordered[int(0.95 * (count - 1))] * 1000.0, 4),
+        "mean_ms": round(sum(ordered) / count * 1000.0, 4),
+        "iterations": count,
+    }
+
+
+def measure(fn, min_time=0.5, min_iterations=5, max_iterations=2000) -> dict:
+    """Times fn() after one warm-up call until min_time has passed (at least min_iterations calls)."""
+    fn()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_iterations and (
+            len(samples) < min_iterations or time.perf_counter() - started < min_time):
+        call_started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - call_started)
+    return summarize(samples)
+
+
+def parse_resolutions(value):
+    try:
+        return [tuple(int(n) for n in item.lower().split("x")) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise CommandError(f"Invalid resolutions '{value}', expected e.g. 640x480,1280x720")
+
+
+def compare(results: dict, baseline: dict, threshold: float, noise_ms: float) -> dict:
+    """
+    Per benchmark present in both runs: the median change relative to the
+    baseline and whether it is a regression (slower by more than
+    `threshold` and by more than `noise_ms` in absolute terms).
+    """
+    report = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("median_ms"):
+            continue
+        delta = current["median_ms"] - previous["median_ms"]
+        change = delta / previous["median_ms"]
+        report[name] = {
+            "baseline_ms": previous["median_ms"],
+            "change": round(change, 4),
+            "regression": change > threshold and delta > noise_ms,
+        }
+    return report
+
+
+def bench_handoff(width, height, frames=60):
+    """
+    Capture thread commit to subscriber wake-up, on a CameraManager reading a
+    synthetic source at 60 fps.
+    """
+    camera = CameraManager(source=f"synthetic://{width}x{height}@60", retry_delay=0.1, max_retries=1)
+    latencies = []
+    try:
+        seq = 0
+        started = time.perf_counter()
+        while len(latencies) < frames and camera.running:
+            seq, frame_ref = camera.wait_for_frame(seq, timeout=1.0)
+            if frame_ref is None:
+                continue
+            latencies.append(time.time() - frame_ref.timestamp)
+            frame_ref.release()
+        elapsed = time.perf_counter() - started
+    finally:
+        camera.stop()
+    if not latencies:
+        raise CommandError("Synthetic camera delivered no frames")
+    return dict(summarize(latencies), fps=round(len(latencies) / elapsed, 1))
+
+
+def bench_imencode(frame, quality, min_time):
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    result = measure(lambda: cv2.imencode(".jpg", frame, params), min_time)
+    return dict(result, bytes=len(cv2.imencode(".jpg", frame, params)[1]))
+
+
+def bench_apply_cv_settings(min_time):
+    """Full apply to a freshly opened capture, and a save that changes nothing."""
+    manager = SimpleNamespace(cap=SyntheticSource(640, 480, realtime=False), applied_controls={})
+    settings = CameraSettings(video_exposure_mode="manual", video_brightness=128.0, video_contrast=32.0,
+                              video_saturation=64.0, video_exposure=-6.0, video_gain=4.0)
+
+    def full():
+        manager.applied_controls = {}
+        apply_cv_settings(manager, settings, mode="video")
+
+    return {
+        "apply_cv_settings/full": measure(full, min_time),
+        "apply_cv_settings/unchanged": measure(lambda: apply_cv_settings(manager, settings, mode="video"),
+                                               min_time),
+    }
+
+
+def bench_auto_adjust(frame, min_time):
+    # Only the frame analysis is measured, not the database write
+    settings = SimpleNamespace(save=lambda: None)
+
+    def adjust():
+        with contextlib.redirect_stdout(io.StringIO()):
+            auto_adjust_from_frame(frame, settings)
+
+    return measure(adjust, min_time)
+
+
+def bench_media_browser(item_counts, min_time):
+    """
+    Renders the media browser against a throwaway database holding
+    `count` indexed photos; the listing is served from the index, so the
+    files themselves don't need to exist.
+    """
+    from cameraapp.views import media_browser
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        request = RequestFactory().get("/media/browser/")
+        request.user = User(username="benchmark")
+        results = {}
+        start = timezone.now() - datetime.timedelta(days=365)
+        created = 0
+        for count in sorted(item_counts):
+            MediaItem.objects.bulk_create([
+                MediaItem(category="photos", path=f"photos/manual/photo_{i:07d}.jpg", media_type="image",
+                          size_bytes=250000, created_at=start + datetime.timedelta(seconds=i))
+                for i in range(created, count)
+            ], batch_size=5000)
+            created = max(created, count)
+            results[f"media_browser/{count}"] = measure(lambda: media_browser(request).content, min_time)
+        return results
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks for the frame pipeline hot paths on synthetic frames: "
+        "capture-to-subscriber handoff, JPEG encoding per quality, recording "
+        "resize, apply_cv_settings, auto_adjust_from_frame and the media "
+        "browser listing. Writes JSON with --json; --compare flags regressions "
+        "against a stored result file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+        parser.add_argument("--resolutions", default="640x480,1280x720,1920x1080")
+        parser.add_argument("--media-sizes", default="1000,10000,100000",
+                            help="Indexed item counts for the media browser benchmark")
+        parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to time each case")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+        parser.add_argument("--compare", help="Baseline result file to compare against")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Relative slowdown counted as regression (default 0.2 = 20%%)")
+        parser.add_argument("--noise-ms", type=float, default=0.05,
+                            help="Slowdowns smaller than this are never regressions")
+
+    def handle(self, *args, **options):
+        selected = options["only"].split(",") if options["only"] else list(BENCHMARKS)
+        unknown = set(selected) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        resolutions = parse_resolutions(options["resolutions"])
+        min_time = options["min_time"]
+
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        results = {}
+        for width, height in resolutions:
+            size = f"{width}x{height}"
+            frame = make_test_frames(width, height, count=1)[0]
+            if "handoff" in selected:
+                results[f"handoff/{size}"] = bench_handoff(width, height)
+            if "imencode" in selected:
+                for quality in JPEG_QUALITIES:
+                    results[f"imencode/{size}/q{quality}"] = bench_imencode(frame, quality, min_time)
+            if "resize" in selected:
+                for target in RECORD_RESOLUTIONS:
+                    if target != (width, height):
+                        results[f"resize/{size}->{target[0]}x{target[1]}"] = measure(
+                            lambda: cv2.resize(frame, target), min_time)
+            if "auto_adjust" in selected:
+                results[f"auto_adjust/{size}"] = bench_auto_adjust(frame, min_time)
+        if "apply_cv_settings" in selected:
+            results.update(bench_apply_cv_settings(min_time))
+        if "media_browser" in selected:
+            counts = [int(n) for n in options["media_sizes"].split(",") if n.strip()]
+            results.update(bench_media_browser(counts, min_time))
+
+        comparison = compare(results, baseline, options["threshold"], options["noise_ms"]) if baseline else {}
+        self._print(results, comparison)
+
+        if options["json_path"]:
+            document = {
+                "meta": {
+                    "created_at": timezone.now().isoformat(),
+                    "host": platform.node(),
+                    "cpu_count": os.cpu_count(),
+                    "python": platform.python_version(),
+                    "opencv": cv2.__version__,
+                    "numpy": np.__version__,
+                },
+                "results": results,
+                "comparison": comparison,
+            }
+            with open(options["json_path"], "w") as f:
+                json.dump(document, f, indent=2)
+
+        regressions = sorted(name for name, entry in comparison.items() if entry["regression"])
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    def _print(self, results, comparison):
+        self.stdout.write(f"{'benchmark':<40} {'median ms':>10} {'p95 ms':>10} {'n':>6} {'vs base':>9}")
+        for name, result in results.items():
+            line = f"{name:<40} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['iterations']:>6}"
+            entry = comparison.get(name)
+            if entry:
+                line += f" {entry['change'] * 100:>+8.1f}%" + ("  REGRESSION" if entry["regression"] else "")
+            self.stdout.write(line)
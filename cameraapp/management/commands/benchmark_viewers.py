@@ -0,0 +1,162 @@
+# cameraapp/management/commands/benchmark_viewers.py
+
+import asyncio
+import os
+import resource
+import threading
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from cameraapp.frame_hub import FrameBroadcastHub
+
+
+def make_test_frames(width, height, count=8):
+    """
+    Camera-like test frames: a smooth gradient with some noise, so JPEG sizes
+    and encode times are in the range of a real scene rather than a flat image.
+    """
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                     np.full((height, width), 128, np.float32)], axis=2)
+    frames = []
+    for i in range(count):
+        noise = rng.normal(0, 12, (height, width, 3))
+        frames.append(np.clip(np.roll(base, i * 8, axis=1) + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class FramePublisher(threading.Thread):
+    """Stands in for the capture thread: publishes frames at a fixed rate."""
+
+    def __init__(self, hub, frames, fps):
+        super().__init__(daemon=True)
+        self.hub = hub
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self.published = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_tick = time.monotonic()
+        while not self.stopped.is_set():
+            self.hub.publish(self.frames[self.published % len(self.frames)])
+            self.published += 1
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def run_sync_viewers(hub, viewers, duration):
+    """One OS thread per viewer iterating the WSGI generator, as under gunicorn."""
+    counts = [0] * viewers
+    stop = threading.Event()
+
+    def viewer(index):
+        for _ in hub.mjpeg_stream():
+            counts[index] += 1
+            if stop.is_set():
+                break
+
+    previous_stack_size = threading.stack_size(256 * 1024)
+    threads = [threading.Thread(target=viewer, args=(i,), daemon=True) for i in range(viewers)]
+    for thread in threads:
+        thread.start()
+    threading.stack_size(previous_stack_size)
+    time.sleep(duration)
+    rss = current_rss_mb()
+    stop.set()
+    deadline = time.monotonic() + 10.0
+    for thread in threads:
+        thread.join(timeout=max(0.0, deadline - time.monotonic()))
+    return counts, rss
+
+
+def run_async_viewers(hub, viewers, duration):
+    """One coroutine per viewer iterating the ASGI async generator."""
+    counts = [0] * viewers
+
+    async def viewer(index):
+        async for _ in hub.mjpeg_stream_async():
+            counts[index] += 1
+
+    async def main():
+        tasks = [asyncio.ensure_future(viewer(i)) for i in range(viewers)]
+        await asyncio.sleep(duration)
+        rss = current_rss_mb()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return rss
+
+    rss = asyncio.run(main())
+    return counts, rss
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare how many concurrent MJPEG viewers the threaded (WSGI) and the "
+        "asyncio (ASGI) streaming paths can serve from one broadcast hub. "
+        "RSS is process-wide, so run one --mode at a time to compare memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--viewers", default="10,100,1000",
+                            help="Comma-separated viewer counts to test")
+        parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+        parser.add_argument("--fps", type=float, default=15.0, help="Source frame rate")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+        parser.add_argument("--width", type=int, default=1280)
+        parser.add_argument("--height", type=int, default=720)
+
+    def handle(self, *args, **options):
+        frames = make_test_frames(options["width"], options["height"])
+        modes = ["sync", "async"] if options["mode"] == "both" else [options["mode"]]
+        fps = options["fps"]
+        duration = options["duration"]
+
+        self.stdout.write(
+            f"Source {options['width']}x{options['height']} @ {fps:g} fps, {duration:g}s per run, "
+            f"{os.cpu_count()} CPUs"
+        )
+        self.stdout.write(f"{'mode':<6} {'viewers':>8} {'served':>8} {'avg fps':>8} "
+                          f"{'min fps':>8} {'cpu %':>7} {'rss MB':>8}")
+
+        for viewers in [int(v) for v in options["viewers"].split(",") if v.strip()]:
+            for mode in modes:
+                hub = FrameBroadcastHub()
+                publisher = FramePublisher(hub, frames, fps)
+                publisher.start()
+
+                cpu_start = time.process_time()
+                wall_start = time.monotonic()
+                runner = run_sync_viewers if mode == "sync" else run_async_viewers
+                counts, rss = runner(hub, viewers, duration)
+                wall = time.monotonic() - wall_start
+                cpu = time.process_time() - cpu_start
+
+                publisher.stopped.set()
+                publisher.join()
+
+                delivered = [c / duration for c in counts]
+                # A viewer is served if it gets at least 90% of the source frames
+                served = sum(1 for rate in delivered if rate >= 0.9 * fps)
+                self.stdout.write(
+                    f"{mode:<6} {viewers:>8} {served:>8} {sum(delivered) / viewers:>8.1f} "
+                    f"{min(delivered):>8.1f} {100.0 * cpu / wall:>7.0f} {rss:>8.0f}"
+                )
@@ -0,0 +1,63 @@
+# cameraapp/management/commands/compile_timelapse.py
+
+import os
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from cameraapp.media_index import record_media_file
+from cameraapp.timelapse import TIMELAPSE_VIDEO_DIR, IncrementalTimelapse, compile_timelapse, timelapse_frames
+
+
+def _day_start(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile media/photos/timelapse into an MP4. Either a date range "
+        "(--from/--to, inclusive) or, with --incremental, append the photos "
+        "taken since the last run to timelapse_videos/timelapse.mp4 (run it daily)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First day (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="end", help="Last day (YYYY-MM-DD), inclusive")
+        parser.add_argument("--fps", type=float, default=25.0)
+        parser.add_argument("--width", type=int, default=1280)
+        parser.add_argument("--height", type=int, default=720)
+        parser.add_argument("--codec", default="mp4v")
+        parser.add_argument("--workers", type=int, default=None, help="Decoder processes (default: CPUs - 1)")
+        parser.add_argument("--incremental", action="store_true")
+        parser.add_argument("--output", help="Output file (default: in media/timelapse_videos)")
+
+    def handle(self, *args, **options):
+        resolution = (options["width"], options["height"])
+
+        if options["incremental"]:
+            output = options["output"] or os.path.join(TIMELAPSE_VIDEO_DIR, "timelapse.mp4")
+            timelapse = IncrementalTimelapse(output, options["fps"], resolution, options["codec"],
+                                             workers=options["workers"])
+            # Only complete days, so a day is never split over two chunks
+            today = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+            written = timelapse.update(until=today)
+            self.stdout.write(f"Timelapse: {written} new frames appended to {output}")
+            return
+
+        start = _day_start(options["start"]) if options["start"] else None
+        end = _day_start(options["end"]) + datetime.timedelta(days=1) if options["end"] else None
+        frames = timelapse_frames(start, end)
+        if not frames:
+            raise CommandError("No timelapse photos in the given range")
+
+        output = options["output"] or os.path.join(
+            TIMELAPSE_VIDEO_DIR, f"timelapse_{frames[0][1]:%Y%m%d}-{frames[-1][1]:%Y%m%d}.mp4")
+        written = compile_timelapse([path for path, _ in frames], output, options["fps"], resolution,
+                                    options["codec"], options["workers"])
+        record_media_file(output)
+        self.stdout.write(f"Timelapse: {written} frames written to {output}")
@@ -0,0 +1,20 @@
+# cameraapp/management/commands/reconcile_media.py
+
+from django.core.management.base import BaseCommand
+
+from cameraapp.media_index import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Sync the media index (MediaItem) with the files in media/photos, "
+        "media/photos/timelapse and media/recordings: index files added "
+        "outside the app and drop entries whose files are gone."
+    )
+
+    def handle(self, *args, **options):
+        result = reconcile()
+        self.stdout.write(
+            f"Media index reconciled: {result['added']} added, "
+            f"{result['updated']} updated, {result['removed']} removed"
+        )
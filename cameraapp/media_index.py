@@ -0,0 +1,189 @@
+# cameraapp/media_index.py
+
+import os
+import base64
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, models
+from django.db.models.functions import Mod, RowNumber
+from django.utils import timezone
+
+from .models import MediaItem
+from .retention import MEDIA_CATEGORIES, note_media_file, forget_media_file
+from .thumbnails import schedule_thumbnail
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+
+# Writer threads (photo pool, recordings, DVR, thumbnails) update the index
+# concurrently; SQLite fails lock upgrades of overlapping transactions
+index_write_lock = threading.Lock()
+
+
+def category_for(path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    for name, (directories, extensions) in MEDIA_CATEGORIES.items():
+        if directory in (os.path.abspath(d) for d in directories) and path.lower().endswith(extensions):
+            return name
+    return None
+
+
+def media_type_for(path: str) -> str:
+    lower = path.lower()
+    if lower.endswith(VIDEO_EXTENSIONS):
+        return "video"
+    if lower.endswith(".npy"):
+        return "raw"
+    return "image"
+
+
+def relative_media_path(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, "/")
+
+
+def _timestamp(ts: float) -> datetime.datetime:
+    moment = datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc)
+    return moment if settings.USE_TZ else timezone.make_naive(moment)
+
+
+def record_media_file(path: str):
+    """
+    Registers a file that was just written under MEDIA_ROOT: adds or updates
+    its MediaItem, reports it to the retention manager and queues its
+    thumbnail. Never raises, so it is safe to call from capture and writer
+    threads.
+    """
+    note_media_file(path)
+    category = category_for(path)
+    if category is None:
+        return None
+    try:
+        stat = os.stat(path)
+        close_old_connections()
+        with index_write_lock:
+            item, _ = MediaItem.objects.update_or_create(
+                path=relative_media_path(path),
+                defaults={
+                    "category": category,
+                    "media_type": media_type_for(path),
+                    "size_bytes": stat.st_size,
+                    "created_at": _timestamp(stat.st_mtime),
+                }
+            )
+        schedule_thumbnail(item)
+        return item
+    except Exception as e:
+        logger.warning(f"[MediaIndex] Could not index {path}: {e}")
+        return None
+
+
+def remove_media_files(paths):
+    """Drops deleted files from the media index and the retention manager."""
+    for path in paths:
+        forget_media_file(path)
+    try:
+        close_old_connections()
+        MediaItem.objects.filter(path__in=[relative_media_path(p) for p in paths]).delete()
+    except Exception as e:
+        logger.warning(f"[MediaIndex] Could not remove index entries: {e}")
+
+
+def reconcile(batch_size: int = 1000) -> dict:
+    """
+    Brings MediaItem in line with the files on disk: indexes files added
+    outside the app, drops entries whose file is gone and refreshes sizes.
+    """
+    existing = {item.path: item for item in MediaItem.objects.only("id", "path", "size_bytes")}
+    seen = set()
+    new_items = []
+    updated = []
+
+    for category, (directories, extensions) in MEDIA_CATEGORIES.items():
+        for directory in directories:
+            try:
+                with os.scandir(directory) as it:
+                    entries = [entry for entry in it if entry.is_file() and entry.name.lower().endswith(extensions)]
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                rel_path = relative_media_path(entry.path)
+                seen.add(rel_path)
+                stat = entry.stat()
+                item = existing.get(rel_path)
+                if item is None:
+                    new_items.append(MediaItem(
+                        path=rel_path,
+                        category=category,
+                        media_type=media_type_for(entry.name),
+                        size_bytes=stat.st_size,
+                        created_at=_timestamp(stat.st_mtime),
+                    ))
+                elif item.size_bytes != stat.st_size:
+                    item.size_bytes = stat.st_size
+                    updated.append(item)
+
+    MediaItem.objects.bulk_create(new_items, batch_size=batch_size, ignore_conflicts=True)
+    MediaItem.objects.bulk_update(updated, ["size_bytes"], batch_size=batch_size)
+    missing = [item.id for path, item in existing.items() if path not in seen]
+    for start in range(0, len(missing), batch_size):
+        MediaItem.objects.filter(id__in=missing[start:start + batch_size]).delete()
+
+    return {"added": len(new_items), "updated": len(updated), "removed": len(missing)}
+
+
+def encode_cursor(created_at: datetime.datetime, item_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{item_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor(); raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        moment, item_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(moment), int(item_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def frames_page(category: str, start=None, end=None, cursor=None, limit: int = 200, stride: int = 1):
+    """
+    Images of a category in [start, end), oldest first, as (items, next_cursor).
+
+    Keyset pagination on (created_at, id) uses the category/created_at index,
+    so any page costs the same however far into the history it is. With
+    stride N every Nth frame is returned, picked in SQL by row number so only
+    the returned rows reach Python; the cursor points at the last row
+    scanned, so the stride phase carries over from page to page.
+    """
+    items = MediaItem.objects.filter(category=category, media_type="image")
+    if start is not None:
+        items = items.filter(created_at__gte=start)
+    if end is not None:
+        items = items.filter(created_at__lt=end)
+    if cursor:
+        moment, item_id = decode_cursor(cursor)
+        items = items.filter(models.Q(created_at__gt=moment) | models.Q(created_at=moment, id__gt=item_id))
+
+    ordering = ("created_at", "id")
+    fields = ("id", "path", "created_at", "thumb_key")
+    if stride == 1:
+        page = list(items.order_by(*ordering).only(*fields)[:limit])
+        last = page[-1] if len(page) == limit else None
+    else:
+        scanned = limit * stride
+        rows = list(
+            items.annotate(row=models.Window(RowNumber(), order_by=[models.F(name).asc() for name in ordering]))
+            .annotate(phase=Mod(models.F("row") - 1, stride))
+            .filter(row__lte=scanned)
+            .filter(models.Q(phase=0) | models.Q(row=scanned))
+            .order_by(*ordering).only(*fields)
+        )
+        page = [item for item in rows if (item.row - 1) % stride == 0]
+        last = rows[-1] if rows and rows[-1].row == scanned else None
+
+    next_cursor = encode_cursor(last.created_at, last.id) if last is not None else None
+    return page, next_cursor
@@ -0,0 +1,277 @@
+# cameraapp/metrics.py
+
+import bisect
+import itertools
+import threading
+import time
+
+# Seconds; encodes and lock waits of interest are between 0.1 ms and a few seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram in the Prometheus layout. observe() takes no lock:
+    each histogram has one writer at a time (a single thread, or whoever
+    holds the lock the measurement belongs to).
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, count) pairs including +Inf, as exposed."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RateMeter:
+    """Events per second, as an exponentially weighted average of the intervals between them."""
+    __slots__ = ("last", "interval")
+
+    def __init__(self):
+        self.last = None
+        self.interval = None
+
+    def tick(self, now: float) -> None:
+        if self.last is not None:
+            elapsed = now - self.last
+            self.interval = elapsed if self.interval is None else self.interval + 0.1 * (elapsed - self.interval)
+        self.last = now
+
+    def rate(self, now: float) -> float:
+        if not self.interval:
+            return 0.0
+        # A stalled source decays towards 0 instead of reporting its last rate
+        return 1.0 / max(self.interval, now - self.last)
+
+
+class CaptureStats:
+    """Capture thread counters. They outlive CameraManager instances, so restarts don't reset them."""
+
+    def __init__(self):
+        self.frames = 0
+        self.read_failures = 0
+        self.restarts = 0
+        self.last_frame_time = None
+        self.meter = RateMeter()
+
+    def frame(self, timestamp: float) -> None:
+        self.frames += 1
+        self.last_frame_time = timestamp
+        self.meter.tick(time.monotonic())
+
+
+capture = CaptureStats()
+
+
+class TimedLock:
+    """
+    Drop-in threading.Lock that records how long acquirers waited for it.
+    Statistics are updated only while the lock is held, so they need no
+    lock of their own; an uncontended acquire costs one extra try-acquire.
+    Non-blocking acquires are not waits and are not recorded, which also
+    keeps threading.Condition's ownership checks out of the statistics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.wait = _lock_waits.setdefault(name, Histogram())
+        self.contended = _lock_contention.setdefault(name, [0])
+
+    def acquire(self, blocking=True, timeout=-1) -> bool:
+        if self._lock.acquire(False):
+            if blocking:
+                self.wait.observe(0.0)
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        self.wait.observe(time.perf_counter() - started)
+        self.contended[0] += 1
+        return True
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+
+
+# lock name -> Histogram / [contended acquisitions], shared by every TimedLock of that name
+_lock_waits = {}
+_lock_contention = {}
+
+# (max width, quality) -> Histogram, written under the profile's encode lock in FrameBroadcastHub
+_encode_times = {}
+
+
+def encode_histogram(key) -> Histogram:
+    return _encode_times.setdefault(key, Histogram())
+
+
+class ViewerStats:
+    """Frames and bytes handed to one MJPEG viewer. Only its own stream generator writes to it."""
+    __slots__ = ("id", "kind", "profile", "frames", "bytes", "meter")
+
+    def __init__(self, viewer_id, kind, profile):
+        self.id = viewer_id
+        self.kind = kind
+        self.profile = profile
+        self.frames = 0
+        self.bytes = 0
+        self.meter = RateMeter()
+
+    def delivered(self, size: int) -> None:
+        self.frames += 1
+        self.bytes += size
+        self.meter.tick(time.monotonic())
+
+
+_viewer_ids = itertools.count(1)
+_viewers_lock = threading.Lock()
+_viewers = {}
+# Totals of viewers that have disconnected
+_closed_frames = 0
+_closed_bytes = 0
+
+
+def viewer_connected(kind: str, profile) -> ViewerStats:
+    stats = ViewerStats(next(_viewer_ids), kind, _profile_label(profile.encode_key()))
+    with _viewers_lock:
+        _viewers[stats.id] = stats
+    return stats
+
+
+def viewer_disconnected(stats: ViewerStats) -> None:
+    global _closed_frames, _closed_bytes
+    with _viewers_lock:
+        if _viewers.pop(stats.id, None) is not None:
+            _closed_frames += stats.frames
+            _closed_bytes += stats.bytes
+
+
+def _profile_label(key) -> str:
+    max_width, quality = key
+    return f"{max_width or 'full'}/q{quality or 'default'}"
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _value(value) -> str:
+    # Counters stay exact integers; %g would round them to 6 digits
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """samples: iterable of (labels dict, value)."""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(**labels)} {_value(value)}")
+
+    def histogram(self, name, help_text, histograms):
+        """histograms: iterable of (labels dict, Histogram)."""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in histograms:
+            buckets = list(histogram.cumulative())
+            for bound, cumulative in buckets:
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                self.lines.append(f"{name}_bucket{_labels(**labels, le=le)} {cumulative}")
+            self.lines.append(f"{name}_sum{_labels(**labels)} {_value(histogram.sum)}")
+            # From the +Inf bucket, so it matches even if a writer ran meanwhile
+            self.lines.append(f"{name}_count{_labels(**labels)} {buckets[-1][1]}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    from .globals import app_globals
+
+    now = time.monotonic()
+    out = _Exposition()
+    camera = app_globals.camera
+
+    out.metric("ipcam_camera_open", "gauge", "1 if the camera source is open",
+               [({}, 1 if camera is not None and camera.is_open() else 0)])
+    out.metric("ipcam_capture_idle", "gauge", "1 while capture is suspended for lack of consumers",
+               [({}, 1 if camera is not None and camera.idle else 0)])
+    out.metric("ipcam_capture_frames_total", "counter", "Frames read from the camera",
+               [({}, capture.frames)])
+    out.metric("ipcam_capture_read_failures_total", "counter", "Failed camera reads",
+               [({}, capture.read_failures)])
+    out.metric("ipcam_capture_restarts_total", "counter", "Camera (re)opens after failures",
+               [({}, capture.restarts)])
+    out.metric("ipcam_capture_fps", "gauge", "Current capture frame rate",
+               [({}, capture.meter.rate(now))])
+    if capture.last_frame_time is not None:
+        out.metric("ipcam_frame_age_seconds", "gauge", "Age of the newest captured frame",
+                   [({}, max(0.0, time.time() - capture.last_frame_time))])
+
+    out.histogram("ipcam_encode_seconds", "JPEG encode time per stream profile (width/quality)",
+                  [({"profile": _profile_label(key)}, histogram)
+                   for key, histogram in list(_encode_times.items())])
+
+    with _viewers_lock:
+        viewers = list(_viewers.values())
+        closed_frames, closed_bytes = _closed_frames, _closed_bytes
+    out.metric("ipcam_active_stream_viewers", "gauge", "Viewers counted by the stream views",
+               [({}, app_globals.active_stream_viewers)])
+    out.metric("ipcam_delivered_frames_total", "counter", "MJPEG frames handed to viewers",
+               [({}, closed_frames + sum(viewer.frames for viewer in viewers))])
+    out.metric("ipcam_delivered_bytes_total", "counter", "MJPEG bytes handed to viewers",
+               [({}, closed_bytes + sum(viewer.bytes for viewer in viewers))])
+    viewer_labels = [({"viewer": viewer.id, "kind": viewer.kind, "profile": viewer.profile}, viewer)
+                     for viewer in viewers]
+    out.metric("ipcam_viewer_fps", "gauge", "Frame rate delivered to a connected viewer",
+               [(labels, viewer.meter.rate(now)) for labels, viewer in viewer_labels])
+    out.metric("ipcam_viewer_frames_total", "counter", "Frames delivered to a connected viewer",
+               [(labels, viewer.frames) for labels, viewer in viewer_labels])
+    out.metric("ipcam_viewer_bytes_total", "counter", "Bytes delivered to a connected viewer",
+               [(labels, viewer.bytes) for labels, viewer in viewer_labels])
+
+    jobs = [(name, job) for name, job in (("manual", app_globals.recording_job), ("dvr", app_globals.dvr_job))
+            if job is not None and job.active]
+    out.metric("ipcam_recording_achieved_fps", "gauge", "Output frame rate of a running recording",
+               [({"job": name}, job.achieved_fps) for name, job in jobs])
+    out.metric("ipcam_recording_target_fps", "gauge", "Configured frame rate of a running recording",
+               [({"job": name}, job.fps) for name, job in jobs])
+
+    out.histogram("ipcam_lock_wait_seconds", "Time spent waiting to acquire a lock",
+                  [({"lock": name}, histogram) for name, histogram in list(_lock_waits.items())])
+    out.metric("ipcam_lock_contended_total", "counter", "Acquisitions that had to wait",
+               [({"lock": name}, count[0]) for name, count in list(_lock_contention.items())])
+    return out.text()
@@ -1,6 +1,10 @@
 # cameraapp/models.py
 
+import os
+
+from django.conf import settings
 from django.db import models
+from django.urls import reverse
 
 class Camera(models.Model):
     name = models.CharField(max_length=100)
@@ -28,6 +32,34 @@ class CameraSettings(models.Model):
     resolution_width = models.PositiveIntegerField(default=640)
     resolution_height = models.PositiveIntegerField(default=480)
     video_codec = models.CharField(max_length=10, default="mp4v")  # z. B. 'mp4v', 'XVID', 'MJPG'
+    pre_roll_seconds = models.PositiveIntegerField(default=0)  # Sekunden vor dem Aufnahmestart, 0 = aus
+    pre_roll_max_mb = models.PositiveIntegerField(default=32)  # Speichergrenze des Pre-Roll-Puffers
+
+    # Bewegungserkennung
+    MOTION_ACTIONS = [
+        ("record", "Aufnahme"),
+        ("photo", "Foto"),
+        ("both", "Aufnahme + Foto"),
+    ]
+    motion_enabled = models.BooleanField(default=False)
+    motion_sensitivity = models.PositiveIntegerField(default=50)  # 1-100
+    motion_roi = models.CharField(max_length=255, blank=True, default="")  # "x,y,w,h;..." als Anteile 0-1, leer = ganzes Bild
+    motion_every_n_frames = models.PositiveIntegerField(default=3)  # nur jedes n-te Bild analysieren
+    motion_action = models.CharField(max_length=10, choices=MOTION_ACTIONS, default="record")
+    motion_cooldown_sec = models.PositiveIntegerField(default=30)
+    motion_min_duration_sec = models.PositiveIntegerField(default=10)
+
+    # Daueraufnahme (DVR)
+    dvr_enabled = models.BooleanField(default=False)
+    dvr_segment_sec = models.PositiveIntegerField(default=300)  # Länge eines Segments
+
+    # Aufbewahrung (0 = unbegrenzt)
+    retention_photos_mb = models.PositiveIntegerField(default=0)
+    retention_photos_days = models.PositiveIntegerField(default=0)
+    retention_timelapse_mb = models.PositiveIntegerField(default=0)
+    retention_timelapse_days = models.PositiveIntegerField(default=0)
+    retention_recordings_mb = models.PositiveIntegerField(default=0)
+    retention_recordings_days = models.PositiveIntegerField(default=0)
 
     # Foto-Optionen
     photo_quality = models.PositiveIntegerField(default=95)  # JPEG Qualität (1-100)
@@ -73,3 +105,80 @@ class CameraSettings(models.Model):
     class Meta:
         verbose_name = "Camera Settings"
         verbose_name_plural = "Camera Settings"
+
+
+class RecordingSegment(models.Model):
+    """One file of a continuous (DVR) recording."""
+    path = models.CharField(max_length=500, unique=True)
+    started_at = models.DateTimeField(db_index=True)
+    ended_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    frames = models.PositiveIntegerField(default=0)
+    fps = models.FloatField(default=20.0)
+    size_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["started_at"]
+
+    def __str__(self):
+        return os.path.basename(self.path)
+
+    @classmethod
+    def covering(cls, moment):
+        """
+        Returns (segment, offset_seconds) for the segment containing the
+        given datetime, or (None, None).
+        """
+        segment = (
+            cls.objects.filter(started_at__lte=moment)
+            .filter(models.Q(ended_at__gt=moment) | models.Q(ended_at__isnull=True))
+            .order_by("-started_at")
+            .first()
+        )
+        if segment is None:
+            return None, None
+        return segment, (moment - segment.started_at).total_seconds()
+
+
+class MediaItem(models.Model):
+    """Index entry for a photo, timelapse frame or recording under MEDIA_ROOT."""
+    CATEGORIES = [
+        ("photos", "Photos"),
+        ("timelapse", "Timelapse"),
+        ("recordings", "Recordings"),
+        ("timelapse_videos", "Timelapse videos"),
+    ]
+    MEDIA_TYPES = [
+        ("image", "Image"),
+        ("video", "Video"),
+        ("raw", "Raw"),
+    ]
+
+    category = models.CharField(max_length=20, choices=CATEGORIES)
+    media_type = models.CharField(max_length=10, choices=MEDIA_TYPES, default="image")
+    path = models.CharField(max_length=500, unique=True)  # relativ zu MEDIA_ROOT
+    size_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(db_index=True)
+    thumb_key = models.CharField(max_length=40, blank=True, default="")  # SHA1 des Vorschaubilds
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["category", "media_type", "created_at"])]
+
+    def __str__(self):
+        return self.path
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    @property
+    def url(self):
+        return settings.MEDIA_URL.rstrip("/") + "/" + self.path
+
+    @property
+    def thumb_url(self):
+        # Content-addressed URL once the thumbnail exists, otherwise the
+        # per-item URL which generates it on demand
+        if self.thumb_key:
+            return reverse("thumbnail", args=[self.thumb_key])
+        return reverse("media_thumbnail", args=[self.pk])
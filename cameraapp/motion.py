@@ -0,0 +1,277 @@
+# cameraapp/motion.py
+
+import os
+import threading
+import time
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .camera_manager import FrameSubscription
+from .camera_utils import get_camera_settings
+from .globals import app_globals
+from .recording_job import RecordingJob
+
+logger = logging.getLogger(__name__)
+
+RECORD_DIR = os.path.join(settings.MEDIA_ROOT, "recordings")
+
+
+def parse_roi(spec: str):
+    """
+    Parses "x,y,w,h;x,y,w,h" with values as fractions (0-1) of the frame
+    into a list of rectangles. An empty spec means the whole frame.
+    """
+    rects = []
+    for part in (spec or "").split(";"):
+        if not part.strip():
+            continue
+        x, y, w, h = (float(v) for v in part.split(","))
+        rects.append((x, y, w, h))
+    return rects
+
+
+class MotionDetector:
+    """
+    Frame-differencing motion detector working on small grayscale frames.
+
+    Each frame is reduced to `analysis_width` pixels wide, blurred and
+    compared against a running-average background. Motion is reported when the
+    share of changed pixels inside the ROI exceeds a threshold derived from
+    `sensitivity` (1-100).
+    """
+
+    def __init__(self, sensitivity: int = 50, roi: Optional[list] = None,
+                 analysis_width: int = 160, alpha: float = 0.05):
+        sensitivity = min(max(sensitivity, 1), 100)
+        self.pixel_threshold = int(40 - sensitivity * 0.3)
+        self.area_threshold = (101 - sensitivity) / 100.0 * 0.02
+        self.roi = roi or []
+        self.analysis_width = analysis_width
+        self.alpha = alpha
+        self._background = None
+        self._mask = None
+        self._mask_pixels = 0
+        self._source_width = 0
+        self.last_score = 0.0
+
+    def reset(self):
+        self._background = None
+
+    def _build_mask(self, shape):
+        if not self.roi:
+            self._mask = None
+            self._mask_pixels = shape[0] * shape[1]
+            return
+        height, width = shape
+        mask = np.zeros(shape, dtype=np.uint8)
+        for x, y, w, h in self.roi:
+            mask[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)] = 255
+        self._mask = mask
+        self._mask_pixels = max(1, cv2.countNonZero(mask))
+
+    def _small_gray(self, frame_ref=None, pixels=None):
+        jpeg = frame_ref.jpeg if frame_ref is not None else None
+        if jpeg is not None:
+            # Passthrough frames: let the JPEG decoder downscale and drop colour,
+            # by the largest factor that still leaves analysis_width pixels
+            flag = cv2.IMREAD_REDUCED_GRAYSCALE_2
+            for factor, reduced in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4)):
+                if self._source_width // factor >= self.analysis_width:
+                    flag = reduced
+                    break
+            gray = cv2.imdecode(np.frombuffer(jpeg, np.uint8), flag)
+            if gray is not None:
+                factor = 8 if flag == cv2.IMREAD_REDUCED_GRAYSCALE_8 else 4 if flag == cv2.IMREAD_REDUCED_GRAYSCALE_4 else 2
+                self._source_width = gray.shape[1] * factor
+        else:
+            if pixels is None:
+                pixels = frame_ref.array
+            if pixels is None:
+                return None
+            scale = self.analysis_width / pixels.shape[1]
+            small = cv2.resize(pixels, (self.analysis_width, max(1, round(pixels.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        if gray is None:
+            return None
+        if gray.shape[1] != self.analysis_width:
+            scale = self.analysis_width / gray.shape[1]
+            gray = cv2.resize(gray, (self.analysis_width, max(1, round(gray.shape[0] * scale))),
+                              interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def analyse(self, frame_ref=None, pixels=None) -> bool:
+        """Feeds one frame (a FrameRef or a BGR array) and returns True on motion."""
+        gray = self._small_gray(frame_ref, pixels)
+        if gray is None:
+            return False
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            self._build_mask(gray.shape)
+            self.last_score = 0.0
+            return False
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        if self._mask is not None:
+            changed = cv2.bitwise_and(changed, self._mask)
+        self.last_score = cv2.countNonZero(changed) / self._mask_pixels
+        cv2.accumulateWeighted(gray, self._background, self.alpha)
+        return self.last_score >= self.area_threshold
+
+
+class MotionMonitor:
+    """
+    Runs a MotionDetector on every Nth captured frame and triggers a
+    recording and/or a photo when motion starts.
+
+    A triggered recording lasts at least min_duration seconds and is extended
+    while motion continues. After an event no new event starts for
+    cooldown seconds.
+    """
+
+    def __init__(self, detector: MotionDetector, every_n: int = 3, action: str = "record",
+                 cooldown: float = 30.0, min_duration: float = 10.0):
+        self.detector = detector
+        self.every_n = max(1, every_n)
+        self.action = action
+        self.cooldown = cooldown
+        self.min_duration = min_duration
+        self.events = 0
+        self._event_job = None
+        self._event_start = 0.0
+        self._cooldown_until = 0.0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"[Motion] Monitoring every {self.every_n}. frame, action={self.action}")
+
+    def stop(self):
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        last_analysed = 0
+        with FrameSubscription("motion") as subscription:
+            while self._running:
+                frame_ref = subscription.next(timeout=1.0)
+                if frame_ref is None:
+                    continue
+                try:
+                    # Sequence gaps count too, so skipped frames don't delay analysis
+                    if last_analysed and 0 < frame_ref.seq - last_analysed < self.every_n:
+                        continue
+                    last_analysed = frame_ref.seq
+                    motion = self.detector.analyse(frame_ref)
+                finally:
+                    frame_ref.release()
+                self._update(motion, time.monotonic())
+
+    def _update(self, motion: bool, now: float):
+        job = self._event_job
+        if job is not None and not job.active:
+            # Recording ended: the cooldown counts from the end of the event
+            self._event_job = None
+            self._cooldown_until = now + self.cooldown
+
+        if not motion:
+            return
+
+        if self._event_job is not None:
+            # Keep recording for min_duration after the latest motion
+            job = self._event_job
+            job.duration = max(job.duration, now - self._event_start + self.min_duration)
+            return
+
+        if now < self._cooldown_until:
+            return
+
+        self.events += 1
+        logger.info(f"[Motion] Motion detected (score {self.detector.last_score:.3f}) → {self.action}")
+        if self.action in ("photo", "both"):
+            threading.Thread(target=self._take_photo, daemon=True).start()
+        if self.action in ("record", "both"):
+            self._start_recording(now)
+        if self._event_job is None:
+            self._cooldown_until = now + self.cooldown
+
+    def _take_photo(self):
+        from .photo_camera import take_photo
+        try:
+            take_photo(mode="motion")
+        except Exception as e:
+            logger.error(f"[Motion] Photo failed: {e}")
+
+    def _start_recording(self, now: float):
+        if app_globals.recording_job and app_globals.recording_job.active:
+            logger.info("[Motion] Recording already running, not starting another one")
+            return
+
+        settings_obj = get_camera_settings()
+
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        filepath = os.path.join(RECORD_DIR, f"motion_{time.strftime('%Y%m%d-%H%M%S')}.mp4")
+        job = RecordingJob(
+            filepath=filepath,
+            duration=self.min_duration,
+            fps=settings_obj.record_fps if settings_obj else 20.0,
+            resolution=(
+                settings_obj.resolution_width if settings_obj else 640,
+                settings_obj.resolution_height if settings_obj else 480
+            ),
+            codec=settings_obj.video_codec if settings_obj else "mp4v",
+            pre_roll=app_globals.pre_roll
+        )
+        job.start()
+        app_globals.recording_job = job
+        self._event_job = job
+        self._event_start = now
+
+
+def configure_motion(settings_obj) -> Optional[MotionMonitor]:
+    """Starts, restarts or stops app_globals.motion_monitor to match CameraSettings."""
+    enabled = bool(settings_obj and getattr(settings_obj, "motion_enabled", False))
+    if enabled:
+        try:
+            roi = parse_roi(settings_obj.motion_roi)
+        except ValueError:
+            logger.warning(f"[Motion] Invalid ROI '{settings_obj.motion_roi}', using the whole frame")
+            roi = []
+        detector = MotionDetector(sensitivity=settings_obj.motion_sensitivity, roi=roi)
+
+    current = app_globals.motion_monitor
+    if current:
+        if enabled and current._running \
+                and (current.detector.pixel_threshold, current.detector.area_threshold, current.detector.roi) \
+                == (detector.pixel_threshold, detector.area_threshold, detector.roi) \
+                and current.every_n == max(1, settings_obj.motion_every_n_frames) \
+                and current.action == settings_obj.motion_action \
+                and current.cooldown == settings_obj.motion_cooldown_sec \
+                and current.min_duration == settings_obj.motion_min_duration_sec:
+            return current
+        current.stop()
+        app_globals.motion_monitor = None
+
+    if not enabled:
+        return None
+
+    monitor = MotionMonitor(
+        detector,
+        every_n=settings_obj.motion_every_n_frames,
+        action=settings_obj.motion_action,
+        cooldown=settings_obj.motion_cooldown_sec,
+        min_duration=settings_obj.motion_min_duration_sec,
+    )
+    monitor.start()
+    app_globals.motion_monitor = monitor
+    return monitor
@@ -2,111 +2,441 @@
 
 import os
 import time
+import threading
 import cv2
-from datetime import datetime
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from typing import Optional
 import numpy as np
 from django.conf import settings
-from django.db import connections
+from django.db import DatabaseError
 import logging
 from .camera_core import init_camera 
-from .camera_utils import apply_cv_settings, get_camera_settings, force_restart_livestream
+from .camera_utils import apply_cv_settings, get_camera_settings
+from .models import CameraSettings
 from .globals import app_globals
+from .camera_manager import FrameSubscription
+from .media_index import record_media_file
 logger = logging.getLogger(__name__)
 
 PHOTO_DIR = os.path.join(settings.MEDIA_ROOT, "photos")
 os.makedirs(PHOTO_DIR, exist_ok=True)
-def take_photo(mode="manual"):
+
+# Older frames are left over from before an idle period and not used as "now"
+MAX_FRAME_AGE = 0.5
+
+_photo_pool = None
+_photo_pool_lock = threading.Lock()
+
+
+def frame_luminance(frame_ref) -> float:
+    """Mean brightness (0-255) of a frame, from a heavily reduced image."""
+    jpeg = frame_ref.jpeg
+    if jpeg is not None:
+        gray = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        return float(cv2.mean(gray)[0]) if gray is not None else 0.0
+    pixels = frame_ref.array
+    if pixels is None:
+        return 0.0
+    channels = cv2.mean(pixels[::8, ::8])
+    return float(sum(channels[:3]) / 3.0) if pixels.ndim == 3 else float(channels[0])
+
+
+def wait_for_settled_frame(subscription, timeout=2.0, tolerance=1.0, stable_frames=2, min_frames=4):
     """
-    Captures a photo from the current camera stream.
-    Reuses the shared capture without stopping the livestream.
-    Falls back to cap.read() only if no valid frame is buffered.
-    Returns the file path on success, None on failure.
+    Reads frames until the mean luminance has changed by at most `tolerance`
+    for `stable_frames` consecutive frames, i.e. auto exposure / gain have
+    converged after a control change. The first `min_frames` never count as
+    settled: they may still sit in the driver's queue from before the
+    change. Returns (FrameRef, frames_seen, settled); on timeout the latest
+    frame is returned with settled=False.
     """
-    logger.debug("[PHOTO] take_photo called")
+    deadline = time.monotonic() + timeout
+    previous = None
+    stable = 0
+    frames = 0
+    latest = None
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return latest, frames, False
+        frame_ref = subscription.next(timeout=remaining)
+        if frame_ref is None:
+            continue
+        frames += 1
+        luminance = frame_luminance(frame_ref)
+        stable = stable + 1 if previous is not None and abs(luminance - previous) <= tolerance else 0
+        previous = luminance
+        if latest is not None:
+            latest.release()
+        latest = frame_ref
+        if stable >= stable_frames and frames >= min_frames:
+            return latest, frames, True
+
+
+def photo_filename(timestamp: float, seq: int) -> str:
+    """
+    photo_YYYYmmdd_HHMMSS_mmm_<seq>.jpg: sorts by capture time and stays
+    unique for any number of captures per second (seq is the frame number).
+    """
+    base = time.strftime("%Y%m%d_%H%M%S", time.localtime(timestamp))
+    return f"photo_{base}_{int(timestamp % 1 * 1000):03d}_{seq:06d}.jpg"
+
 
+def _photo_dir(mode):
     subfolder = "timelapse" if mode == "timelapse" else "manual"
     save_dir = os.path.join(PHOTO_DIR, subfolder)
     os.makedirs(save_dir, exist_ok=True)
+    return save_dir
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filepath = os.path.join(save_dir, f"photo_{timestamp}.jpg")
 
-    # Ensure camera is initialized before taking a photo
-    with app_globals.camera_lock:
-        cap = app_globals.camera.cap if app_globals.camera else None
-        if not cap or not cap.isOpened():
-            logger.warning("[PHOTO] Camera not ready. Attempting reinit.")
-            try:
-                init_camera(skip_stream=False)
-                time.sleep(1.0)
-                cap = app_globals.camera.cap
-            except Exception as e:
-                logger.error(f"[PHOTO] Camera reinit failed: {e}")
-                return None
+def _ensure_camera():
+    """Called with camera_lock held. Returns False if the camera can't be opened."""
+    camera = app_globals.camera
+    if camera is not None and camera.idle and not camera.resume():
+        logger.warning("[PHOTO] Camera did not resume from idle in time")
+    cap = app_globals.camera.cap if app_globals.camera else None
+    if not cap or not cap.isOpened():
+        logger.warning("[PHOTO] Camera not ready. Attempting reinit.")
+        try:
+            init_camera(skip_stream=False)
+            time.sleep(1.0)
+            cap = app_globals.camera.cap
+        except Exception as e:
+            logger.error(f"[PHOTO] Camera reinit failed: {e}")
+            return False
+    return True
 
-        # Apply photo-specific settings
-        settings = get_camera_settings()
-        if settings:
+
+@contextmanager
+def photo_profile():
+    """
+    Applies the photo controls to the running capture (only those that
+    differ) and restores the video controls on exit. Yields True if any
+    control changed, i.e. exposure has to settle before a frame is usable.
+    """
+    settings = get_camera_settings()
+    switched = False
+    if settings:
+        try:
+            applied = apply_cv_settings(app_globals.camera, settings, mode="photo")
+            switched = bool(applied and applied["changed"])
+        except Exception as e:
+            logger.warning(f"[PHOTO] Failed to apply photo settings: {e}")
+    try:
+        yield switched
+    finally:
+        if switched:
             try:
-                apply_cv_settings(app_globals.camera, settings, mode="photo")
+                apply_cv_settings(app_globals.camera, settings, mode="video")
             except Exception as e:
-                logger.warning(f"[PHOTO] Failed to apply photo settings: {e}")
-
-        # Try to use the latest buffered frame first
-        frame = None
-        with app_globals.latest_frame_lock:
-            if app_globals.latest_frame is not None:
-                frame = app_globals.latest_frame.copy()
-
-        # If no buffered frame available, read from cap
-        if frame is None:
-            logger.info("[PHOTO] No buffered frame available. Reading directly from camera...")
-            for attempt in range(5):  # Increased retry attempts for stability
-                ret, temp = cap.read()
-                if ret and temp is not None:
-                    frame = temp
-                    break
-                logger.warning(f"[PHOTO] Camera read failed (attempt {attempt + 1})")
-                time.sleep(0.5)
-
-            if frame is None:
-                logger.error("[PHOTO] Failed to capture a valid frame after multiple retries.")
-                return None
-
-    # Save image
-    if not cv2.imwrite(filepath, frame):
-        logger.error("[PHOTO] Failed to write photo.")
+                logger.warning(f"[PHOTO] Failed to restore video settings: {e}")
+
+
+def _first_frame(subscription, switched, after_seq=0):
+    """
+    First usable frame under the photo profile: (FrameRef, settle_frames, settled).
+    A frame with sequence number `after_seq` was already taken and is skipped.
+    """
+    if switched:
+        # Frames already buffered were exposed with the video profile
+        subscription.skip_to_latest()
+        frame_ref, settle_frames, settled = wait_for_settled_frame(subscription)
+        if not settled:
+            logger.warning(f"[PHOTO] Exposure did not settle within {settle_frames} frames")
+        return frame_ref, settle_frames, settled
+
+    frame_ref = app_globals.camera.acquire_frame()
+    if frame_ref is not None and (frame_ref.seq == after_seq or time.time() - frame_ref.timestamp > MAX_FRAME_AGE):
+        frame_ref.release()
+        frame_ref = None
+    if frame_ref is not None:
+        # From seq 0 the subscription's first next() would hand out this frame again
+        subscription.resume_after(frame_ref.seq)
+    else:
+        subscription.skip_to_latest()
+    for attempt in range(5):
+        if frame_ref is not None:
+            break
+        frame_ref = subscription.next(timeout=0.5)
+        if frame_ref is None:
+            logger.warning(f"[PHOTO] No frame from capture thread (attempt {attempt + 1})")
+    return frame_ref, 0, True
+
+
+def _write_atomic(filepath, write):
+    """Writes via a temporary file in the same directory and renames it into place."""
+    tmp_path = f"{filepath}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_photo(frame_ref, filepath, quality=95, save_raw=False) -> bool:
+    """
+    Encodes a frame at `quality` and writes it, then releases the frame.
+    Passthrough frames are already JPEG from the camera and are written
+    as-is (re-encoding can't add quality). With save_raw the uncompressed
+    BGR frame is stored next to it as .npy, loadable with
+    np.load(path, mmap_mode="r"). Files only appear once complete.
+    """
+    try:
+        data = frame_ref.jpeg
+        if data is None:
+            pixels = frame_ref.array
+            ok, encoded = cv2.imencode(".jpg", pixels, [cv2.IMWRITE_JPEG_QUALITY, int(quality)]) \
+                if pixels is not None else (False, None)
+            data = encoded.tobytes() if ok else None
+        if data is None:
+            logger.error(f"[PHOTO] Failed to encode {filepath}")
+            return False
+        _write_atomic(filepath, lambda f: f.write(data))
+
+        if save_raw:
+            pixels = frame_ref.array
+            if pixels is not None:
+                raw_path = os.path.splitext(filepath)[0] + ".npy"
+                _write_atomic(raw_path, lambda f: np.save(f, np.ascontiguousarray(pixels)))
+                record_media_file(raw_path)
+    except OSError as e:
+        logger.error(f"[PHOTO] Write error for {filepath}: {e}")
+        return False
+    finally:
+        frame_ref.release()
+    record_media_file(filepath)
+    return True
+
+
+def _output_options():
+    settings = get_camera_settings()
+    if not settings:
+        return {"quality": 95, "save_raw": False}
+    return {
+        "quality": min(max(settings.photo_quality, 1), 100),
+        "save_raw": settings.save_raw_photos,
+    }
+
+
+def take_photo(mode="manual", report=None, wait=True):
+    """
+    Captures a photo from the current camera stream without stopping it.
+
+    If the photo controls differ from the video controls, they are applied
+    to the running capture, the first frame after exposure has settled is
+    taken and the video controls are restored. Otherwise the next frame is
+    used directly.
+
+    The camera lock is released as soon as the frame is grabbed; encoding
+    (at photo_quality, plus a raw .npy with save_raw_photos) and writing run
+    on the photo writer pool. With wait=False the path is returned without
+    waiting for the file. Returns the file path on success, None on
+    failure; if a dict is passed as `report`, it receives the
+    shutter-to-file latency and settle statistics.
+    """
+    logger.debug("[PHOTO] take_photo called")
+    shutter = time.perf_counter()
+    save_dir = _photo_dir(mode)
+
+    with app_globals.camera_lock:
+        if not _ensure_camera():
+            return None
+        with photo_profile() as switched, FrameSubscription("photo") as subscription:
+            frame_ref, settle_frames, settled = _first_frame(subscription, switched)
+
+        if frame_ref is None:
+            logger.error("[PHOTO] Failed to capture a valid frame after multiple retries.")
+            return None
+        grabbed = time.perf_counter()
+
+    filepath = os.path.join(save_dir, photo_filename(frame_ref.timestamp, frame_ref.seq))
+    future = get_photo_pool().submit(write_photo, frame_ref, filepath, **_output_options())
+    if wait and not future.result():
         return None
 
-    logger.info(f"[PHOTO] Photo saved: {filepath}")
+    latency_ms = (time.perf_counter() - shutter) * 1000.0
+    if report is not None:
+        report.update({
+            "latency_ms": round(latency_ms, 1),
+            "grab_ms": round((grabbed - shutter) * 1000.0, 1),
+            "settle_frames": settle_frames,
+            "settled": settled,
+        })
+    logger.info(f"[PHOTO] Photo saved: {filepath} ({latency_ms:.0f} ms shutter-to-file)")
     return filepath
 
 
+def get_photo_pool() -> ThreadPoolExecutor:
+    """Shared pool for encoding and writing photos (cv2 releases the GIL)."""
+    global _photo_pool
+    with _photo_pool_lock:
+        if _photo_pool is None:
+            _photo_pool = ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 2),
+                                             thread_name_prefix="photo-writer")
+        return _photo_pool
+
+
+def _burst_budget() -> int:
+    """Bytes of grabbed but unwritten burst frames that may be held (PHOTO_BURST_MEMORY_MB)."""
+    return int(float(getattr(settings, "PHOTO_BURST_MEMORY_MB", 256)) * 1024 * 1024)
+
+
+class Burst:
+    """
+    Result of take_burst(). `files` lists the paths in capture order; they
+    are written in the background, wait() blocks until all are on disk.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.grab_seconds = 0.0
+        # Most frame memory held at once while grabbing
+        self.peak_bytes = 0
+        self._futures = []
+
+    @property
+    def grab_fps(self) -> float:
+        if len(self.files) < 2 or self.grab_seconds <= 0:
+            return 0.0
+        return (len(self.files) - 1) / self.grab_seconds
+
+    def wait(self, timeout=None) -> list:
+        """Returns the paths that were written successfully."""
+        done = [future.result(timeout=timeout) for future in self._futures]
+        return [path for path, ok in zip(self.files, done) if ok]
+
+    def stats(self) -> dict:
+        return {
+            "frames": len(self.files),
+            "grab_ms": round(self.grab_seconds * 1000.0, 1),
+            "grab_fps": round(self.grab_fps, 1),
+            "peak_mb": round(self.peak_bytes / (1024 * 1024), 1),
+        }
+
+
+def take_burst(count: int, mode="manual") -> Optional[Burst]:
+    """
+    Grabs `count` consecutive distinct frames at the capture rate and
+    returns as soon as they are grabbed. Each frame is handed to the photo
+    pool as it arrives and stays in memory (as a ring reference) until it
+    is written. At most PHOTO_BURST_MEMORY_MB of unwritten frames are held;
+    beyond that the grab pauses until the writers catch up, so long bursts
+    of large frames continue at the rate they can be written. The pause
+    happens outside camera_lock, so photos and settings changes are not
+    held up by disk writes.
+    """
+    save_dir = _photo_dir(mode)
+    burst = Burst()
+    budget = _burst_budget()
+    pool = get_photo_pool()
+    options = _output_options()
+    # (future, bytes) of submitted frames, oldest first
+    pending = deque()
+    held = 0
+    last_seq = 0
+    started = None
+
+    while len(burst.files) < count:
+        with app_globals.camera_lock:
+            if not _ensure_camera():
+                if started is None:
+                    return None
+                break
+            with photo_profile() as switched, FrameSubscription("burst") as subscription:
+                frame_ref, _, _ = _first_frame(subscription, switched, after_seq=last_seq)
+                if started is None:
+                    started = time.perf_counter()
+                while frame_ref is not None:
+                    size = frame_ref.nbytes
+                    last_seq = frame_ref.seq
+                    filepath = os.path.join(save_dir, photo_filename(frame_ref.timestamp, frame_ref.seq))
+                    future = pool.submit(write_photo, frame_ref, filepath, **options)
+                    burst.files.append(filepath)
+                    burst._futures.append(future)
+                    pending.append((future, size))
+                    held += size
+                    burst.peak_bytes = max(burst.peak_bytes, held)
+                    while pending and pending[0][0].done():
+                        held -= pending.popleft()[1]
+                    if len(burst.files) >= count or held + size > budget:
+                        break
+                    frame_ref = subscription.next(timeout=1.0)
+            burst.grab_seconds = time.perf_counter() - started
+        if frame_ref is None or len(burst.files) >= count:
+            break
+        # Make room for the next frame
+        while pending and held + size > budget:
+            future, written = pending.popleft()
+            wait_futures((future,))
+            held -= written
+
+    if len(burst.files) < count:
+        logger.warning(f"[PHOTO] Burst ended after {len(burst.files)} of {count} frames")
+    logger.info(f"[PHOTO] Burst grabbed: {len(burst.files)} frames at {burst.grab_fps:.1f} fps")
+    return burst
+
 
-def wait_for_table(table_name, db_alias="default", timeout=30):
+def wait_for_table(model, timeout=30):
     """
-    Block until the specified table exists in the database or timeout is reached.
+    Block until the model's table exists in the database or timeout is reached.
     """
     start = time.time()
     while time.time() - start < timeout:
         try:
-            with connections[db_alias].cursor() as cursor:
-                cursor.execute(f"SELECT 1 FROM {table_name} LIMIT 1")
-            return
-        except Exception:
+            model.objects.exists()
+            return True
+        except DatabaseError:
             time.sleep(1)
-    logger.error(f"[ERROR] Timeout: Table '{table_name}' not found after {timeout} seconds.")
+    logger.error(f"[ERROR] Timeout: Table '{model._meta.db_table}' not found after {timeout} seconds.")
+    return False
+
+
+def timelapse_interval(settings_obj) -> int:
+    """Seconds between timelapse photos (photo_interval_min, 1-60 minutes; 2 without settings)."""
+    if not settings_obj:
+        return 2 * 60
+    return max(1, min(settings_obj.photo_interval_min, 60)) * 60
+
+
+def timelapse_tick():
+    """
+    Takes one timelapse photo if timelapse is enabled. Returns the number of
+    seconds until the next one is due.
+    """
+    settings_obj = get_camera_settings()
+    if not settings_obj:
+        logger.warning("[SCHEDULER] No CameraSettings found. Sleeping with default interval.")
+        return timelapse_interval(None)
+
+    if settings_obj.timelapse_enabled:
+        logger.info("[SCHEDULER] Timelapse active → capturing photo")
+        if take_photo(mode="timelapse") is None:
+            # take_photo already reopens the camera; one more try covers a restart in progress
+            logger.warning("[SCHEDULER] Photo capture failed. Retrying once...")
+            time.sleep(1.0)
+            if take_photo(mode="timelapse") is None:
+                logger.error("[SCHEDULER] Retry failed.")
+    else:
+        logger.info("[SCHEDULER] Timelapse disabled.")
+    return timelapse_interval(settings_obj)
+
 
 def start_photo_scheduler():
     """
     Starts the background photo scheduler loop.
-    Periodically captures photos based on user-configured interval.
-    Ensures camera is initialized and stable before each capture.
+    Periodically captures timelapse photos based on the configured interval.
+    Ensures the camera is initialized before the first capture, which is
+    taken right away.
     """
     logger.info("[SCHEDULER] Starting photo scheduler...")
 
     # Wait for the CameraSettings table to be ready
-    wait_for_table("cameraapp_camerasettings")
+    wait_for_table(CameraSettings)
 
     # Initial camera setup
     try:
@@ -125,32 +455,10 @@ def start_photo_scheduler():
     # Main loop
     while True:
         try:
-            settings_obj = get_camera_settings()
-            interval_min = 2  # default fallback
-
-            if settings_obj:
-                interval_min = max(1, min(getattr(settings_obj, "photo_interval_min", 2), 60))
-
-                if settings_obj.timelapse_enabled:
-                    logger.info(f"[SCHEDULER] Timelapse active → capturing photo @ {datetime.now()}")
-                    result = take_photo(mode="timelapse")
-
-                    if result is None:
-                        logger.warning("[SCHEDULER] Photo capture failed. Retrying after reinit...")
-                        try:
-                            init_camera(skip_stream=True)
-                            time.sleep(1.0)
-                            result = take_photo(mode="timelapse")
-                        except Exception as e:
-                            logger.error(f"[SCHEDULER] Retry failed: {e}")
-                else:
-                    logger.info(f"[SCHEDULER] Timelapse disabled. Sleeping for {interval_min} minutes.")
-            else:
-                logger.warning("[SCHEDULER] No CameraSettings found. Sleeping with default interval.")
-
+            delay = timelapse_tick()
         except Exception as e:
             logger.error(f"[SCHEDULER] Unexpected error in scheduler loop: {e}")
-            interval_min = 2
+            delay = timelapse_interval(None)
 
-        logger.debug(f"[SCHEDULER] Sleeping for {interval_min} minutes...")
-        time.sleep(interval_min * 60)
+        logger.debug(f"[SCHEDULER] Sleeping for {delay / 60:.0f} minutes...")
+        time.sleep(delay)
@@ -0,0 +1,109 @@
+# cameraapp/pre_roll.py
+
+import threading
+import time
+import logging
+from collections import deque
+from typing import Optional
+
+from .camera_manager import FrameSubscription
+from .globals import app_globals
+
+logger = logging.getLogger(__name__)
+
+
+class PreRollBuffer:
+    """
+    Keeps the last `seconds` of the stream as JPEG bytes so a recording can
+    start with what happened before start_recording was pressed.
+
+    A background subscriber samples the capture thread at `fps` and stores the
+    hub's JPEG for each sampled frame. The encode is the one shared with
+    stream viewers (free in passthrough mode), so the capture thread is never
+    slowed down. The buffer is trimmed by age and by total size (max_bytes).
+    """
+
+    def __init__(self, seconds: float, fps: float, max_bytes: int):
+        self.seconds = seconds
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self._frames = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info(f"[PreRoll] Buffering {self.seconds:g}s @ {self.fps:g} fps (max {self.max_bytes // (1024 * 1024)} MB)")
+
+    def stop(self):
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> list:
+        """Returns the buffered frames as a list of (timestamp, jpeg bytes), oldest first."""
+        with self._lock:
+            return list(self._frames)
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        last_seq = 0
+        with FrameSubscription("pre_roll") as subscription:
+            while self._running:
+                tick_start = time.monotonic()
+                frame_ref = subscription.next(timeout=1.0)
+                if frame_ref is None:
+                    continue
+                frame_ref.release()
+
+                encoded = app_globals.frame_hub.get_jpeg()
+                if encoded is not None and encoded.seq != last_seq:
+                    last_seq = encoded.seq
+                    self._append(encoded.timestamp, encoded.data)
+
+                remaining = interval - (time.monotonic() - tick_start)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    def _append(self, timestamp: float, data: bytes):
+        with self._lock:
+            self._frames.append((timestamp, data))
+            self._bytes += len(data)
+            cutoff = timestamp - self.seconds
+            while self._frames and (self._frames[0][0] < cutoff or self._bytes > self.max_bytes):
+                _, dropped = self._frames.popleft()
+                self._bytes -= len(dropped)
+
+
+def configure_pre_roll(settings_obj) -> Optional[PreRollBuffer]:
+    """
+    Starts, reconfigures or stops app_globals.pre_roll to match the
+    pre-roll fields of CameraSettings.
+    """
+    seconds = settings_obj.pre_roll_seconds if settings_obj else 0
+    fps = settings_obj.record_fps if settings_obj else 20.0
+    max_bytes = (settings_obj.pre_roll_max_mb if settings_obj else 32) * 1024 * 1024
+
+    current = app_globals.pre_roll
+    if current and seconds and (current.seconds, current.fps, current.max_bytes) == (seconds, fps, max_bytes):
+        return current
+
+    if current:
+        current.stop()
+        app_globals.pre_roll = None
+
+    if seconds > 0 and fps > 0:
+        app_globals.pre_roll = PreRollBuffer(seconds, fps, max_bytes)
+        app_globals.pre_roll.start()
+    return app_globals.pre_roll
@@ -2,21 +2,45 @@
 
 import threading
 import time
+import queue
 import logging
 import cv2
-from typing import Callable
+import numpy as np
+from typing import Callable, Optional
+
+from .frame_ring import FrameRef
+from .camera_manager import FrameSubscription
+from .media_index import record_media_file
 
 logger = logging.getLogger(__name__)
 
+
 class RecordingJob:
+    """
+    Records the camera to a video file at exactly `fps` output frames per
+    second of wall-clock time.
+
+    A pacer thread emits one frame per tick of a monotonic clock: the newest
+    frame captured since the last tick, or the previous frame again if the
+    camera delivered nothing new (duplicated). Frames superseded before any
+    tick picked them up are dropped. Resizing and encoding happen on a
+    separate writer thread fed through a bounded queue, so a slow encode
+    never shifts the tick schedule.
+
+    `pre_roll` is an optional PreRollBuffer (or a list of (timestamp, jpeg
+    bytes)); its frames are written, resampled to `fps`, ahead of the live ones.
+    """
+
     def __init__(
         self,
         filepath: str,
-        duration: float,
+        duration: Optional[float],
         fps: float,
         resolution: tuple[int, int],
         codec: str,
-        frame_provider: Callable[[], any]
+        frame_provider: Optional[Callable[[], any]] = None,
+        queue_size: int = 8,
+        pre_roll: Optional[list] = None
     ):
         self.filepath = filepath
         self.duration = duration
@@ -24,9 +48,18 @@ class RecordingJob:
         self.resolution = resolution
         self.codec = codec
         self.frame_provider = frame_provider
+        self.pre_roll = pre_roll
+        self.pre_roll_frames = 0
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.active = False
         self.frame_count = 0
+        self.dropped_frames = 0
+        self.duplicated_frames = 0
+        self.achieved_fps = 0.0
+        # Wall-clock time of the first live output frame
+        self.started_at = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer_failed = False
 
     def start(self):
         logger.info(f"[RecordingJob] Starting recording to {self.filepath}")
@@ -40,43 +73,201 @@ class RecordingJob:
             self.thread.join(timeout=2.0)
             logger.info("[RecordingJob] Thread stopped.")
 
+    def join(self, timeout: Optional[float] = None):
+        self.thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frame_count,
+            "fps": self.fps,
+            "achieved_fps": round(self.achieved_fps, 2),
+            "dropped": self.dropped_frames,
+            "duplicated": self.duplicated_frames,
+            "pre_roll": self.pre_roll_frames,
+        }
+
     def _run(self):
-        fourcc = cv2.VideoWriter_fourcc(*self.codec)
-        out = cv2.VideoWriter(self.filepath, fourcc, self.fps, self.resolution)
+        # Without an explicit provider, register on the capture thread directly
+        subscription = None
+        frame_provider = self.frame_provider
+        if frame_provider is None:
+            subscription = FrameSubscription("recording")
+            frame_provider = subscription.next
+        else:
+            provider = frame_provider
+            frame_provider = lambda timeout: provider()
 
-        if not out.isOpened():
-            logger.error(f"[RecordingJob] Failed to open file: {self.filepath}")
+        if not self._open_output():
             self.active = False
+            if subscription is not None:
+                subscription.close()
             return
 
-        start_time = time.time()
+        writer = threading.Thread(target=self._write_loop, daemon=True)
+        writer.start()
+        try:
+            self._flush_pre_roll()
+            self._pace(frame_provider)
+        finally:
+            if subscription is not None:
+                subscription.close()
+            self._queue.put(None)
+            writer.join()
+            self._close_output()
+            self.active = False
+            logger.info(
+                f"[RecordingJob] Done recording {self.frame_count} frames → {self.filepath} "
+                f"(target {self.fps:g} fps, achieved {self.achieved_fps:.2f} fps, "
+                f"{self.dropped_frames} dropped, {self.duplicated_frames} duplicated)"
+            )
+
+    def _flush_pre_roll(self):
+        """
+        Queues the pre-roll frames, one per output tick of their time span.
+        With a live PreRollBuffer, frames it collected while the backlog was
+        being written are flushed too, so live recording starts without a gap.
+        """
+        source, self.pre_roll = self.pre_roll, None
+        if not source:
+            return
+        live = hasattr(source, "snapshot")
+        frames = source.snapshot() if live else list(source)
+        if not frames:
+            return
+
+        interval = 1.0 / self.fps
+        first = frames[0][0]
+        tick = 0
+        for _ in range(10 if live else 1):
+            index = 0
+            while self.active and first + tick * interval <= frames[-1][0]:
+                tick_time = first + tick * interval
+                while index + 1 < len(frames) and frames[index + 1][0] <= tick_time:
+                    index += 1
+                self._queue.put(frames[index][1])
+                self.pre_roll_frames += 1
+                tick += 1
+            if not live:
+                break
+            last = frames[-1][0]
+            frames = [frame for frame in source.snapshot() if frame[0] > last]
+            if not frames:
+                break
+        logger.info(f"[RecordingJob] Queued {self.pre_roll_frames} pre-roll frames ({tick * interval:.1f}s)")
+
+    def _total_ticks(self):
+        # duration may be extended while recording (motion events); None
+        # records until stop()
+        if self.duration is None:
+            return float("inf")
+        return max(1, round(self.duration * self.fps))
+
+    def _pace(self, frame_provider):
+        interval = 1.0 / self.fps
         max_wait = 5.0
-        wait_start = None
+        # Latest frame and whether a tick has already emitted it
+        current = None
+        emitted = False
+        last_frame_time = time.monotonic()
+        start = None
+        ticks = 0
 
-        while self.active and (time.time() - start_time) < self.duration:
-            frame = self.frame_provider()
+        try:
+            while self.active and not self._writer_failed and ticks < self._total_ticks():
+                now = time.monotonic()
+                next_tick = start + ticks * interval if start is not None else now + interval
 
-            if frame is None:
-                if wait_start is None:
-                    wait_start = time.time()
-                elif time.time() - wait_start > max_wait:
+                # Collect frames until the next tick is due
+                frame = frame_provider(timeout=max(0.0, min(next_tick - now, 1.0)))
+                if frame is not None:
+                    last_frame_time = time.monotonic()
+                    if current is not None:
+                        if not emitted:
+                            self.dropped_frames += 1
+                        self._release(current)
+                    current, emitted = frame, False
+                    if start is None:
+                        # The clock starts with the first frame
+                        start = last_frame_time
+                        self.started_at = time.time()
+                elif time.monotonic() - last_frame_time > max_wait:
                     logger.warning("[RecordingJob] No frames for too long → abort")
                     break
-                time.sleep(0.05)
-                continue
 
-            wait_start = None
+                if start is None:
+                    continue
+
+                # Emit one frame for every tick that is due; catching up after
+                # a stall duplicates the current frame
+                due = min(int((time.monotonic() - start) / interval) + 1, self._total_ticks())
+                if ticks < due:
+                    while ticks < due:
+                        if emitted:
+                            self.duplicated_frames += 1
+                        self._queue.put(self._retain(current))
+                        emitted = True
+                        ticks += 1
+                    # Kept current while recording, for stats() and /metrics
+                    self.achieved_fps = ticks / (time.monotonic() - start + interval)
+        finally:
+            if current is not None:
+                self._release(current)
+            if start is not None:
+                # Tick n covers [n, n + 1) intervals after start
+                elapsed = time.monotonic() - start + interval
+                self.achieved_fps = ticks / elapsed
+
+    def _open_writer(self, filepath):
+        fourcc = cv2.VideoWriter_fourcc(*self.codec)
+        out = cv2.VideoWriter(filepath, fourcc, self.fps, self.resolution)
+        if not out.isOpened():
+            logger.error(f"[RecordingJob] Failed to open file: {filepath}")
+            return None
+        return out
+
+    def _open_output(self) -> bool:
+        self._out = self._open_writer(self.filepath)
+        return self._out is not None
+
+    def _write(self, pixels):
+        self._out.write(pixels)
+
+    def _close_output(self):
+        self._out.release()
+        record_media_file(self.filepath)
 
+    def _write_loop(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
             try:
-                resized = cv2.resize(frame, self.resolution)
-                out.write(resized)
+                if self._writer_failed:
+                    continue
+                if isinstance(frame, bytes):
+                    pixels = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+                elif isinstance(frame, FrameRef):
+                    pixels = frame.array
+                else:
+                    pixels = frame
+                if pixels is None:
+                    logger.warning("[RecordingJob] Could not decode frame, skipping")
+                    continue
+                if (pixels.shape[1], pixels.shape[0]) != tuple(self.resolution):
+                    pixels = cv2.resize(pixels, self.resolution)
+                self._write(pixels)
                 self.frame_count += 1
             except Exception as e:
                 logger.error(f"[RecordingJob] Write error: {e}")
-                break
+                self._writer_failed = True
+            finally:
+                self._release(frame)
 
-            time.sleep(1.0 / self.fps)
+    @staticmethod
+    def _retain(frame):
+        return frame.clone() if isinstance(frame, FrameRef) else frame
 
-        out.release()
-        logger.info(f"[RecordingJob] Done recording {self.frame_count} frames → {self.filepath}")
-        self.active = False
+    @staticmethod
+    def _release(frame):
+        if isinstance(frame, FrameRef):
+            frame.release()
@@ -0,0 +1,301 @@
+# cameraapp/retention.py
+
+import os
+import heapq
+import threading
+import time
+import logging
+from typing import Optional
+
+from django.conf import settings
+
+from .globals import app_globals
+
+logger = logging.getLogger(__name__)
+
+PHOTO_DIR = os.path.join(settings.MEDIA_ROOT, "photos")
+RECORD_DIR = os.path.join(settings.MEDIA_ROOT, "recordings")
+
+# category -> (directories, file extensions)
+CATEGORIES = {
+    "photos": ([PHOTO_DIR, os.path.join(PHOTO_DIR, "manual")], (".jpg", ".jpeg", ".png", ".npy")),
+    "timelapse": ([os.path.join(PHOTO_DIR, "timelapse")], (".jpg", ".jpeg", ".png", ".npy")),
+    "recordings": ([RECORD_DIR], (".mp4", ".avi", ".mkv")),
+}
+
+# Compiled timelapse videos are indexed for the media browser but never
+# pruned or bulk-deleted with the recordings: they are rebuilt only by
+# appending, so losing one means re-encoding the whole history
+TIMELAPSE_VIDEO_DIR = os.path.join(settings.MEDIA_ROOT, "timelapse_videos")
+MEDIA_CATEGORIES = {**CATEGORIES, "timelapse_videos": ([TIMELAPSE_VIDEO_DIR], (".mp4",))}
+
+
+class _CategoryIndex:
+    """
+    Files of one category ordered by age. `files` is the authoritative
+    path -> (mtime, size) map; `heap` may contain stale entries, which are
+    skipped when popped.
+    """
+    __slots__ = ("files", "heap", "total_bytes", "max_bytes", "max_age")
+
+    def __init__(self):
+        self.files = {}
+        self.heap = []
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.max_age = 0
+
+    def add(self, path, mtime, size):
+        self.remove(path)
+        self.files[path] = (mtime, size)
+        self.total_bytes += size
+        heapq.heappush(self.heap, (mtime, path))
+
+    def remove(self, path):
+        entry = self.files.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def oldest(self):
+        while self.heap:
+            mtime, path = self.heap[0]
+            entry = self.files.get(path)
+            if entry is not None and entry[0] == mtime:
+                return mtime, path, entry[1]
+            heapq.heappop(self.heap)
+        return None
+
+    def over_budget(self, now):
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            return True
+        oldest = self.oldest()
+        return bool(self.max_age and oldest and now - oldest[0] > self.max_age)
+
+
+class RetentionManager:
+    """
+    Keeps photos, timelapse frames and recordings within per-category byte
+    and age budgets by deleting the oldest files first.
+
+    The directories are walked once on start; after that the index is kept
+    up to date through note_file()/forget() calls from the code that writes
+    or deletes media, so pruning never has to rescan the tree. Deletion runs
+    in batches on a low-priority background thread; note_file() only takes a
+    short lock and never waits for pruning, so capture and writer threads are
+    never blocked.
+    """
+
+    def __init__(self, budgets: dict, interval: float = 60.0, batch_size: int = 100,
+                 categories: Optional[dict] = None):
+        self._lock = threading.Lock()
+        self.categories = {
+            name: ([os.path.abspath(d) for d in directories], extensions)
+            for name, (directories, extensions) in (categories or CATEGORIES).items()
+        }
+        self._index = {name: _CategoryIndex() for name in self.categories}
+        self.interval = interval
+        self.batch_size = batch_size
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self.set_budgets(budgets)
+
+    def set_budgets(self, budgets: dict):
+        """budgets: category -> (max_bytes, max_age_seconds); 0 means unlimited."""
+        with self._lock:
+            for name, (max_bytes, max_age) in budgets.items():
+                self._index[name].max_bytes = max_bytes
+                self._index[name].max_age = max_age
+        self._wakeup.set()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+
+    def scan(self):
+        """Builds the index from disk. Called once on start."""
+        for name, (directories, extensions) in self.categories.items():
+            entries = []
+            for directory in directories:
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            if entry.is_file() and entry.name.lower().endswith(extensions):
+                                stat = entry.stat()
+                                entries.append((entry.path, stat.st_mtime, stat.st_size))
+                except FileNotFoundError:
+                    continue
+            with self._lock:
+                index = self._index[name]
+                for path, mtime, size in entries:
+                    index.add(path, mtime, size)
+            logger.info(f"[Retention] {name}: {len(entries)} files indexed")
+
+    def category_for(self, path: str) -> Optional[str]:
+        directory = os.path.dirname(os.path.abspath(path))
+        for name, (directories, extensions) in self.categories.items():
+            if directory in directories and path.lower().endswith(extensions):
+                return name
+        return None
+
+    def note_file(self, path: str):
+        """Registers a newly written (or rewritten) media file."""
+        name = self.category_for(path)
+        if name is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            index = self._index[name]
+            index.add(os.path.abspath(path), stat.st_mtime, stat.st_size)
+            over = index.max_bytes and index.total_bytes > index.max_bytes
+        if over:
+            self._wakeup.set()
+
+    def forget(self, path: str):
+        """Drops a file that was deleted by someone else from the index."""
+        name = self.category_for(path)
+        if name is not None:
+            with self._lock:
+                self._index[name].remove(os.path.abspath(path))
+
+    def usage(self) -> dict:
+        now = time.time()
+        result = {}
+        with self._lock:
+            for name, index in self._index.items():
+                oldest = index.oldest()
+                result[name] = {
+                    "bytes": index.total_bytes,
+                    "files": len(index.files),
+                    "max_bytes": index.max_bytes,
+                    "max_age_days": index.max_age / 86400.0 if index.max_age else 0,
+                    "oldest_age_days": round((now - oldest[0]) / 86400.0, 2) if oldest else None,
+                }
+        return result
+
+    def prune(self) -> int:
+        """Deletes files until every category is within budget. Returns the number deleted."""
+        deleted = 0
+        for name in self.categories:
+            # Without a background thread (direct call) run to completion
+            while self._running or self._thread is None:
+                batch = self._take_batch(name)
+                if not batch:
+                    break
+                deleted += self._delete(name, batch)
+                # Give capture and encode threads the CPU between batches
+                time.sleep(0)
+        return deleted
+
+    def _take_batch(self, name):
+        now = time.time()
+        batch = []
+        with self._lock:
+            index = self._index[name]
+            while len(batch) < self.batch_size and index.over_budget(now):
+                mtime, path, size = index.oldest()
+                index.remove(path)
+                batch.append((path, size))
+        return batch
+
+    def _delete(self, name, batch):
+        removed = []
+        for path, size in batch:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"[Retention] Could not delete {path}: {e}")
+                continue
+            removed.append(path)
+            self.deleted_bytes += size
+        self.deleted_files += len(removed)
+        if removed:
+            self._forget_index_entries(removed)
+        logger.info(f"[Retention] {name}: deleted {len(removed)} oldest files")
+        return len(removed)
+
+    @staticmethod
+    def _forget_index_entries(paths):
+        """Removes the index rows of deleted files and the cached thumbnails only they used."""
+        from django.db import close_old_connections
+        from .media_index import relative_media_path
+        from .models import MediaItem, RecordingSegment
+        from .thumbnails import thumbnail_path
+        try:
+            close_old_connections()
+            items = MediaItem.objects.filter(path__in=[relative_media_path(p) for p in paths])
+            keys = set(items.exclude(thumb_key="").values_list("thumb_key", flat=True))
+            items.delete()
+            RecordingSegment.objects.filter(path__in=paths).delete()
+            # Thumbnails are named after their content; identical files share one
+            keys -= set(MediaItem.objects.filter(thumb_key__in=keys).values_list("thumb_key", flat=True))
+        except Exception as e:
+            logger.warning(f"[Retention] Could not remove index entries: {e}")
+            return
+        for key in keys:
+            try:
+                os.remove(thumbnail_path(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"[Retention] Could not delete thumbnail {key}: {e}")
+
+    def _run(self):
+        try:
+            # Linux allows per-thread niceness; pruning should yield to capture
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        self.scan()
+        while self._running:
+            try:
+                self.prune()
+            except Exception as e:
+                logger.error(f"[Retention] Pruning failed: {e}")
+            self._wakeup.wait(timeout=self.interval)
+            self._wakeup.clear()
+
+
+def note_media_file(path: str):
+    """Tells the retention manager (if running) about a newly written file."""
+    if app_globals.retention:
+        app_globals.retention.note_file(path)
+
+
+def forget_media_file(path: str):
+    if app_globals.retention:
+        app_globals.retention.forget(path)
+
+
+def budgets_from_settings(settings_obj) -> dict:
+    budgets = {}
+    for name in CATEGORIES:
+        max_mb = getattr(settings_obj, f"retention_{name}_mb", 0) if settings_obj else 0
+        max_days = getattr(settings_obj, f"retention_{name}_days", 0) if settings_obj else 0
+        budgets[name] = (max_mb * 1024 * 1024, max_days * 86400)
+    return budgets
+
+
+def configure_retention(settings_obj) -> RetentionManager:
+    """Starts app_globals.retention on first use and applies the current budgets."""
+    budgets = budgets_from_settings(settings_obj)
+    if app_globals.retention is None:
+        app_globals.retention = RetentionManager(budgets)
+        app_globals.retention.start()
+    else:
+        app_globals.retention.set_budgets(budgets)
+    return app_globals.retention
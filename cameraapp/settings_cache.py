@@ -0,0 +1,103 @@
+# cameraapp/settings_cache.py
+
+import os
+import tempfile
+import threading
+import logging
+
+from django.conf import settings
+
+from .models import CameraSettings
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE = getattr(
+    settings, "CAMERA_SETTINGS_VERSION_FILE",
+    os.path.join(tempfile.gettempdir(), "ipcam_camera_settings.version")
+)
+
+
+class SettingsSnapshot:
+    """
+    Read-only copy of the CameraSettings row. Safe to share between threads;
+    code that changes settings works on the model instance and saves it.
+    """
+    __slots__ = tuple(field.attname for field in CameraSettings._meta.concrete_fields)
+
+    def __init__(self, instance):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(instance, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingsSnapshot is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("SettingsSnapshot is read-only")
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __repr__(self):
+        return f"<SettingsSnapshot id={self.id}>"
+
+
+def _file_version():
+    try:
+        stat = os.stat(VERSION_FILE)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def bump_version():
+    """Marks the settings as changed for every process (web workers, scheduler)."""
+    try:
+        tmp_path = f"{VERSION_FILE}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w") as f:
+            f.write(str(os.getpid()))
+        # A new inode per bump, so even two saves within one mtime tick differ
+        os.replace(tmp_path, VERSION_FILE)
+    except OSError as e:
+        logger.warning(f"[Settings] Could not update version file: {e}")
+
+
+class SettingsCache:
+    """
+    Keeps the current SettingsSnapshot in memory.
+
+    Saves in this process invalidate it directly (post_save signal); saves in
+    other processes are noticed through the version file, which costs one
+    stat() per lookup instead of a database query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._generation = 0
+        self._loaded_generation = -1
+
+    def _is_current(self, version):
+        return self._loaded_generation == self._generation and version == self._version
+
+    def get(self):
+        version = _file_version()
+        if self._is_current(version):
+            return self._snapshot
+        with self._lock:
+            if not self._is_current(version):
+                # Generation and version are read before the query: a save
+                # racing with the load invalidates it again
+                generation = self._generation
+                instance = CameraSettings.objects.first()
+                self._snapshot = SettingsSnapshot(instance) if instance else None
+                self._version = version
+                self._loaded_generation = generation
+            return self._snapshot
+
+    def invalidate(self):
+        self._generation += 1
+
+
+settings_cache = SettingsCache()
@@ -1,2 +1,21 @@
 # cameraapp/signals.py
-# Add signal handlers here later if needed
\ No newline at end of file
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CameraSettings
+from .settings_cache import settings_cache, bump_version
+
+
+@receiver(post_save, sender=CameraSettings)
+@receiver(post_delete, sender=CameraSettings)
+def camera_settings_changed(sender, **kwargs):
+    """Drops the cached settings snapshot here now and in other processes once committed."""
+    settings_cache.invalidate()
+
+    def committed():
+        settings_cache.invalidate()
+        bump_version()
+
+    transaction.on_commit(committed)
@@ -1,7 +1,54 @@
-from django.test import TestCase, Client
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
+import cv2
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 
+from .frame_hub import FrameBroadcastHub, StreamProfile
+from .frame_ring import FrameRing
+from .frame_sources import FileReplaySource, SyntheticSource, open_source, serves_source
+from .camera_manager import CameraManager, FrameSubscription
+from .camera_utils import apply_cv_settings
+from .dvr import SegmentedRecordingJob
+from .models import CameraSettings, MediaItem, RecordingSegment
+from .motion import MotionDetector, configure_motion, parse_roi
+from .globals import app_globals
+from .metrics import TimedLock
+from .photo_camera import photo_filename, start_photo_scheduler, take_burst, timelapse_tick, wait_for_settled_frame, write_photo
+from .pre_roll import PreRollBuffer
+from .media_index import category_for
+from .retention import RECORD_DIR, RetentionManager
+from .settings_cache import SettingsCache, bump_version
+from .thumbnails import thumbnail_path
+from .timelapse import CHUNK_DIR, TIMELAPSE_VIDEO_DIR, IncrementalTimelapse
+from .recording_job import RecordingJob
+
+
+@contextmanager
+def running_camera(source="synthetic://160x120@30"):
+    """Runs a CameraManager on a synthetic source, so tests need no device."""
+    camera = CameraManager(source=source, retry_delay=0.1, max_retries=1)
+    try:
+        yield camera
+    finally:
+        camera.stop()
+
+
+@override_settings(CAMERA_URL="synthetic://320x240@15")
 class CameraStreamTests(TestCase):
 
     def setUp(self):
@@ -11,6 +58,13 @@ class CameraStreamTests(TestCase):
         self.user = User.objects.create_user(username=self.username, password=self.password)
         self.client = Client()
 
+    def tearDown(self):
+        if app_globals.livestream_job:
+            app_globals.livestream_job.stop()
+            app_globals.livestream_job = None
+        if app_globals.camera:
+            app_globals.camera.stop()
+
     def test_login_required_for_stream_page(self):
         response = self.client.get(reverse("stream_page"))
         self.assertRedirects(response, f"/accounts/login/?next=/")
@@ -29,3 +83,779 @@ class CameraStreamTests(TestCase):
         response = self.client.get(reverse("video_feed"))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'multipart/x-mixed-replace; boundary=frame')
+
+    def test_pre_roll_is_enabled_from_the_settings_page(self):
+        self.client.login(username=self.username, password=self.password)
+        data = {name: value for name, value in model_to_dict(CameraSettings.objects.get_or_create(pk=1)[0]).items()
+                if value is not None and value is not False}
+        data.update(pre_roll_seconds=3, pre_roll_max_mb=4)
+        try:
+            response = self.client.post(reverse("settings_view"), data)
+            self.assertEqual(response.status_code, 302)
+            self.assertIsNotNone(app_globals.pre_roll)
+            self.assertEqual((app_globals.pre_roll.seconds, app_globals.pre_roll.max_bytes), (3, 4 * 1024 * 1024))
+
+            data["pre_roll_seconds"] = 0
+            self.client.post(reverse("settings_view"), data)
+            self.assertIsNone(app_globals.pre_roll)
+        finally:
+            if app_globals.pre_roll:
+                app_globals.pre_roll.stop()
+                app_globals.pre_roll = None
+
+    def test_pages_read_settings_from_the_cache(self):
+        CameraSettings.objects.create(record_fps=12.0)
+        self.client.login(username=self.username, password=self.password)
+        self.client.get(reverse("photo_settings_page"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("photo_settings_page"))
+        self.assertEqual(response.context["settings"].record_fps, 12.0)
+        self.assertFalse([query for query in queries if "cameraapp_camerasettings" in query["sql"]])
+
+    def test_media_usage_does_not_start_the_retention_manager(self):
+        self.client.login(username=self.username, password=self.password)
+        with mock.patch.object(app_globals, "retention", None), mock.patch("cameraapp.middleware.init_camera"):
+            response = self.client.get(reverse("media_usage"))
+            self.assertEqual(response.json(), {"status": "not running"})
+            self.assertIsNone(app_globals.retention)
+
+    def test_galleries_are_paginated_from_the_media_index(self):
+        start = timezone.now() - datetime.timedelta(days=1)
+        MediaItem.objects.bulk_create([
+            MediaItem(category="timelapse", path=f"photos/timelapse/photo_{i:04d}.jpg",
+                      created_at=start + datetime.timedelta(minutes=i))
+            for i in range(250)
+        ])
+        self.client.login(username=self.username, password=self.password)
+
+        response = self.client.get(reverse("timelaps_view"))
+        self.assertEqual(response.context["page_obj"].number, 2)
+        self.assertEqual(len(response.context["photos"]), 50)
+        self.assertEqual(response.context["photos"][-1], "/media/photos/timelapse/photo_0249.jpg")
+
+        response = self.client.get(reverse("timelaps_view"), {"page": 1})
+        self.assertEqual(response.context["photos"][0], "/media/photos/timelapse/photo_0000.jpg")
+
+    def test_media_browser_links_raw_files_and_keeps_other_pages(self):
+        start = timezone.now() - datetime.timedelta(days=1)
+        MediaItem.objects.bulk_create([
+            MediaItem(category="photos", path=f"photos/photo_{i:04d}.jpg", created_at=start + datetime.timedelta(minutes=i))
+            for i in range(150)
+        ] + [
+            MediaItem(category="photos", media_type="raw", path="photos/photo_0149.npy",
+                      created_at=start + datetime.timedelta(minutes=149)),
+            MediaItem(category="timelapse", path="photos/timelapse/photo_0000.jpg", created_at=start),
+        ])
+        self.client.login(username=self.username, password=self.password)
+
+        response = self.client.get(reverse("media_browser"), {"view": "thumb", "timelapse_page": 1})
+        photos = response.context["media_tree"][0]
+        raw = next(item for item in photos["content"] if item["name"] == "photo_0149.npy")
+        self.assertEqual(raw["type"], "raw")
+        self.assertContains(response, '<a class="thumb-item" href="/media/photos/photo_0149.npy" download>')
+        self.assertNotContains(response, "showMediaModal('raw'")
+        self.assertContains(response, 'href="?view=thumb&amp;timelapse_page=1&amp;photos_page=1"')
+
+    def test_frames_api_pages_through_a_time_window(self):
+        start = timezone.now().replace(microsecond=0) - datetime.timedelta(days=1)
+        MediaItem.objects.bulk_create([
+            MediaItem(category="timelapse", path=f"photos/timelapse/photo_{i:04d}.jpg",
+                      created_at=start + datetime.timedelta(minutes=i))
+            for i in range(100)
+        ])
+        self.client.login(username=self.username, password=self.password)
+        params = {
+            "from": (start + datetime.timedelta(minutes=10)).isoformat(),
+            "to": (start + datetime.timedelta(minutes=60)).isoformat(),
+            "stride": 10, "limit": 2,
+        }
+
+        names = []
+        while True:
+            data = self.client.get(reverse("media_frames"), params).json()
+            names += [frame["url"].rsplit("/", 1)[1] for frame in data["frames"]]
+            if not data["next_cursor"]:
+                break
+            params["cursor"] = data["next_cursor"]
+        self.assertEqual(names, [f"photo_{i:04d}.jpg" for i in range(10, 60, 10)])
+
+        response = self.client.get(reverse("media_frames"), {"cursor": "nonsense"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_thumbnails_are_generated_and_cached(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp), \
+                mock.patch("cameraapp.thumbnails.THUMB_DIR", os.path.join(tmp, "thumbs")):
+            os.makedirs(os.path.join(tmp, "photos"))
+            cv2.imwrite(os.path.join(tmp, "photos", "photo.jpg"), np.full((480, 640, 3), 128, np.uint8))
+            item = MediaItem.objects.create(category="photos", path="photos/photo.jpg", created_at=timezone.now())
+            self.client.login(username=self.username, password=self.password)
+
+            response = self.client.get(item.thumb_url)
+            item.refresh_from_db()
+            self.assertEqual(len(item.thumb_key), 40)
+            self.assertRedirects(response, item.thumb_url, fetch_redirect_response=False)
+
+            response = self.client.get(item.thumb_url)
+            self.assertEqual(response["ETag"], f'"{item.thumb_key}"')
+            self.assertIn("immutable", response["Cache-Control"])
+            thumb = cv2.imdecode(np.frombuffer(b"".join(response.streaming_content), np.uint8), cv2.IMREAD_COLOR)
+            self.assertEqual(thumb.shape, (120, 160, 3))
+
+            response = self.client.get(item.thumb_url, HTTP_IF_NONE_MATCH=f'"{item.thumb_key}"')
+            self.assertEqual(response.status_code, 304)
+
+
+class SettingsCacheTests(TestCase):
+
+    def test_snapshot_is_cached_until_settings_change(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("cameraapp.settings_cache.VERSION_FILE", os.path.join(tmp, "version")):
+            cache = SettingsCache()
+            with mock.patch("cameraapp.signals.settings_cache", cache):
+                settings_obj = CameraSettings.objects.create(record_fps=15.0)
+                snapshot = cache.get()
+                self.assertEqual(snapshot.record_fps, 15.0)
+                with self.assertRaises(AttributeError):
+                    snapshot.record_fps = 30.0
+                with self.assertNumQueries(0):
+                    self.assertIs(cache.get(), snapshot)
+
+                # Saved in this process: invalidated by the post_save signal
+                settings_obj.record_fps = 25.0
+                settings_obj.save()
+                self.assertEqual(cache.get().record_fps, 25.0)
+
+                # Saved elsewhere: noticed through the version file
+                CameraSettings.objects.filter(pk=settings_obj.pk).update(record_fps=30.0)
+                self.assertEqual(cache.get().record_fps, 25.0)
+                bump_version()
+                self.assertEqual(cache.get().record_fps, 30.0)
+
+
+class ApplySettingsTests(SimpleTestCase):
+
+    class FakeCapture:
+        def __init__(self):
+            self.calls = []
+            self.values = {}
+
+        def isOpened(self):
+            return True
+
+        def set(self, prop, value):
+            self.calls.append(prop)
+            self.values[prop] = value
+            return True
+
+        def get(self, prop):
+            return self.values.get(prop, 0.0)
+
+    def test_only_changed_controls_are_set(self):
+        cap = self.FakeCapture()
+        manager = mock.Mock(cap=cap, applied_controls={})
+        settings_obj = CameraSettings(video_exposure_mode="manual")
+
+        report = apply_cv_settings(manager, settings_obj)
+        self.assertEqual(len(cap.calls), len(report["changed"]))
+        self.assertEqual(report["actual"], {})
+
+        cap.calls.clear()
+        self.assertEqual(apply_cv_settings(manager, settings_obj)["changed"], {})
+        self.assertEqual(cap.calls, [])
+
+        settings_obj.video_brightness = 100.0
+        report = apply_cv_settings(manager, settings_obj, verify=True)
+        self.assertEqual(report["changed"], {"brightness": 100.0})
+        self.assertEqual(report["actual"], {"brightness": 100.0})
+        self.assertEqual(cap.calls, [cv2.CAP_PROP_BRIGHTNESS])
+
+    def test_exposure_is_reapplied_after_auto_exposure(self):
+        cap = self.FakeCapture()
+        manager = mock.Mock(cap=cap, applied_controls={})
+        settings_obj = CameraSettings(photo_exposure_mode="manual", photo_exposure=-5.0,
+                                      video_exposure_mode="auto")
+
+        self.assertEqual(apply_cv_settings(manager, settings_obj, mode="photo")["changed"]["exposure"], -5.0)
+        self.assertEqual(apply_cv_settings(manager, settings_obj, mode="video")["changed"], {"auto_exposure": 0.75})
+        # The driver changed exposure while in auto mode, so the photo value is set again
+        cap.calls.clear()
+        changed = apply_cv_settings(manager, settings_obj, mode="photo")["changed"]
+        self.assertEqual(changed, {"auto_exposure": 0.25, "exposure": -5.0})
+        self.assertEqual(cap.calls, [cv2.CAP_PROP_AUTO_EXPOSURE, cv2.CAP_PROP_EXPOSURE])
+
+    def test_resolved_default_device_counts_as_the_configured_source(self):
+        self.assertTrue(serves_source("/dev/video2", 0))
+        self.assertTrue(serves_source("synthetic://320x240@15", "synthetic://320x240@15"))
+        self.assertFalse(serves_source("/dev/video2", "rtsp://camera/stream"))
+        self.assertFalse(serves_source("synthetic://320x240@15", 0))
+
+
+class PhotoCaptureTests(SimpleTestCase):
+
+    def test_waits_for_luminance_to_converge(self):
+        levels = [50, 50, 80, 110, 120, 121, 121, 121, 121]
+        refs = [mock.Mock(jpeg=None, array=np.full((48, 64, 3), level, np.uint8)) for level in levels]
+        subscription = mock.Mock()
+        subscription.next.side_effect = refs
+
+        frame_ref, frames, settled = wait_for_settled_frame(subscription, timeout=5.0)
+        self.assertTrue(settled)
+        self.assertEqual(frames, 7)
+        self.assertIs(frame_ref, refs[6])
+        # Every frame but the returned one was released
+        self.assertTrue(all(ref.release.called for ref in refs[:6]))
+        self.assertFalse(frame_ref.release.called)
+
+    def test_photo_names_are_unique_within_a_second(self):
+        now = time.time() // 1
+        names = [photo_filename(now + 0.25, 41), photo_filename(now + 0.25, 42), photo_filename(now + 0.5, 43)]
+        self.assertEqual(len(set(names)), 3)
+        self.assertEqual(sorted(names), names)
+        self.assertTrue(names[0].endswith("_250_000041.jpg"))
+
+    def test_writes_at_configured_quality_with_raw_copy(self):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+        with tempfile.TemporaryDirectory() as tmp:
+            sizes = {}
+            for quality in (30, 95):
+                ref = mock.Mock(jpeg=None, array=pixels)
+                path = os.path.join(tmp, f"q{quality}.jpg")
+                self.assertTrue(write_photo(ref, path, quality=quality, save_raw=quality == 95))
+                self.assertTrue(ref.release.called)
+                sizes[quality] = os.path.getsize(path)
+            self.assertLess(sizes[30], sizes[95])
+
+            raw = np.load(os.path.join(tmp, "q95.npy"), mmap_mode="r")
+            self.assertIsInstance(raw, np.memmap)
+            self.assertTrue((raw == pixels).all())
+            self.assertEqual(sorted(os.listdir(tmp)), ["q30.jpg", "q95.jpg", "q95.npy"])
+
+
+class BurstCaptureTests(TestCase):
+
+    @override_settings(PHOTO_BURST_MEMORY_MB=0.12)
+    def test_burst_writes_distinct_frames_within_memory_budget(self):
+        def write_outside_camera_lock(frame_ref, filepath, **options):
+            # A grab waiting for this write while holding camera_lock would stall here
+            self.assertTrue(app_globals.camera_lock.acquire(timeout=5))
+            app_globals.camera_lock.release()
+            return write_photo(frame_ref, filepath, **options)
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("cameraapp.photo_camera.PHOTO_DIR", tmp), \
+                mock.patch("cameraapp.photo_camera.record_media_file"), \
+                mock.patch("cameraapp.photo_camera.write_photo", side_effect=write_outside_camera_lock):
+            with running_camera():
+                burst = take_burst(6)
+                written = burst.wait(timeout=10)
+
+            self.assertEqual(written, burst.files)
+            self.assertEqual(len(set(written)), 6)
+            self.assertTrue(all(os.path.getsize(path) > 0 for path in written))
+            # 160x120 BGR frames are 57600 bytes; the 0.12 MB budget holds two
+            self.assertGreater(burst.peak_bytes, 0)
+            self.assertLessEqual(burst.peak_bytes, 2 * 160 * 120 * 3)
+
+    def test_burst_on_a_running_camera_starts_with_distinct_frames(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("cameraapp.photo_camera.PHOTO_DIR", tmp), \
+                mock.patch("cameraapp.photo_camera.record_media_file"):
+            with running_camera() as camera:
+                # A frame is already buffered, so the burst starts from it
+                _, frame_ref = camera.wait_for_frame(0, timeout=5)
+                frame_ref.release()
+                burst = take_burst(3)
+                written = burst.wait(timeout=10)
+
+            self.assertEqual(len(set(written)), 3)
+
+
+class TimelapseTests(TestCase):
+
+    def _add_photos(self, directory, start, count, offset):
+        for i in range(offset, offset + count):
+            name = f"photo_{i:03d}.jpg"
+            cv2.imwrite(os.path.join(directory, name), np.full((240, 320, 3), i * 20, np.uint8))
+            MediaItem.objects.create(category="timelapse", path=f"photos/timelapse/{name}",
+                                     created_at=start + datetime.timedelta(minutes=i))
+
+    def test_incremental_compile_appends_only_new_frames(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp):
+            photos = os.path.join(tmp, "photos", "timelapse")
+            os.makedirs(photos)
+            start = timezone.now() - datetime.timedelta(days=2)
+            output = os.path.join(tmp, "timelapse.mp4")
+            timelapse = IncrementalTimelapse(output, fps=10, resolution=(160, 120), codec="MJPG",
+                                             chunk_dir=os.path.join(tmp, "chunks"), workers=1)
+
+            self._add_photos(photos, start, 3, offset=0)
+            self.assertEqual(timelapse.update(), 3)
+            self._add_photos(photos, start, 2, offset=3)
+            self.assertEqual(timelapse.update(), 2)
+            self.assertEqual(timelapse.update(), 0)
+
+            self.assertEqual([chunk["frames"] for chunk in timelapse.load_manifest()["chunks"]], [3, 2])
+            cap = cv2.VideoCapture(output)
+            self.assertEqual(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 5)
+            cap.release()
+
+    def test_scheduler_takes_timelapse_photos(self):
+        CameraSettings.objects.create(timelapse_enabled=True, photo_interval_min=5)
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp), \
+                mock.patch("cameraapp.photo_camera.PHOTO_DIR", os.path.join(tmp, "photos")):
+            with running_camera():
+                self.assertEqual(timelapse_tick(), 300)
+            photos = os.listdir(os.path.join(tmp, "photos", "timelapse"))
+            self.assertEqual(len(photos), 1)
+
+    def test_scheduler_opens_the_camera_and_captures_right_away(self):
+        class Stop(Exception):
+            pass
+
+        calls = []
+
+        def sleep(seconds):
+            calls.append(seconds)
+            if seconds == 300:
+                raise Stop  # leave the loop at the first interval
+
+        with mock.patch("cameraapp.photo_camera.init_camera", side_effect=lambda **kw: calls.append(kw)), \
+                mock.patch.object(app_globals, "camera", mock.Mock()), \
+                mock.patch("cameraapp.photo_camera.timelapse_tick", side_effect=lambda: calls.append("tick") or 300), \
+                mock.patch("cameraapp.photo_camera.time.sleep", side_effect=sleep):
+            with self.assertRaises(Stop):
+                start_photo_scheduler()
+
+        self.assertEqual(calls, [{"skip_stream": True}, 2.0, "tick", 300])
+
+    def test_compiled_videos_are_indexed_but_not_pruned(self):
+        output = os.path.join(TIMELAPSE_VIDEO_DIR, "timelapse.mp4")
+        self.assertEqual(category_for(output), "timelapse_videos")
+        for path in (output, CHUNK_DIR):
+            self.assertFalse(path.startswith(RECORD_DIR + os.sep))
+        self.assertIsNone(RetentionManager({}).category_for(output))
+
+
+class FrameBroadcastHubTests(SimpleTestCase):
+
+    def test_encodes_each_frame_once(self):
+        hub = FrameBroadcastHub()
+        self.assertIsNone(hub.get_jpeg())
+
+        hub.publish(np.zeros((48, 64, 3), dtype=np.uint8))
+        first = hub.get_jpeg()
+        self.assertEqual(first.seq, 1)
+        self.assertIs(hub.get_jpeg(), first)
+        self.assertTrue(first.data.startswith(b"\xff\xd8"))
+
+        hub.publish(np.full((48, 64, 3), 255, dtype=np.uint8))
+        second = hub.get_jpeg()
+        self.assertEqual(second.seq, 2)
+        self.assertIsNot(second, first)
+
+    def test_wait_for_jpeg_blocks_until_newer_frame(self):
+        hub = FrameBroadcastHub()
+        hub.publish(np.zeros((48, 64, 3), dtype=np.uint8))
+        self.assertEqual(hub.wait_for_jpeg(0, timeout=0.1).seq, 1)
+        self.assertIsNone(hub.wait_for_jpeg(1, timeout=0.05))
+
+        threading.Timer(0.05, hub.publish, args=(np.zeros((48, 64, 3), dtype=np.uint8),)).start()
+        self.assertEqual(hub.wait_for_jpeg(1, timeout=2.0).seq, 2)
+
+    def test_async_viewers_are_woken_from_capture_thread(self):
+        hub = FrameBroadcastHub()
+
+        async def main():
+            waiters = [asyncio.ensure_future(hub.wait_for_jpeg_async(0, timeout=2.0)) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            threading.Thread(target=hub.publish, args=(np.zeros((48, 64, 3), dtype=np.uint8),)).start()
+            return await asyncio.gather(*waiters)
+
+        results = asyncio.run(main())
+        self.assertEqual([encoded.seq for encoded in results], [1, 1, 1])
+        self.assertIs(results[0], results[2])
+
+    def test_profiles_are_encoded_separately_and_evicted(self):
+        hub = FrameBroadcastHub(profile_ttl=0.0)
+        hub.publish(np.zeros((48, 64, 3), dtype=np.uint8))
+        thumb = StreamProfile.from_query({"profile": "thumb", "width": "32"})
+        self.assertEqual(thumb, StreamProfile(32, 60, 5.0))
+
+        small = hub.get_jpeg(thumb)
+        self.assertIs(hub.get_jpeg(StreamProfile(32, 60, 5.0)), small)
+        self.assertIsNot(hub.get_jpeg(), small)
+        self.assertEqual(cv2.imdecode(np.frombuffer(small.data, np.uint8), cv2.IMREAD_COLOR).shape[:2], (24, 32))
+
+        with self.assertRaises(ValueError):
+            StreamProfile.from_query({"quality": "high"})
+
+        # With a zero TTL the next encode drops every other profile
+        hub.publish(np.zeros((48, 64, 3), dtype=np.uint8))
+        hub._last_eviction = 0.0
+        hub.get_jpeg()
+        self.assertEqual(hub.active_profiles(), 1)
+
+
+class FrameSourceTests(SimpleTestCase):
+
+    def test_synthetic_source_reports_format_and_paces_frames(self):
+        source = open_source("synthetic://160x120@50")
+        self.assertIsInstance(source, SyntheticSource)
+        self.assertEqual(source.describe(), {"type": "synthetic", "width": 160, "height": 120,
+                                             "fps": 50.0, "realtime": True})
+        started = time.monotonic()
+        frames = [source.read()[1].copy() for _ in range(11)]
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        self.assertEqual(frames[0].shape, (120, 160, 3))
+        self.assertFalse((frames[0] == frames[1]).all())
+
+        # Controls are accepted and read back like on a camera
+        self.assertTrue(source.set(cv2.CAP_PROP_BRIGHTNESS, 100))
+        self.assertEqual(source.get(cv2.CAP_PROP_BRIGHTNESS), 100.0)
+
+    def test_file_replay_loops_as_fast_as_possible(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "clip.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 5, (64, 48))
+            for i in range(5):
+                writer.write(np.full((48, 64, 3), i * 40, np.uint8))
+            writer.release()
+
+            source = open_source(f"file://{path}?realtime=0")
+            self.assertIsInstance(source, FileReplaySource)
+            self.assertEqual(source.native_resolution, (64, 48))
+            self.assertEqual(source.native_fps, 5.0)
+            started = time.monotonic()
+            self.assertTrue(all(source.read()[0] for _ in range(12)))
+            self.assertLess(time.monotonic() - started, 1.0)
+            source.release()
+
+    def test_camera_manager_runs_on_synthetic_source(self):
+        camera = CameraManager(source="synthetic://160x120@30", retry_delay=0.1, max_retries=1)
+        try:
+            self.assertEqual(camera.source_info()["type"], "synthetic")
+            seq, frame_ref = camera.wait_for_frame(0, timeout=2.0)
+            self.assertIsNotNone(frame_ref)
+            self.assertEqual(frame_ref.array.shape, (120, 160, 3))
+            frame_ref.release()
+        finally:
+            camera.stop()
+
+
+@override_settings(METRICS_TOKEN="secret")
+class MetricsTests(TestCase):
+
+    def test_metrics_cover_capture_encode_and_delivery(self):
+        camera = CameraManager(source="synthetic://160x120@30", retry_delay=0.1, max_retries=1)
+        try:
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+            stream = app_globals.frame_hub.mjpeg_stream()
+            sent = sum(len(next(stream)) for _ in range(3))
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+            stream.close()
+        finally:
+            camera.stop()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertRegex(text, r"\nipcam_capture_frames_total [1-9]")
+        self.assertRegex(text, r'\nipcam_viewer_bytes_total\{viewer="\d+",kind="sync",profile="full/qdefault"\} %d\n' % sent)
+        self.assertIn('ipcam_encode_seconds_count{profile="full/qdefault"}', text)
+        self.assertIn('ipcam_lock_wait_seconds_bucket{lock="camera_manager",le="+Inf"}', text)
+        self.assertIn('ipcam_lock_wait_seconds_bucket{lock="camera_lock",le="+Inf"}', text)
+
+    def test_non_blocking_acquires_are_not_recorded_as_waits(self):
+        lock = TimedLock("test_try_acquire")
+        self.assertTrue(lock.acquire(False))
+        lock.release()
+        # Condition checks ownership with a non-blocking acquire
+        with self.assertRaises(RuntimeError):
+            threading.Condition(lock).notify()
+        self.assertEqual(lock.wait.count, 0)
+
+        with lock:
+            pass
+        self.assertEqual(lock.wait.count, 1)
+
+
+class IdleSuspensionTests(SimpleTestCase):
+
+    def test_device_is_released_when_idle_and_resumes_for_a_viewer(self):
+        camera = CameraManager(source="synthetic://160x120@30", retry_delay=0.1, max_retries=1,
+                               idle_mode="release", idle_grace=0.2)
+        # An observer like the livestream job doesn't keep the camera awake
+        watcher = FrameSubscription("watcher", keeps_awake=False)
+        watcher.skip_to_latest()
+        try:
+            deadline = time.monotonic() + 3.0
+            while not camera.idle and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(camera.idle)
+            self.assertIsNone(camera.cap)
+            self.assertTrue(camera.is_available())
+            seq = camera.frame_seq
+            time.sleep(0.3)
+            self.assertEqual(camera.frame_seq, seq)
+
+            app_globals.viewer_connected()
+            try:
+                started = time.monotonic()
+                self.assertTrue(camera.resume(timeout=2.0))
+                self.assertLess(time.monotonic() - started, 1.0)
+                _, frame_ref = camera.wait_for_frame(seq, timeout=1.0)
+                self.assertIsNotNone(frame_ref)
+                frame_ref.release()
+                # Longer than the grace period: the viewer keeps it running
+                time.sleep(0.4)
+                self.assertFalse(camera.idle)
+            finally:
+                app_globals.viewer_disconnected()
+            self.assertEqual(app_globals.active_stream_viewers, 0)
+            self.assertIsNotNone(app_globals.last_disconnect_time)
+        finally:
+            watcher.close()
+            camera.stop()
+
+
+class FrameRingTests(SimpleTestCase):
+
+    def _write(self, ring, seq, value):
+        slot = ring.begin_write()
+        buffer = slot.buffer if slot.buffer is not None else np.empty((4, 4, 3), dtype=np.uint8)
+        buffer[:] = value
+        ring.commit(slot, buffer, seq, 0.0)
+
+    def test_buffers_are_reused_once_released(self):
+        ring = FrameRing(size=2)
+        for seq in range(1, 10):
+            self._write(ring, seq, seq)
+        self.assertEqual(len(ring._slots), 2)
+
+        ref = ring.latest()
+        self.assertEqual(ref.seq, 9)
+        self.assertFalse(ref.array.flags.writeable)
+        ref.release()
+
+    def test_held_frame_is_not_overwritten(self):
+        ring = FrameRing(size=2)
+        self._write(ring, 1, 1)
+        with ring.latest() as held:
+            for seq in range(2, 6):
+                self._write(ring, seq, seq)
+            self.assertTrue((held == 1).all())
+            self.assertEqual(len(ring._slots), 3)
+        self.assertEqual(ring.buffers_in_use(), 1)
+
+    def test_compressed_frames_pass_through_and_decode_lazily(self):
+        ring = FrameRing(size=2)
+        pixels = np.full((48, 64, 3), 200, dtype=np.uint8)
+        jpeg = cv2.imencode(".jpg", pixels)[1].reshape(1, -1)
+        slot = ring.begin_write()
+        ring.commit(slot, jpeg, 1, 0.0, compressed=True)
+
+        hub = FrameBroadcastHub()
+        hub.publish(ring.latest())
+        self.assertEqual(hub.get_jpeg().data, jpeg.tobytes())
+        self.assertIsNone(slot.pixels)
+
+        with ring.latest() as frame:
+            self.assertEqual(frame.shape, (48, 64, 3))
+        self.assertEqual(hub.get_jpeg(StreamProfile(max_width=32)).seq, 1)
+
+
+class RecordingJobTests(SimpleTestCase):
+
+    def test_output_frame_rate_follows_the_clock(self):
+        # Source delivers ~10 fps, recording is declared at 20 fps
+        def slow_provider():
+            time.sleep(0.1)
+            return np.zeros((48, 64, 3), dtype=np.uint8)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "clip.avi")
+            job = RecordingJob(path, duration=1.0, fps=20, resolution=(64, 48), codec="MJPG",
+                               frame_provider=slow_provider)
+            job.start()
+            job.join(timeout=5.0)
+
+            self.assertFalse(job.active)
+            self.assertEqual(job.frame_count, 20)
+            self.assertGreaterEqual(job.duplicated_frames, 8)
+            self.assertEqual(int(cv2.VideoCapture(path).get(cv2.CAP_PROP_FRAME_COUNT)), 20)
+
+    def test_pre_roll_is_written_before_live_frames(self):
+        jpeg = cv2.imencode(".jpg", np.full((48, 64, 3), 255, dtype=np.uint8))[1].tobytes()
+        pre_roll = [(100.0 + i * 0.25, jpeg) for i in range(5)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "clip.avi")
+            job = RecordingJob(path, duration=0.5, fps=4, resolution=(64, 48), codec="MJPG",
+                               frame_provider=lambda: np.zeros((48, 64, 3), dtype=np.uint8),
+                               pre_roll=pre_roll)
+            job.start()
+            job.join(timeout=5.0)
+
+            self.assertEqual(job.pre_roll_frames, 5)
+            self.assertEqual(job.frame_count, 7)
+            cap = cv2.VideoCapture(path)
+            self.assertGreater(cap.read()[1].mean(), 200)
+
+    def test_pre_roll_buffer_is_bounded(self):
+        buffer = PreRollBuffer(seconds=2, fps=10, max_bytes=1000)
+        for i in range(50):
+            buffer._append(i * 0.1, b"x" * 100)
+        self.assertLessEqual(buffer.memory_usage(), 1000)
+        self.assertEqual(len(buffer.snapshot()), 10)
+
+        buffer = PreRollBuffer(seconds=2, fps=10, max_bytes=10 ** 6)
+        for i in range(50):
+            buffer._append(i * 0.1, b"x" * 100)
+        self.assertAlmostEqual(buffer.snapshot()[0][0], 2.9)
+
+
+class MotionDetectorTests(SimpleTestCase):
+
+    def _frame(self, square_at=None):
+        frame = np.full((480, 640, 3), 60, dtype=np.uint8)
+        if square_at is not None:
+            x, y = square_at
+            frame[y:y + 120, x:x + 120] = 255
+        return frame
+
+    def test_detects_motion_only_inside_roi(self):
+        detector = MotionDetector(sensitivity=50)
+        self.assertFalse(detector.analyse(pixels=self._frame()))
+        self.assertFalse(detector.analyse(pixels=self._frame()))
+        self.assertTrue(detector.analyse(pixels=self._frame(square_at=(40, 40))))
+
+        # Right half only: the square on the left is ignored
+        detector = MotionDetector(sensitivity=50, roi=parse_roi("0.5,0,0.5,1"))
+        detector.analyse(pixels=self._frame())
+        self.assertFalse(detector.analyse(pixels=self._frame(square_at=(40, 40))))
+        self.assertTrue(detector.analyse(pixels=self._frame(square_at=(460, 300))))
+
+    def test_unchanged_settings_keep_the_running_monitor(self):
+        settings_obj = CameraSettings(motion_enabled=True, motion_roi="0.5,0,0.5,1")
+        try:
+            monitor = configure_motion(settings_obj)
+            self.assertIs(configure_motion(settings_obj), monitor)
+
+            settings_obj.motion_sensitivity = 80
+            restarted = configure_motion(settings_obj)
+            self.assertIsNot(restarted, monitor)
+            self.assertFalse(monitor._running)
+
+            self.assertIsNone(configure_motion(CameraSettings(motion_enabled=False)))
+            self.assertFalse(restarted._running)
+        finally:
+            configure_motion(None)
+
+
+class SegmentedRecordingTests(TransactionTestCase):
+
+    def test_segments_are_back_to_back_and_indexed(self):
+        def provider():
+            time.sleep(0.02)
+            return np.zeros((48, 64, 3), dtype=np.uint8)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            job = SegmentedRecordingJob(tmp, segment_seconds=0.5, fps=10, resolution=(64, 48),
+                                        codec="MJPG", frame_provider=provider)
+            job.start()
+            time.sleep(1.75)
+            job.stop()
+            job.join(timeout=5.0)
+
+            segments = list(RecordingSegment.objects.all())
+            self.assertGreaterEqual(len(segments), 3)
+            self.assertEqual(sum(segment.frames for segment in segments), job.frame_count)
+            for previous, following in zip(segments, segments[1:]):
+                self.assertEqual(previous.frames, 5)
+                self.assertEqual(previous.ended_at, following.started_at)
+            self.assertEqual(sorted(os.listdir(tmp)), sorted(os.path.basename(s.path) for s in segments))
+
+            found, offset = RecordingSegment.covering(segments[1].started_at + (segments[1].ended_at - segments[1].started_at) / 2)
+            self.assertEqual(found, segments[1])
+            self.assertAlmostEqual(offset, 0.25, places=2)
+
+
+class RetentionManagerTests(TestCase):
+
+    def _write(self, directory, name, size, age):
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_deletes_oldest_first_within_budgets(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp):
+            paths = [self._write(tmp, f"photo_{i}.jpg", 1000, age=100 - i) for i in range(10)]
+            MediaItem.objects.bulk_create([
+                MediaItem(category="photos", path=os.path.basename(p), created_at=timezone.now()) for p in paths
+            ])
+            manager = RetentionManager({"photos": (5000, 0)}, categories={"photos": ([tmp], (".jpg",))})
+            manager.scan()
+            self.assertEqual(manager.usage()["photos"]["bytes"], 10000)
+
+            with self.assertNoLogs("cameraapp.retention", "WARNING"):
+                self.assertEqual(manager.prune(), 5)
+            self.assertEqual(sorted(os.listdir(tmp)), sorted(os.path.basename(p) for p in paths[5:]))
+            # Their index entries went with them
+            self.assertEqual(sorted(MediaItem.objects.values_list("path", flat=True)),
+                             sorted(os.path.basename(p) for p in paths[5:]))
+
+            # New files are picked up without rescanning; the age budget applies too
+            manager.note_file(self._write(tmp, "photo_new.jpg", 1000, age=0))
+            manager.set_budgets({"photos": (0, 92.5)})
+            manager.prune()
+            self.assertEqual(manager.usage()["photos"]["files"], 3)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "photo_new.jpg")))
+
+    def test_thumbnails_of_deleted_items_are_removed(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp), \
+                mock.patch("cameraapp.thumbnails.THUMB_DIR", os.path.join(tmp, "thumbs")):
+            keys = ["aa0", "shared", "bb2", "shared"]
+            photos = os.path.join(tmp, "photos")
+            os.makedirs(photos)
+            paths = [self._write(photos, f"photo_{i}.jpg", 1000, age=100 - i) for i in range(4)]
+            MediaItem.objects.bulk_create([
+                MediaItem(category="photos", path=f"photos/photo_{i}.jpg", created_at=timezone.now(), thumb_key=key)
+                for i, key in enumerate(keys)
+            ])
+            for key in set(keys):
+                os.makedirs(os.path.dirname(thumbnail_path(key)), exist_ok=True)
+                open(thumbnail_path(key), "wb").close()
+
+            manager = RetentionManager({"photos": (2000, 0)}, categories={"photos": ([photos], (".jpg",))})
+            manager.scan()
+            self.assertEqual(manager.prune(), 2)
+            self.assertEqual(sorted(os.listdir(photos)), ["photo_2.jpg", "photo_3.jpg"])
+            # photo_1's thumbnail is kept: photo_3 has the same content
+            self.assertFalse(os.path.exists(thumbnail_path("aa0")))
+            self.assertTrue(os.path.exists(thumbnail_path("shared")))
+            self.assertTrue(os.path.exists(thumbnail_path("bb2")))
+
+
+class BenchmarkPipelineTests(SimpleTestCase):
+
+    def test_writes_json_and_flags_regressions_against_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.json")
+            options = {"only": "imencode,resize", "resolutions": "160x120", "min_time": 0.01, "stdout": mock.Mock()}
+            call_command("benchmark_pipeline", json_path=path, **options)
+            with open(path) as f:
+                results = json.load(f)["results"]
+            self.assertIn("imencode/160x120/q85", results)
+            self.assertIn("resize/160x120->640x480", results)
+
+            # A baseline ten times faster than this machine: every case regressed
+            for result in results.values():
+                result["median_ms"] /= 10.0
+            with open(path, "w") as f:
+                json.dump({"results": results}, f)
+            with self.assertRaisesMessage(CommandError, "regression"):
+                call_command("benchmark_pipeline", compare=path, noise_ms=0.0, **options)
@@ -0,0 +1,124 @@
+# cameraapp/thumbnails.py
+
+import os
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cv2
+from django.conf import settings
+from django.db import close_old_connections
+
+from .jpeg_utils import decode_reduced
+from .models import MediaItem
+
+logger = logging.getLogger(__name__)
+
+THUMB_DIR = os.path.join(settings.MEDIA_ROOT, "thumbs")
+THUMB_WIDTH = 160
+THUMB_QUALITY = 75
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def thumbnail_path(key: str) -> str:
+    return os.path.join(THUMB_DIR, key[:2], f"{key}.jpg")
+
+
+def _video_frame(path: str):
+    cap = cv2.VideoCapture(path)
+    try:
+        # A frame one second in is more representative than the very first
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        if fps > 0 and cap.get(cv2.CAP_PROP_FRAME_COUNT) > fps:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(fps))
+        ret, frame = cap.read()
+        return frame if ret else None
+    finally:
+        cap.release()
+
+
+def _content_key(item: MediaItem, path: str, data: Optional[bytes]) -> str:
+    digest = hashlib.sha1()
+    if data is not None:
+        digest.update(data)
+    else:
+        # Videos can be gigabytes: hash the size and the first megabyte
+        digest.update(str(os.path.getsize(path)).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read(1024 * 1024))
+    digest.update(f"{THUMB_WIDTH}:{THUMB_QUALITY}".encode())
+    return digest.hexdigest()
+
+
+def generate_thumbnail(item: MediaItem, force: bool = False) -> Optional[str]:
+    """
+    Creates the thumbnail for a MediaItem (if not cached yet), stores its
+    content key on the item and returns the key.
+    """
+    if item.media_type == "raw":
+        return None
+    path = os.path.join(settings.MEDIA_ROOT, item.path)
+    try:
+        data = None
+        if item.media_type == "image":
+            with open(path, "rb") as f:
+                data = f.read()
+        key = _content_key(item, path, data)
+        target = thumbnail_path(key)
+
+        if force or not os.path.exists(target):
+            frame = decode_reduced(data, THUMB_WIDTH) if data is not None else _video_frame(path)
+            if frame is None:
+                logger.warning(f"[Thumbnails] Could not read {item.path}")
+                return None
+            height = max(1, round(frame.shape[0] * THUMB_WIDTH / frame.shape[1]))
+            if frame.shape[1] != THUMB_WIDTH:
+                frame = cv2.resize(frame, (THUMB_WIDTH, height), interpolation=cv2.INTER_AREA)
+            ret, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+            if not ret:
+                return None
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(encoded.tobytes())
+            os.replace(tmp_path, target)
+    except OSError as e:
+        logger.warning(f"[Thumbnails] Failed for {item.path}: {e}")
+        return None
+
+    if item.thumb_key != key:
+        from .media_index import index_write_lock
+        item.thumb_key = key
+        with index_write_lock:
+            MediaItem.objects.filter(pk=item.pk).update(thumb_key=key)
+    return key
+
+
+def _generate_in_worker(item_id: int):
+    try:
+        close_old_connections()
+        item = MediaItem.objects.filter(pk=item_id).first()
+        if item is not None:
+            generate_thumbnail(item)
+    except Exception as e:
+        logger.error(f"[Thumbnails] Worker error for item {item_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def get_executor(max_workers: int = 2) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        return _executor
+
+
+def schedule_thumbnail(item: MediaItem):
+    """Queues thumbnail generation for a new media file on the worker pool."""
+    if item is not None and item.media_type != "raw":
+        get_executor().submit(_generate_in_worker, item.pk)
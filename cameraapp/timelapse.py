@@ -0,0 +1,222 @@
+# cameraapp/timelapse.py
+
+import os
+import json
+import time
+import shutil
+import logging
+import datetime
+import subprocess
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import cv2
+from django.conf import settings
+
+from .jpeg_utils import decode_reduced
+
+logger = logging.getLogger(__name__)
+
+# Models are imported inside the functions: worker processes are spawned and
+# import this module without a configured app registry.
+
+# Outside media/recordings, so retention and "delete all videos" leave them alone
+TIMELAPSE_VIDEO_DIR = os.path.join(settings.MEDIA_ROOT, "timelapse_videos")
+CHUNK_DIR = os.path.join(TIMELAPSE_VIDEO_DIR, "chunks")
+
+
+def load_frame(path: str, resolution: tuple[int, int]):
+    """Worker: decodes one timelapse photo at `resolution`. Returns None for unreadable files."""
+    try:
+        with open(path, "rb") as f:
+            frame = decode_reduced(f.read(), resolution[0])
+    except OSError:
+        return None
+    if frame is None:
+        return None
+    if (frame.shape[1], frame.shape[0]) != tuple(resolution):
+        frame = cv2.resize(frame, tuple(resolution), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def timelapse_frames(start=None, end=None, after=None) -> list:
+    """Absolute paths and timestamps of indexed timelapse photos in [start, end), oldest first."""
+    from .models import MediaItem
+    items = MediaItem.objects.filter(category="timelapse", media_type="image")
+    if start is not None:
+        items = items.filter(created_at__gte=start)
+    if end is not None:
+        items = items.filter(created_at__lt=end)
+    if after is not None:
+        items = items.filter(created_at__gt=after)
+    return [
+        (os.path.join(settings.MEDIA_ROOT, path), created_at)
+        for path, created_at in items.order_by("created_at", "id").values_list("path", "created_at")
+    ]
+
+
+def compile_timelapse(paths: list, output_path: str, fps: float, resolution: Optional[tuple[int, int]] = None,
+                      codec: str = "mp4v", workers: Optional[int] = None) -> int:
+    """
+    Encodes the photos in `paths` into one video and returns the number of
+    frames written.
+
+    Decoding and resizing run in a process pool; results are consumed in
+    order by the single writer, with at most a few frames per worker in
+    flight so memory stays bounded for any length. The file is written under
+    a temporary name and renamed when complete.
+    """
+    if not paths:
+        return 0
+    if resolution is None:
+        first = cv2.imread(paths[0])
+        if first is None:
+            raise ValueError(f"Cannot read {paths[0]}")
+        resolution = (first.shape[1], first.shape[0])
+    resolution = tuple(resolution)
+
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.partial{ext}"
+    out = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*codec), fps, resolution)
+    if not out.isOpened():
+        raise IOError(f"Cannot open video writer for {output_path}")
+
+    written = 0
+    started = time.monotonic()
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            remaining = iter(paths)
+            for path in remaining:
+                pending.append(pool.submit(load_frame, path, resolution))
+                if len(pending) >= workers * 4:
+                    break
+            while pending:
+                frame = pending.popleft().result()
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending.append(pool.submit(load_frame, next_path, resolution))
+                if frame is None:
+                    continue
+                out.write(frame)
+                written += 1
+    except BaseException:
+        out.release()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    out.release()
+    os.replace(tmp_path, output_path)
+
+    elapsed = time.monotonic() - started
+    logger.info(f"[Timelapse] {output_path}: {written} frames in {elapsed:.1f}s "
+                f"({written / elapsed if elapsed else 0:.1f} frames/s, {workers} workers)")
+    return written
+
+
+def concat_videos(chunks: list, output_path: str, fps: float, resolution: tuple[int, int], codec: str = "mp4v"):
+    """
+    Joins chunk files into one video. With ffmpeg installed the streams are
+    copied without re-encoding; otherwise OpenCV re-encodes the chunks.
+    """
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.partial{ext}"
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        list_path = f"{root}.concat.txt"
+        with open(list_path, "w") as f:
+            for chunk in chunks:
+                f.write(f"file '{os.path.abspath(chunk)}'\n")
+        try:
+            subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                            "-i", list_path, "-c", "copy", tmp_path], check=True)
+        finally:
+            os.remove(list_path)
+    else:
+        out = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*codec), fps, tuple(resolution))
+        for chunk in chunks:
+            cap = cv2.VideoCapture(chunk)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+        out.release()
+    os.replace(tmp_path, output_path)
+
+
+class IncrementalTimelapse:
+    """
+    A timelapse video that grows day by day.
+
+    Each update() encodes only the photos taken since the previous update
+    into a new chunk and records it in a JSON manifest; the chunks are then
+    joined into `output_path`. Changing fps, resolution or codec starts a
+    new history, since chunks with different parameters can't be joined.
+    """
+
+    def __init__(self, output_path: str, fps: float, resolution: tuple[int, int], codec: str = "mp4v",
+                 chunk_dir: str = CHUNK_DIR, workers: Optional[int] = None):
+        self.output_path = output_path
+        self.fps = fps
+        self.resolution = tuple(resolution)
+        self.codec = codec
+        self.chunk_dir = chunk_dir
+        self.workers = workers
+        self.manifest_path = os.path.join(chunk_dir, "manifest.json")
+
+    def _parameters(self):
+        return {"fps": self.fps, "resolution": list(self.resolution), "codec": self.codec}
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if not manifest or manifest.get("parameters") != self._parameters():
+            return {"parameters": self._parameters(), "chunks": [], "last_frame_at": None}
+        # Chunks removed by hand are dropped from the history
+        manifest["chunks"] = [c for c in manifest["chunks"] if os.path.exists(os.path.join(self.chunk_dir, c["file"]))]
+        return manifest
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def update(self, until: Optional[datetime.datetime] = None) -> int:
+        """Appends the photos taken since the last update (up to `until`) and returns their number."""
+        from .media_index import record_media_file
+
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        manifest = self.load_manifest()
+        after = manifest["last_frame_at"]
+        frames = timelapse_frames(end=until, after=datetime.datetime.fromisoformat(after) if after else None)
+        if not frames:
+            logger.info("[Timelapse] No new frames")
+            return 0
+
+        name = f"chunk_{frames[0][1]:%Y%m%d-%H%M%S}_{frames[-1][1]:%Y%m%d-%H%M%S}.mp4"
+        written = compile_timelapse([path for path, _ in frames], os.path.join(self.chunk_dir, name),
+                                    self.fps, self.resolution, self.codec, self.workers)
+        manifest["chunks"].append({
+            "file": name,
+            "frames": written,
+            "first_frame_at": frames[0][1].isoformat(),
+            "last_frame_at": frames[-1][1].isoformat(),
+        })
+        manifest["last_frame_at"] = frames[-1][1].isoformat()
+        self._save_manifest(manifest)
+
+        concat_videos([os.path.join(self.chunk_dir, c["file"]) for c in manifest["chunks"]],
+                      self.output_path, self.fps, self.resolution, self.codec)
+        record_media_file(self.output_path)
+        return written
@@ -1,7 +1,7 @@
 # cameraapp/urls.py
 
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path("", views.stream_page, name="stream_page"),
@@ -12,7 +12,9 @@ urlpatterns = [
     path("photo/auto-adjust/", views.auto_photo_adjust, name="auto_photo_adjust"),
     path("reset_camera/", views.reset_camera_settings, name="reset_camera"),
     path("photo/manual/", views.take_photo_now, name="take_photo_now"), 
+    path("photo/burst/", views.take_burst_now, name="take_burst_now"),
     path("video_feed/", views.video_feed, name="video_feed"),
+    path("video_feed/async/", async_views.video_feed_async, name="video_feed_async"),
     path("start_recording/", views.start_recording, name="start_recording"),
     path("stop_recording/", views.stop_recording, name="stop_recording"),
     path("is-recording/", views.is_recording, name="is_recording"),
@@ -25,8 +27,14 @@ urlpatterns = [
     path("media-browser/", views.media_browser, name="media_browser"),
     path("manual_restart_camera/", views.manual_restart_camera, name="manual_restart_camera"),
     path("camera_status/", views.camera_status, name="camera_status"),
+    path("metrics", views.metrics_view, name="metrics"),
     path("frame/", views.single_frame, name="single_frame"),
+    path("frame/async/", async_views.single_frame_async, name="single_frame_async"),
     path("media/delete/", views.delete_media_file, name="delete_media_file"),
     path("media/delete_all_images/", views.delete_all_images, name="delete_all_images"),
     path("media/delete_all_videos/", views.delete_all_videos, name="delete_all_videos"),
+    path("media/usage/", views.media_usage, name="media_usage"),
+    path("media/frames/", views.media_frames, name="media_frames"),
+    path("media/thumb/<str:key>.jpg", views.thumbnail, name="thumbnail"),
+    path("media/item/<int:item_id>/thumb/", views.media_thumbnail, name="media_thumbnail"),
 ]
@@ -2,7 +2,6 @@
 
 import os
 from cameraapp.recording_job import RecordingJob
-import cv2
 import time
 import threading
 import datetime
@@ -11,7 +10,7 @@ import glob
 
 from django.http import (
     HttpResponse, StreamingHttpResponse, HttpResponseServerError, JsonResponse,
-    HttpResponseRedirect
+    HttpResponseRedirect, HttpResponseBadRequest, HttpResponseNotModified, FileResponse, Http404
 )
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
@@ -25,28 +24,39 @@ from django.apps import apps
 from django.db import connection
 from django.contrib.auth import logout
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
 
 
-from .models import CameraSettings
+from .models import CameraSettings, MediaItem, RecordingSegment
 from .camera_core import (
     init_camera, reset_to_default,
     apply_auto_settings, auto_adjust_from_frame,
     apply_cv_settings, get_camera_settings, get_camera_settings_safe,
     release_and_reset_camera
 )
-from .camera_utils import safe_restart_camera_stream, update_latest_frame
+from .camera_utils import safe_restart_camera_stream, apply_settings_live
+from .camera_manager import FrameSubscription
+from .frame_sources import configured_source
+from .frame_hub import StreamProfile
+from .pre_roll import configure_pre_roll
+from .motion import configure_motion
+from .dvr import configure_dvr
+from .retention import configure_retention
+from .media_index import remove_media_files, frames_page
+from .metrics import render as render_metrics
+from .thumbnails import generate_thumbnail, thumbnail_path
 from .globals import app_globals
 
-from .photo_camera import take_photo 
+from .photo_camera import take_photo, take_burst
 
 
 from dotenv import load_dotenv
 load_dotenv()
 
 
-CAMERA_URL_RAW = os.getenv("CAMERA_URL", "0")
-CAMERA_URL = int(CAMERA_URL_RAW) if CAMERA_URL_RAW.isdigit() else CAMERA_URL_RAW
-
 # Output directories
 RECORD_DIR = os.path.join(settings.MEDIA_ROOT, "recordings")
 PHOTO_DIR = os.path.join(settings.MEDIA_ROOT, "photos")
@@ -60,12 +70,6 @@ def logout_view(request):
     return redirect("login")
 
 
-def get_camera_settings():
-    return CameraSettings.objects.first()
-
-
-
-
 @login_required
 @csrf_exempt
 def reboot_pi(request):
@@ -81,54 +85,79 @@ def reboot_pi(request):
 @require_GET
 @login_required
 def camera_status(request):
-    return JsonResponse({"camera_url": str(CAMERA_URL)})
+    camera = app_globals.camera
+    return JsonResponse({
+        "camera_url": str(configured_source()),
+        "source": camera.source_info() if camera else None,
+    })
 
 
-def generate_frames():
-    global app_globals
-    while True:
-        frame = app_globals.camera.get_latest_frame()
-        if frame is None:
-            time.sleep(0.05)
-            continue
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. With settings.METRICS_TOKEN set it expects
+    "Authorization: Bearer <token>", otherwise a logged-in user.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    elif not request.user.is_authenticated:
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
-        ret, buffer = cv2.imencode(".jpg", frame)
-        if not ret:
-            continue
 
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n"
-        )
-        time.sleep(0.05)
+def generate_frames():
+    global app_globals
+    return app_globals.frame_hub.mjpeg_stream()
 
 
 
 @csrf_exempt
+@login_required
 def video_feed(request):
     global app_globals
 
-    def frame_generator():
-        while True:
-            frame = app_globals.camera.get_latest_frame()
-            if frame is not None:
-                ret, jpeg = cv2.imencode('.jpg', frame)
-                if ret:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
-            time.sleep(0.04)  # 25 FPS max
+    # ?profile=thumb|mobile|full or explicit ?width=&quality=&fps=
+    try:
+        profile = StreamProfile.from_query(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid stream profile")
 
     return StreamingHttpResponse(
-        frame_generator(),
+        counted_stream(app_globals.frame_hub.mjpeg_stream(profile)),
         content_type='multipart/x-mixed-replace; boundary=frame'
     )
 
 
+def counted_stream(stream):
+    """Counts the viewer in app_globals for as long as the response is being sent."""
+    app_globals.viewer_connected()
+    try:
+        yield from stream
+    finally:
+        stream.close()
+        app_globals.viewer_disconnected()
+
+
+def current_jpeg(profile):
+    """
+    The latest frame's JPEG. If capture is suspended for lack of viewers it
+    is resumed first and the next fresh frame is returned.
+    """
+    camera = app_globals.camera
+    if camera is not None and camera.idle:
+        seq = app_globals.frame_hub.seq
+        if camera.resume():
+            return app_globals.frame_hub.wait_for_jpeg(seq, timeout=1.0, profile=profile)
+    return app_globals.frame_hub.get_jpeg(profile)
+
+
 @login_required
 def stream_page(request):
     global app_globals
 
-    settings_obj = get_camera_settings_safe(connection)
+    settings_obj = get_camera_settings()
     camera_error = None
 
     # ========== [1] ALTE STREAMS STOPPEN ==========
@@ -159,8 +188,7 @@ def stream_page(request):
     try:
         with app_globals.livestream_resume_lock:
             app_globals.livestream_job = safe_restart_camera_stream(
-                frame_callback=update_latest_frame,
-                camera_source=CAMERA_URL
+                camera_source=configured_source()
             )
             if not app_globals.livestream_job:
                 raise RuntimeError("Livestream konnte nicht gestartet werden.")
@@ -180,14 +208,16 @@ def stream_page(request):
     first_frame_received = False
 
     while time.time() - start_time < 5:
-        if app_globals.livestream_job and app_globals.livestream_job.running:
-            frame = app_globals.livestream_job.get_frame()
-            if frame is not None:
-                update_latest_frame(frame)
-                print("[STREAM_PAGE] First frame received from stream.")
-                first_frame_received = True
-                break
-        time.sleep(0.2)
+        camera = app_globals.camera
+        if camera is None:
+            time.sleep(0.2)
+            continue
+        _, frame_ref = camera.wait_for_frame(0, timeout=0.5)
+        if frame_ref is not None:
+            frame_ref.release()
+            print("[STREAM_PAGE] First frame received from stream.")
+            first_frame_received = True
+            break
 
     if not first_frame_received:
         print("[STREAM_PAGE] Timeout: Kein Frame empfangen.")
@@ -252,40 +282,19 @@ def reset_camera_view(request):
 
 def record_video_to_file(filepath, duration, fps, resolution, codec="mp4v"):
     print(f"[RECORD_TO_FILE] Start recording to {filepath} (duration={duration}s, fps={fps}, resolution={resolution})")
-    global app_globals
-    try:
-        fourcc = cv2.VideoWriter_fourcc(*codec)
-        out = cv2.VideoWriter(filepath, fourcc, fps, resolution)
-        if not out.isOpened():
-            print(f"[RECORD_TO_FILE] Error: Cannot open file {filepath}")
-            return False
-
-        frame_count = 0
-        start_time = time.time()
-
-        while time.time() - start_time < duration:
-            with app_globals.latest_frame_lock:
-                frame = app_globals.latest_frame.copy() if app_globals.latest_frame is not None else None
-
-            if frame is None:
-                time.sleep(0.05)
-                continue
-
-            resized_frame = cv2.resize(frame, resolution)
-            out.write(resized_frame)
-            frame_count += 1
-
-            time.sleep(1.0 / fps)  # respect target fps
-
-    except Exception as e:
-        print(f"[RECORD_TO_FILE] Exception during recording: {e}")
-        return False
-
-    finally:
-        out.release()
-        print(f"[RECORD_TO_FILE] Recording finished: {frame_count} frames saved → {filepath}")
-
-    return frame_count > 0
+    # Same paced recorder as start_recording, run to completion on this thread
+    job = RecordingJob(
+        filepath=filepath,
+        duration=duration,
+        fps=fps,
+        resolution=resolution,
+        codec=codec,
+        pre_roll=app_globals.pre_roll
+    )
+    job.start()
+    job.join()
+    print(f"[RECORD_TO_FILE] Recording finished: {job.stats()} → {filepath}")
+    return job.frame_count > 0
 
 
 
@@ -308,16 +317,13 @@ def start_recording(request):
     codec = settings_obj.video_codec if settings_obj else "mp4v"
     filepath = os.path.join(RECORD_DIR, f"clip_{time.strftime('%Y%m%d-%H%M%S')}.mp4")
 
-    def frame_provider():
-        return app_globals.camera.get_latest_frame() if app_globals.camera else None
-
     app_globals.recording_job = RecordingJob(
         filepath=filepath,
         duration=duration,
         fps=fps,
         resolution=resolution,
         codec=codec,
-        frame_provider=frame_provider
+        pre_roll=app_globals.pre_roll
     )
     app_globals.recording_job.start()
     return JsonResponse({"status": "started", "file": filepath})
@@ -338,30 +344,47 @@ def stop_recording(request):
 @login_required
 def is_recording(request):
     global app_globals
-    state = app_globals.recording_job.active if app_globals.recording_job else False
-    return JsonResponse({"recording": state})
+    job = app_globals.recording_job
+    state = job.active if job else False
+    response = {"recording": state}
+    if job:
+        response["stats"] = job.stats()
+    return JsonResponse(response)
 
 
-@login_required
-def photo_view(request):
-    photo_dir = os.path.join(settings.MEDIA_ROOT, "photos")
-    manual_photos = []
+def _media_page(request, category, media_type=None, per_page=200, page_param="page"):
+    """
+    One page of indexed media of a category, oldest first. Without an explicit
+    page the last (newest) page is returned. ?date=YYYY-MM-DD limits to one day.
+    """
+    items = MediaItem.objects.filter(category=category)
+    if media_type:
+        items = items.filter(media_type=media_type)
+    day = parse_date(request.GET.get("date") or "")
+    if day:
+        items = items.filter(created_at__date=day)
 
-    if os.path.exists(photo_dir):
-        for fname in sorted(os.listdir(photo_dir)):
-            full_path = os.path.join(photo_dir, fname)
+    paginator = Paginator(items.order_by("created_at", "id"), per_page)
+    return paginator.get_page(request.GET.get(page_param) or paginator.num_pages)
 
-            # skip 'timelapse/' folder and nested files
-            if os.path.isdir(full_path) and fname == "timelapse":
-                continue
 
-            if os.path.isfile(full_path) and fname.lower().endswith((".jpg", ".jpeg", ".png")):
-                manual_photos.append(f"/media/photos/{fname}")
+def _pager_query(request, page_param="page"):
+    """The current query string without page_param, for the pager links to keep."""
+    params = request.GET.copy()
+    params.pop(page_param, None)
+    return params.urlencode()
 
-    settings_obj = get_camera_settings_safe()
+
+@login_required
+def photo_view(request):
+    page = _media_page(request, "photos", media_type="image")
+    settings_obj = get_camera_settings()
 
     return render(request, "cameraapp/photo_view.html", {
-        "photos": manual_photos,
+        "photos": [item.url for item in page],
+        "gallery": [{"url": item.url, "thumb": item.thumb_url} for item in page],
+        "page_obj": page,
+        "page_query": _pager_query(request),
         "interval": settings_obj.interval_ms if settings_obj else 3000,
         "duration": settings_obj.duration_sec if settings_obj else 30,
         "autoplay": settings_obj.auto_play if settings_obj else False,
@@ -372,18 +395,14 @@ def photo_view(request):
 
 @login_required
 def timelaps_view(request):
-    timelapse_dir = os.path.join(settings.MEDIA_ROOT, "photos", "timelapse")
-    photos = []
-
-    if os.path.exists(timelapse_dir):
-        for fname in sorted(os.listdir(timelapse_dir)):
-            if fname.lower().endswith((".jpg", ".jpeg", ".png")):
-                photos.append(f"/media/photos/timelapse/{fname}")
-
-    settings_obj = get_camera_settings_safe()
+    page = _media_page(request, "timelapse", media_type="image")
+    settings_obj = get_camera_settings()
     
     return render(request, "cameraapp/timelaps_view.html", {
-        "photos": photos,
+        "photos": [item.url for item in page],
+        "gallery": [{"url": item.url, "thumb": item.thumb_url} for item in page],
+        "page_obj": page,
+        "page_query": _pager_query(request),
         "interval": settings_obj.interval_ms if settings_obj else 3000,
         "duration": settings_obj.duration_sec if settings_obj else 30,
         "autoplay": settings_obj.auto_play if settings_obj else False,
@@ -398,7 +417,12 @@ def settings_view(request):
     if request.method == "POST":
         form = CameraSettingsForm(request.POST, instance=settings_obj)
         if form.is_valid():
-            form.save()
+            settings_obj = form.save()
+            configure_pre_roll(settings_obj)
+            configure_motion(settings_obj)
+            configure_dvr(settings_obj)
+            configure_retention(settings_obj)
+            apply_settings_live(settings_obj, mode="video", source=configured_source())
             return redirect("settings_view")
     else:
         form = CameraSettingsForm(instance=settings_obj)
@@ -418,41 +442,32 @@ class CameraSettingsForm(forms.ModelForm):
 def media_browser(request):
     layout_mode = request.GET.get("view", "list")  # default = list
 
-    def collect_files(base_url, base_path):
-        result = []
-        if os.path.exists(base_path):
-            for fname in sorted(os.listdir(base_path)):
-                full_path = os.path.join(base_path, fname)
-                url_path = f"{base_url}/{fname}"
-                if os.path.isdir(full_path):
-                    result.append({
-                        "type": "dir",
-                        "name": fname,
-                        "children": collect_files(url_path, full_path)
-                    })
-                else:
-                    ext = fname.split(".")[-1].lower()
-                    file_type = "video" if ext in ["mp4", "avi", "mov"] else "image"
-                    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(full_path))
-                    size = os.path.getsize(full_path)
-                    result.append({
-                        "type": file_type,
-                        "name": fname,
-                        "url": url_path,
-                        "mtime": mtime,
-                        "size": size,
-                        "path": full_path,
-                    })
-        return result
-
-    media_tree = [
-        {"label": "Recordings", "path": "/media/recordings", "content": collect_files("/media/recordings", RECORD_DIR)},
-        {"label": "Photos", "path": "/media/photos", "content": collect_files("/media/photos", PHOTO_DIR)},
-        {"label": "Timelapse", "path": "/media/photos/timelapse", "content": collect_files("/media/photos/timelapse", os.path.join(PHOTO_DIR, "timelapse"))}
-    ]
+    sections = []
+    for category, label in MediaItem.CATEGORIES:
+        page_param = f"{category}_page"
+        page = _media_page(request, category, per_page=100, page_param=page_param)
+        sections.append({
+            "label": label,
+            "category": category,
+            "page_param": page_param,
+            "page_obj": page,
+            "page_query": _pager_query(request, page_param),
+            "content": [
+                {
+                    "type": item.media_type,
+                    "name": item.name,
+                    "url": item.url,
+                    "thumb": item.thumb_url if item.media_type != "raw" else None,
+                    "mtime": item.created_at,
+                    "size": item.size_bytes,
+                    "path": item.path,
+                }
+                for item in page
+            ],
+        })
 
     return render(request, "cameraapp/media_browser.html", {
-        "media_tree": media_tree,
+        "media_tree": sections,
         "layout_mode": layout_mode,
         "title": "Media Browser"
     })
@@ -486,6 +501,12 @@ def reset_camera_settings(request):
         print(f"[RESET_CAMERA_SETTINGS] Fehler beim Zurücksetzen: {e}")
         return HttpResponseRedirect(reverse("settings_view"))
 
+    # Controls are changed on the running camera; no restart needed
+    report = apply_settings_live(settings_obj, mode="video", source=configured_source())
+    if report is not None:
+        print(f"[RESET_CAMERA_SETTINGS] Defaults live übernommen ({report['latency_ms']:.1f} ms).")
+        return HttpResponseRedirect(reverse("settings_view"))
+
     if not app_globals.livestream_job:
         print("[RESET_CAMERA_SETTINGS] Kein aktiver Livestream-Job.")
         return HttpResponseRedirect(reverse("settings_view"))
@@ -500,8 +521,7 @@ def reset_camera_settings(request):
             print("[RESET_CAMERA_SETTINGS] Kamera freigegeben.")
 
             app_globals.livestream_job = safe_restart_camera_stream(
-                camera_source=CAMERA_URL,
-                frame_callback=lambda f: update_latest_frame(f)
+                camera_source=configured_source()
             )
 
             if app_globals.livestream_job:
@@ -554,6 +574,12 @@ def update_camera_settings(request):
         print(f"[UPDATE_CAMERA_SETTINGS] Error during settings update: {e}")
         return HttpResponseRedirect(reverse("stream_page"))
 
+    # Controls are changed on the running camera; no restart needed
+    report = apply_settings_live(settings_obj, mode="video", source=configured_source())
+    if report is not None:
+        print(f"[UPDATE_CAMERA_SETTINGS] Applied live: {report['changed']} in {report['latency_ms']:.1f} ms")
+        return HttpResponseRedirect(reverse("stream_page"))
+
     if not app_globals.livestream_job:
         print("[UPDATE_CAMERA_SETTINGS] No livestream_job active.")
         return HttpResponseRedirect(reverse("stream_page"))
@@ -569,8 +595,7 @@ def update_camera_settings(request):
             init_camera() 
             print("[DEBUG] Calling safe_restart_camera_stream...")
             app_globals.livestream_job = safe_restart_camera_stream(
-                frame_callback=lambda f: update_latest_frame(f),
-                camera_source=CAMERA_URL
+                camera_source=configured_source()
             )
             print(f"[DEBUG] Result from restart: {app_globals.livestream_job}")
 
@@ -618,159 +643,76 @@ def update_photo_settings(request):
 
 
 
-def pause_livestream():
-    print("[PHOTO] pause_livestream")
-    global app_globals
-    with app_globals.livestream_resume_lock:
-        if app_globals.livestream_job and app_globals.livestream_job.running:
-            app_globals.livestream_job.stop()
-            print("[PHOTO] Livestream was paused for photo capture.")
-            time.sleep(0.5)
-
-def resume_livestream():
-    print("[PHOTO] resume_livestream")
-    global app_globals
-
-    if not app_globals.livestream_resume_lock.acquire(timeout=5):
-        print("[PHOTO] Timeout acquiring livestream_resume_lock – skipping resume.")
-        return
-
-    try:
-        print("[PHOTO] Attempting to resume livestream...")
-
-        if app_globals.livestream_job:
-            app_globals.livestream_job.stop()
-            app_globals.livestream_job.join(timeout=2.0)
-
-        # Kamera bei Bedarf reinitialisieren
-        if not app_globals.camera or not app_globals.camera.is_available():
-            print("[PHOTO] Reinitializing CameraManager...")
-            try:
-                init_camera()
-            except Exception as e:
-                print(f"[PHOTO] Failed to reinitialize CameraManager: {e}")
-                return
-
-        # === Warten, bis cap wirklich offen ist ===
-
-        for attempt in range(15):  # statt 6 Versuche
-            if app_globals.camera and app_globals.camera.cap and app_globals.camera.cap.isOpened():
-                break
-            print(f"[PHOTO] Waiting for camera reopen... attempt {attempt + 1}/15")
-            time.sleep(1.0)
-        else:
-            print("[PHOTO] Camera still not available. Aborting resume.")
-            return
-
-        print("[PHOTO] Forcing camera reset and re-init...")
-        release_and_reset_camera()
-        init_camera()
-
-        # Livestream starten
-        app_globals.livestream_job = safe_restart_camera_stream(
-            frame_callback=update_latest_frame,
-            camera_source=CAMERA_URL
-        )
-
-        if app_globals.livestream_job and app_globals.livestream_job.running:
-            print("[PHOTO] Livestream restarted successfully.")
-        else:
-            print("[PHOTO] Failed to restart livestream.")
-
-    finally:
-        app_globals.livestream_resume_lock.release()
-
-    if not app_globals.camera or not app_globals.camera.cap.isOpened():
-        print("Camera is not open after resume attempt. Forcing full reset.")
-        release_and_reset_camera() 
-        wait_until_camera_available(timeout=5)
-
-
-
 @csrf_exempt
 def single_frame(request):
     from django.http import HttpResponse
     from .globals import app_globals
-    import cv2
+    try:
+        profile = StreamProfile.from_query(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid stream profile")
+
     if not app_globals.camera:
         init_camera()
 
-    with app_globals.latest_frame_lock:
-        frame = app_globals.latest_frame.copy() if app_globals.latest_frame is not None else None
-
-    if frame is None:
+    app_globals.viewer_connected()
+    try:
+        encoded = current_jpeg(profile)
+    finally:
+        app_globals.viewer_disconnected()
+    if encoded is None:
         return HttpResponse(status=204)
 
-    ret, buffer = cv2.imencode(".jpg", frame)
-    if not ret:
-        return HttpResponse(status=500)
-
-    return HttpResponse(buffer.tobytes(), content_type="image/jpeg")
-
-
-def resume_livestream_safe():
-    
-    try:
-        print("[PHOTO] resume_livestream_safe: Thread started")
-        resume_livestream()
-        print("[PHOTO] resume_livestream_safe: Stream resumed successfully")
-    except Exception as e:
-        print(f"[PHOTO] resume_livestream_safe: ERROR: {e}")
-        # Optional: hier Fehlerstatus in globalem Flag setzen, z. B. für Anzeige im UI
-        # app_globals.last_resume_error = str(e)
+    return HttpResponse(encoded.data, content_type="image/jpeg")
 
 
 @csrf_exempt
 @require_POST
 @login_required
 def take_photo_now(request):
-    global app_globals
-    photo_path = None
-
     print("[PHOTO] take_photo_now")
 
     try:
-        pause_livestream()
-
-        # === [1] Warten, bis Kamera bereit ist ===
-        for attempt in range(6):
-            if app_globals.camera and app_globals.camera.cap and app_globals.camera.cap.isOpened():
-                print(f"[PHOTO] Camera ready on attempt {attempt + 1}")
-                break
-            print(f"[PHOTO] Waiting for camera... attempt {attempt + 1}/6")
-            time.sleep(1.0)
-        else:
-            print("[PHOTO] Camera not ready after retries.")
-            return JsonResponse({"status": "camera not ready after retries"}, status=500)
-
-        # === [2] Foto machen (take_photo hat eigenen Lock) ===
-        photo_path = take_photo(mode="manual")
-
+        # The livestream keeps running; take_photo switches controls on the
+        # fly (and reopens the camera itself if it isn't ready)
+        report = {}
+        photo_path = take_photo(mode="manual", report=report)
         if not photo_path:
             print("[PHOTO] take_photo() returned None")
             return JsonResponse({"status": "photo capture failed"}, status=500)
 
-        if not os.path.exists(photo_path):
-            print(f"[PHOTO] File not found after capture: {photo_path}")
-            return JsonResponse({"status": "photo file missing"}, status=500)
-
-        print(f"[PHOTO] Photo taken and saved: {photo_path}")
-        return JsonResponse({"status": "ok", "file": photo_path})
+        print(f"[PHOTO] Photo taken and saved: {photo_path} ({report.get('latency_ms')} ms)")
+        return JsonResponse({"status": "ok", "file": photo_path, **report})
 
     except Exception as e:
         print(f"[PHOTO] EXCEPTION during take_photo_now: {e}")
         return JsonResponse({"status": "internal error", "error": str(e)}, status=500)
 
-    finally:
-        print("[PHOTO] Spawning resume_livestream thread")
-        threading.Thread(target=resume_livestream_safe, daemon=True).start()
+
+@csrf_exempt
+@require_POST
+@login_required
+def take_burst_now(request):
+    """
+    Grabs ?count= (1-500) consecutive frames; returns once grabbed, files are
+    written in the background. Frame memory is bounded by PHOTO_BURST_MEMORY_MB.
+    """
+    try:
+        count = min(max(int(request.GET.get("count", request.POST.get("count", 10))), 1), 500)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid count")
+
+    burst = take_burst(count, mode="manual")
+    if burst is None or not burst.files:
+        return JsonResponse({"status": "burst capture failed"}, status=500)
+    return JsonResponse({"status": "ok", "files": burst.files, **burst.stats()})
 
 
 @csrf_exempt
 @require_POST
 @login_required
 def auto_photo_settings(request):
-    settings = CameraSettings.objects.first()
+    settings = get_camera_settings_safe()
     if not settings:
         return JsonResponse({"success": False, "message": "No camera settings found."})
 
@@ -782,16 +724,16 @@ def auto_photo_settings(request):
 @login_required
 def auto_photo_adjust(request):
     global app_globals
-    settings = get_camera_settings()
+    # auto_adjust_from_frame() saves the adjusted values, so this needs the model instance
+    settings = get_camera_settings_safe()
 
     if not settings:
         return JsonResponse({"status": "no settings found"}, status=500)
 
-    with app_globals.latest_frame_lock:
-        frame = app_globals.latest_frame.copy() if app_globals.latest_frame is not None else None
-
-    if frame is not None:
-        auto_adjust_from_frame(frame, settings)
+    frame_ref = app_globals.camera.acquire_frame() if app_globals.camera else None
+    if frame_ref is not None:
+        with frame_ref as frame:
+            auto_adjust_from_frame(frame, settings)
         return JsonResponse({"status": "adjusted from live frame"})
 
     print("[AUTO-ADJUST] No live frame, capturing temp image.")
@@ -805,13 +747,14 @@ def auto_photo_adjust(request):
         return JsonResponse({"status": "camera not available after wait"}, status=500)
 
     apply_cv_settings(app_globals.camera, settings, mode="video")
-    ret, temp_frame = app_globals.camera.cap.read()
-    time.sleep(0.3)
+    with FrameSubscription("auto_adjust") as subscription:
+        frame_ref = subscription.next(timeout=2.0)
 
-    if not ret or temp_frame is None:
+    if frame_ref is None:
         return JsonResponse({"status": "could not capture frame"}, status=500)
 
-    auto_adjust_from_frame(temp_frame, settings)
+    with frame_ref as temp_frame:
+        auto_adjust_from_frame(temp_frame, settings)
     return JsonResponse({"status": "adjusted from temp photo"})
 
 
@@ -831,8 +774,7 @@ def manual_restart_camera(request):
     global app_globals
 
     app_globals.livestream_job = safe_restart_camera_stream(
-        frame_callback=lambda f: update_latest_frame(f),
-        camera_source=CAMERA_URL
+        camera_source=configured_source()
     )
     return redirect("stream_page")
 
@@ -864,6 +806,7 @@ def delete_media_file(request):
         if os.path.exists(abs_path):
             try:
                 os.remove(abs_path)
+                remove_media_files([abs_path])
                 messages.success(request, f"{os.path.basename(abs_path)} deleted.")
             except Exception as e:
                 messages.error(request, f"Failed to delete {abs_path}: {e}")
@@ -875,12 +818,107 @@ def delete_media_file(request):
 
 def delete_all_images(request):
     base_path = os.path.join(settings.MEDIA_ROOT, "photos")
+    removed = []
     for f in glob.glob(os.path.join(base_path, "*.jpg")):
         os.remove(f)
+        removed.append(f)
+    remove_media_files(removed)
     return redirect("media_browser")
 
 def delete_all_videos(request):
-    base_path = os.path.join(settings.MEDIA_ROOT, "videos")
-    for f in glob.glob(os.path.join(base_path, "*.mp4")):
+    removed = []
+    for f in glob.glob(os.path.join(RECORD_DIR, "*.mp4")):
         os.remove(f)
+        removed.append(f)
+    remove_media_files(removed)
+    RecordingSegment.objects.filter(path__startswith=RECORD_DIR).delete()
     return redirect("media_browser")
+
+
+def _parse_moment(value):
+    """ISO date or datetime from a query parameter; naive values are in the current time zone."""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid timestamp: {value}")
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if settings.USE_TZ and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@login_required
+def media_frames(request):
+    """
+    Frames of a category in a [from, to) window as JSON, for players that
+    load only what they are about to show.
+
+    ?category=timelapse|photos&from=&to=&limit=200&stride=1&cursor=
+    """
+    category = request.GET.get("category", "timelapse")
+    if category not in ("timelapse", "photos"):
+        return HttpResponseBadRequest("Invalid category")
+    try:
+        start = _parse_moment(request.GET.get("from"))
+        end = _parse_moment(request.GET.get("to"))
+        limit = min(max(int(request.GET.get("limit", 200)), 1), 1000)
+        stride = min(max(int(request.GET.get("stride", 1)), 1), 10000)
+        items, next_cursor = frames_page(category, start, end, request.GET.get("cursor"), limit, stride)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    return JsonResponse({
+        "frames": [
+            {"id": item.id, "timestamp": item.created_at.isoformat(), "url": item.url, "thumb": item.thumb_url}
+            for item in items
+        ],
+        "next_cursor": next_cursor,
+    })
+
+
+THUMB_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+@login_required
+def thumbnail(request, key):
+    """Serves a cached thumbnail. The URL is derived from its content, so it never changes."""
+    if len(key) != 40 or any(c not in "0123456789abcdef" for c in key):
+        raise Http404("Invalid thumbnail key")
+    etag = f'"{key}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        path = thumbnail_path(key)
+        if not os.path.exists(path):
+            raise Http404("Thumbnail not found")
+        response = FileResponse(open(path, "rb"), content_type="image/jpeg")
+    response["ETag"] = etag
+    response["Cache-Control"] = THUMB_CACHE_CONTROL
+    return response
+
+
+@login_required
+def media_thumbnail(request, item_id):
+    """Redirects to the thumbnail of a MediaItem, generating it if the background worker hasn't yet."""
+    item = MediaItem.objects.filter(pk=item_id).first()
+    if item is None:
+        raise Http404("Unknown media item")
+    key = item.thumb_key
+    if not key or not os.path.exists(thumbnail_path(key)):
+        key = generate_thumbnail(item)
+    if not key:
+        raise Http404("No thumbnail available")
+    return redirect("thumbnail", key=key)
+
+
+@login_required
+def media_usage(request):
+    """Disk usage and retention budgets per media category."""
+    # Only reports; the retention manager is started by init_camera and the settings view
+    retention = app_globals.retention
+    if retention is None:
+        return JsonResponse({"status": "not running"})
+    return JsonResponse(retention.usage())
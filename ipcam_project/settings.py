@@ -111,3 +111,23 @@ LOGOUT_REDIRECT_URL = "/accounts/login/"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Camera source: device index or /dev/videoN, rtsp:// / http:// URL, a video
+# file to replay (file:///path.mp4?realtime=0) or synthetic://1280x720@30
+CAMERA_URL = os.getenv("CAMERA_URL", "0")
+
+# Bearer token for the Prometheus /metrics endpoint; without it only logged-in users can read it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Idle suspension: with no stream viewers, recordings, motion detection or
+# photos for CAMERA_IDLE_GRACE_SEC, capture drops to CAMERA_KEEPALIVE_FPS
+# ("keepalive") or releases the device ("release"); "off" keeps full rate
+CAMERA_IDLE_MODE = os.getenv("CAMERA_IDLE_MODE", "keepalive")
+CAMERA_IDLE_GRACE_SEC = float(os.getenv("CAMERA_IDLE_GRACE_SEC", "60"))
+CAMERA_KEEPALIVE_FPS = float(os.getenv("CAMERA_KEEPALIVE_FPS", "1"))
+# Longest a viewer or photo waits for a suspended camera to come back
+CAMERA_RESUME_TIMEOUT_SEC = float(os.getenv("CAMERA_RESUME_TIMEOUT_SEC", "5"))
+
+# Burst photos are written while they are grabbed; at most this much frame
+# memory is held for frames not written yet before the grab waits for the writers
+PHOTO_BURST_MEMORY_MB = float(os.getenv("PHOTO_BURST_MEMORY_MB", "256"))